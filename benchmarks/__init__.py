@@ -0,0 +1,14 @@
+"""
+Benchmarks du compresseur PDF
+
+Génère un corpus synthétique reproductible, mesure chaque méthode et chaque
+niveau de compression dessus et compare les résultats à une référence.
+
+    python -m benchmarks generate corpus/
+    python -m benchmarks run corpus/ -o resultats.json
+    python -m benchmarks compare reference.json resultats.json
+"""
+
+from .corpus import CORPUS, generate_corpus
+from .runner import run_benchmark, save_results, load_results
+from .compare import DEFAULT_THRESHOLDS, compare_results, format_finding
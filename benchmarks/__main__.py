@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Interface en ligne de commande des benchmarks
+
+    python -m benchmarks generate DOSSIER [--scale 0.5]
+    python -m benchmarks run DOSSIER -o resultats.json [-m fitz advanced] [-l medium]
+    python -m benchmarks compare reference.json resultats.json
+"""
+
+import argparse
+import os
+import sys
+
+from compress_pdf import METHODS
+
+from .compare import DEFAULT_THRESHOLDS, compare_results, format_finding
+from .corpus import CORPUS, generate_corpus
+from .runner import LEVELS, load_results, run_benchmark, save_results
+
+def cmd_generate(args):
+    print(f"🧪 Génération du corpus dans {args.directory} (échelle {args.scale})")
+    for path in generate_corpus(args.directory, args.scale, args.documents, args.seed):
+        print(f"   ✅ {os.path.basename(path):<24} {os.path.getsize(path) / (1024 * 1024):8.2f} Mo")
+    return 0
+
+def cmd_run(args):
+    print(f"⏱️  Benchmark de {args.directory} ({args.repeat} répétition(s) par mesure)")
+    try:
+        results = run_benchmark(args.directory, args.methods, args.levels, args.repeat, args.workers,
+                                args.timeout)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return 1
+    save_results(results, args.output)
+    failures = sum(1 for entry in results['results'] if not entry['success'])
+    print(f"📄 Résultats enregistrés: {args.output} ({len(results['results'])} mesure(s), {failures} échec(s))")
+    return 0
+
+def cmd_compare(args):
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+    thresholds = {'throughput': args.throughput, 'memory': args.memory, 'size': args.size}
+    report = compare_results(baseline, current, thresholds)
+
+    if baseline.get('environment') != current.get('environment'):
+        print("⚠️  Environnements différents : les écarts de débit et de mémoire sont à interpréter avec prudence")
+
+    for finding in report['improvements']:
+        print(f"✅ {format_finding(finding)}")
+    for finding in report['regressions']:
+        print(f"❌ {format_finding(finding)}")
+    for document, method, level in report['missing']:
+        print(f"⚠️  {document} [{method}/{level}]: absent des nouveaux résultats")
+
+    print("=" * 50)
+    if report['regressions']:
+        print(f"❌ {len(report['regressions'])} régression(s), {len(report['improvements'])} amélioration(s)")
+        return 1
+    print(f"🎉 Aucune régression ({len(report['improvements'])} amélioration(s))")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmarks du compresseur PDF sur un corpus synthétique"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Générer le corpus synthétique")
+    generate.add_argument("directory", help="Répertoire de destination")
+    generate.add_argument("--scale", type=float, default=1.0,
+                          help="Facteur appliqué au nombre de pages (défaut: 1.0)")
+    generate.add_argument("--documents", nargs="+", choices=list(CORPUS),
+                          help="Documents à générer (défaut: tous)")
+    generate.add_argument("--seed", type=int, default=0, help="Graine du générateur (défaut: 0)")
+    generate.set_defaults(func=cmd_generate)
+
+    run = subparsers.add_parser("run", help="Mesurer les méthodes sur un corpus")
+    run.add_argument("directory", help="Répertoire du corpus")
+    run.add_argument("-o", "--output", default="benchmark.json", help="Fichier de résultats JSON")
+    run.add_argument("-m", "--methods", nargs="+", choices=list(METHODS), help="Méthodes (défaut: toutes)")
+    run.add_argument("-l", "--levels", nargs="+", choices=list(LEVELS), help="Niveaux (défaut: tous)")
+    run.add_argument("-r", "--repeat", type=int, default=3, help="Répétitions par mesure (défaut: 3)")
+    run.add_argument("--workers", type=int, help="Threads de recompression des images")
+    run.add_argument("--timeout", type=float, default=600, help="Durée max d'une compression en secondes")
+    run.set_defaults(func=cmd_run)
+
+    compare = subparsers.add_parser("compare", help="Comparer des résultats à une référence")
+    compare.add_argument("baseline", help="Résultats de référence (JSON)")
+    compare.add_argument("current", help="Nouveaux résultats (JSON)")
+    compare.add_argument("--throughput", type=float, default=DEFAULT_THRESHOLDS['throughput'],
+                         help="Baisse de débit tolérée (défaut: 0.10)")
+    compare.add_argument("--memory", type=float, default=DEFAULT_THRESHOLDS['memory'],
+                         help="Hausse du pic RSS tolérée (défaut: 0.10)")
+    compare.add_argument("--size", type=float, default=DEFAULT_THRESHOLDS['size'],
+                         help="Hausse de la taille de sortie tolérée (défaut: 0.01)")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Comparaison de deux séries de résultats de benchmark
+
+Une mesure est en régression quand, par rapport à la référence, elle échoue
+alors qu'elle réussissait, quand son débit baisse, quand son pic de mémoire
+augmente ou quand le fichier produit grossit au-delà des seuils tolérés.
+"""
+
+# Seuils par défaut : variation relative tolérée avant de signaler une régression
+DEFAULT_THRESHOLDS = {
+    'throughput': 0.10,  # Débit (Mo/s) : bruit de mesure important
+    'memory': 0.10,      # Pic RSS
+    'size': 0.01,        # Taille de sortie : déterministe, tolérance faible
+}
+
+def _key(entry):
+    return (entry['document'], entry['method'], entry['level'])
+
+def compare_results(baseline, current, thresholds=None):
+    """
+    Compare des résultats à une référence
+
+    Args:
+        baseline (dict): Résultats de référence (voir run_benchmark)
+        current (dict): Nouveaux résultats
+        thresholds (dict): Seuils relatifs 'throughput', 'memory' et 'size'
+
+    Returns:
+        dict: 'regressions', 'improvements' (listes de constats) et 'missing'
+              (mesures de la référence absentes des nouveaux résultats)
+    """
+    limits = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+    reference = {_key(entry): entry for entry in baseline['results']}
+    regressions = []
+    improvements = []
+    seen = set()
+
+    for entry in current['results']:
+        key = _key(entry)
+        base = reference.get(key)
+        if base is None:
+            continue
+        seen.add(key)
+
+        if not entry['success']:
+            if base['success']:
+                regressions.append({'key': key, 'metric': 'success', 'baseline': True, 'current': False,
+                                    'detail': entry.get('error')})
+            continue
+        if not base['success']:
+            improvements.append({'key': key, 'metric': 'success', 'baseline': False, 'current': True})
+            continue
+
+        # (métrique, valeur de référence, valeur actuelle, seuil, une hausse est-elle une amélioration ?)
+        checks = (
+            ('mb_per_s', base.get('mb_per_s'), entry.get('mb_per_s'), limits['throughput'], True),
+            ('rss_peak', base.get('rss_peak'), entry.get('rss_peak'), limits['memory'], False),
+            ('output_size', base.get('output_size'), entry.get('output_size'), limits['size'], False),
+        )
+        for metric, old, new, limit, higher_is_better in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            finding = {'key': key, 'metric': metric, 'baseline': old, 'current': new, 'change': change}
+            worse = -change if higher_is_better else change
+            if worse > limit:
+                regressions.append(finding)
+            elif -worse > limit:
+                improvements.append(finding)
+
+    missing = [key for key in reference if key not in seen]
+    return {'regressions': regressions, 'improvements': improvements, 'missing': missing}
+
+def format_finding(finding):
+    """Ligne lisible décrivant un constat de compare_results"""
+    document, method, level = finding['key']
+    label = f"{document} [{method}/{level}]"
+    if finding['metric'] == 'success':
+        state = "réussit désormais" if finding['current'] else "échoue désormais"
+        detail = f" ({finding['detail']})" if finding.get('detail') else ""
+        return f"{label}: {state}{detail}"
+    units = {'mb_per_s': ("débit", "Mo/s", 1), 'rss_peak': ("pic RSS", "Mo", 1024 * 1024),
+             'output_size': ("taille de sortie", "Mo", 1024 * 1024)}
+    name, unit, divisor = units[finding['metric']]
+    return (f"{label}: {name} {finding['baseline'] / divisor:.2f} → {finding['current'] / divisor:.2f} {unit} "
+            f"({finding['change'] * 100:+.1f}%)")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Générateur de corpus PDF synthétiques pour les benchmarks
+
+Chaque document est produit hors ligne à partir d'une graine fixe : deux
+générations successives donnent des fichiers identiques octet pour octet,
+ce qui permet de comparer des mesures prises à des moments différents.
+"""
+
+import io
+import os
+import random
+
+import fitz
+from PIL import Image, ImageDraw, ImageFilter
+
+# Format lettre US en points
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+WORDS = ("compression", "document", "image", "page", "flux", "objet", "qualité", "taille", "réduction",
+         "texte", "police", "scanner", "résolution", "archive", "rapport", "analyse", "données", "format")
+
+def _noise(rng, size, mode='L'):
+    """Bruit pseudo-aléatoire reproductible (Image.effect_noise n'accepte pas de graine)"""
+    width, height = size
+    bands = len(mode)
+    return Image.frombytes(mode, size, rng.randbytes(width * height * bands))
+
+def _photo(rng, size):
+    """Image de type photo : dégradés, formes floues et grain"""
+    width, height = size
+    base = Image.merge("RGB", [
+        Image.linear_gradient("L").resize(size).rotate(rng.choice((0, 90, 180, 270))),
+        Image.radial_gradient("L").resize(size),
+        Image.linear_gradient("L").resize(size).rotate(rng.choice((0, 90, 180, 270))),
+    ])
+    draw = ImageDraw.Draw(base)
+    for _ in range(24):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(max(width, height) // 20 + 1, max(width, height) // 5 + 2)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    base = base.filter(ImageFilter.GaussianBlur(max(width, height) / 100))
+    return Image.blend(base, _noise(rng, size, "RGB"), 0.08)
+
+def _scan(rng, size):
+    """Page scannée : fond papier légèrement bruité et blocs de mots sombres"""
+    width, height = size
+    page = Image.new("L", size, 238)
+    draw = ImageDraw.Draw(page)
+    margin = width // 10
+    line_height = height // 60
+    y = margin
+    while y < height - margin:
+        x = margin
+        while x < width - margin:
+            word = rng.randrange(line_height, line_height * 5)
+            draw.rectangle((x, y, min(x + word, width - margin), y + line_height * 6 // 10), fill=rng.randrange(20, 70))
+            x += word + line_height // 2
+        y += line_height
+    page = page.filter(ImageFilter.GaussianBlur(0.8))
+    return Image.blend(page, _noise(rng, size), 0.06).convert("RGB")
+
+def _logo(rng, size):
+    """Petit visuel à aplats de couleur (logo, icône)"""
+    image = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for _ in range(6):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = rng.randrange(x0, width + 1), rng.randrange(y0, height + 1)
+        draw.rectangle((x0, y0, x1, y1), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return image
+
+def _encode(image, fmt, quality=92):
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        image.save(buffer, format="JPEG", quality=quality)
+    else:
+        image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _text_page(doc, rng, lines=48):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    text = "\n".join(" ".join(rng.choice(WORDS) for _ in range(10)) for _ in range(lines))
+    page.insert_textbox(fitz.Rect(54, 54, PAGE_WIDTH - 54, PAGE_HEIGHT - 54), text, fontsize=9)
+    return page
+
+def _full_page_image(doc, stream):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_image(page.rect, stream=stream)
+    return page
+
+def build_text(doc, rng, scale):
+    """Texte seul, sans aucune image"""
+    for _ in range(int(60 * scale) or 1):
+        _text_page(doc, rng)
+
+def build_scanned(doc, rng, scale):
+    """Pages scannées : une image PNG pleine page à 150 dpi par page"""
+    for _ in range(int(8 * scale) or 1):
+        _full_page_image(doc, _encode(_scan(rng, (1275, 1650)), "PNG"))
+
+def build_mixed(doc, rng, scale):
+    """Alternance de pages de texte et de pages avec une photo JPEG"""
+    for index in range(int(20 * scale) or 1):
+        page = _text_page(doc, rng, lines=20)
+        if index % 2:
+            photo = _encode(_photo(rng, (1600, 1200)), "JPEG")
+            page.insert_image(fitz.Rect(54, 360, PAGE_WIDTH - 54, PAGE_HEIGHT - 54), stream=photo)
+
+def build_many_small_images(doc, rng, scale):
+    """Nombreuses petites images distinctes (icônes, vignettes)"""
+    for _ in range(int(10 * scale) or 1):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        for row in range(8):
+            for column in range(6):
+                icon = _encode(_logo(rng, (96, 96)) if (row + column) % 2 else _photo(rng, (96, 96)), "PNG")
+                x, y = 40 + column * 90, 40 + row * 90
+                page.insert_image(fitz.Rect(x, y, x + 80, y + 80), stream=icon)
+
+def build_giant_image(doc, rng, scale):
+    """Une seule page portant une photo très haute résolution"""
+    width = max(int(6000 * scale ** 0.5), 600)
+    _full_page_image(doc, _encode(_photo(rng, (width, width * 2 // 3)), "PNG"))
+
+def build_shared_logo(doc, rng, scale):
+    """Le même logo en en-tête de chaque page, stocké une seule fois"""
+    logo = _encode(_photo(rng, (1200, 400)), "PNG")
+    xref = 0
+    for _ in range(int(50 * scale) or 1):
+        page = _text_page(doc, rng, lines=40)
+        rect = fitz.Rect(54, 10, 234, 50)
+        if xref:
+            page.insert_image(rect, xref=xref)
+        else:
+            xref = page.insert_image(rect, stream=logo)
+
+# Nom du document -> fonction de construction
+CORPUS = {
+    'text_only': build_text,
+    'scanned': build_scanned,
+    'mixed': build_mixed,
+    'many_small_images': build_many_small_images,
+    'giant_image': build_giant_image,
+    'shared_logo': build_shared_logo,
+}
+
+def generate_corpus(directory, scale=1.0, kinds=None, seed=0):
+    """
+    Génère le corpus synthétique dans un répertoire
+
+    Args:
+        directory (str): Répertoire de destination (créé si nécessaire)
+        scale (float): Facteur appliqué au nombre de pages (et à la taille de l'image géante)
+        kinds (list): Documents à générer (défaut: tout CORPUS)
+        seed (int): Graine du générateur pseudo-aléatoire
+
+    Returns:
+        list: Chemins des fichiers générés
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name in kinds or CORPUS:
+        if name not in CORPUS:
+            raise ValueError(f"Document de corpus inconnu: {name}")
+        # Une graine par document : un sous-ensemble donne les mêmes fichiers que le corpus complet
+        rng = random.Random(f"{seed}:{name}")
+        doc = fitz.open()
+        CORPUS[name](doc, rng, scale)
+        path = os.path.join(directory, f"{name}.pdf")
+        # Pas d'identifiant aléatoire ni de date : sortie reproductible
+        doc.save(path, garbage=3, deflate=True, no_new_id=True)
+        doc.close()
+        paths.append(path)
+    return paths
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Exécution des benchmarks de compression
+
+Chaque mesure tourne dans un processus neuf (contexte spawn) : le pic de
+mémoire résidente rapporté par getrusage est alors celui de la seule
+compression mesurée, et aucun cache (module, images) ne survit d'une mesure
+à l'autre.
+"""
+
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+
+import fitz
+
+from compress_pdf import METHODS, compress_pdf_bytes
+
+LEVELS = ('low', 'medium', 'high')
+RESULTS_VERSION = 1
+
+def _measure_worker(path, method, level, workers, conn):
+    """Compresse un fichier dans le processus fils et renvoie les mesures au parent"""
+    # Les messages des méthodes de compression brouilleraient le suivi du benchmark
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        result = compress_pdf_bytes(data, method=method, compression_level=level, workers=workers)
+        seconds = time.perf_counter() - start
+        conn.send({
+            'success': result.success,
+            'seconds': seconds,
+            'output_size': result.output_size,
+            'backend': result.backend,
+            'rss_peak': result.rss_peak,
+            'timings': result.timings,
+            'error': result.error,
+        })
+    except Exception as e:
+        conn.send({'success': False, 'error': str(e)})
+    finally:
+        conn.close()
+
+def measure(path, method, level, workers=None, timeout=600):
+    """
+    Mesure une compression dans un processus dédié
+
+    Returns:
+        dict: Mesures brutes (succès, durée, taille de sortie, pic RSS, étapes)
+    """
+    context = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_worker, args=(path, method, level, workers, child_conn),
+                              daemon=True)
+    process.start()
+    child_conn.close()
+    try:
+        if parent_conn.poll(timeout):
+            return parent_conn.recv()
+        return {'success': False, 'error': f"délai dépassé ({timeout} s)"}
+    except EOFError:
+        return {'success': False, 'error': f"processus interrompu (code {process.exitcode})"}
+    finally:
+        parent_conn.close()
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+def _environment():
+    """Contexte de la mesure, pour ne comparer que des résultats comparables"""
+    import PIL
+    try:
+        import pikepdf
+        pikepdf_version = pikepdf.__version__
+    except ImportError:
+        pikepdf_version = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'pymupdf': fitz.VersionBind,
+        'pikepdf': pikepdf_version,
+        'pillow': PIL.__version__,
+    }
+
+def run_benchmark(corpus_dir, methods=None, levels=None, repeat=3, workers=None, timeout=600, progress=print):
+    """
+    Lance chaque méthode et chaque niveau sur chaque document du corpus
+
+    La durée retenue est la médiane des répétitions ; le pic RSS est le plus
+    élevé observé.
+
+    Args:
+        corpus_dir (str): Répertoire contenant les PDFs du corpus
+        methods (list): Méthodes à mesurer (défaut: toutes)
+        levels (list): Niveaux à mesurer (défaut: low, medium, high)
+        repeat (int): Nombre de répétitions par mesure
+        workers (int): Threads de recompression des images (défaut: nombre de CPU)
+        timeout (float): Durée maximale d'une compression, en secondes
+        progress (callable): Reçoit une ligne de suivi par mesure (None pour ne rien afficher)
+
+    Returns:
+        dict: Résultats sérialisables en JSON
+    """
+    methods = list(methods or METHODS)
+    levels = list(levels or LEVELS)
+    files = sorted(glob.glob(os.path.join(corpus_dir, '*.pdf')))
+    if not files:
+        raise FileNotFoundError(f"Aucun PDF dans {corpus_dir}")
+
+    results = []
+    for path in files:
+        input_size = os.path.getsize(path)
+        with fitz.open(path) as doc:
+            pages = doc.page_count
+        for method in methods:
+            for level in levels:
+                runs = [measure(path, method, level, workers, timeout) for _ in range(max(1, repeat))]
+                entry = {
+                    'document': os.path.basename(path),
+                    'pages': pages,
+                    'input_size': input_size,
+                    'method': method,
+                    'level': level,
+                    'success': all(run['success'] for run in runs),
+                }
+                if entry['success']:
+                    seconds = statistics.median(run['seconds'] for run in runs)
+                    output_size = runs[-1]['output_size']
+                    entry.update(
+                        backend=runs[-1]['backend'],
+                        seconds=seconds,
+                        seconds_all=[run['seconds'] for run in runs],
+                        mb_per_s=input_size / (1024 * 1024) / seconds if seconds else None,
+                        pages_per_s=pages / seconds if seconds else None,
+                        rss_peak=max(run['rss_peak'] or 0 for run in runs) or None,
+                        output_size=output_size,
+                        ratio=output_size / input_size if input_size else None,
+                        timings=runs[-1]['timings'],
+                    )
+                else:
+                    entry['error'] = next(run['error'] for run in runs if not run['success'])
+                results.append(entry)
+
+                if progress:
+                    if entry['success']:
+                        progress(f"   {entry['document']:<24} {method:<9} {level:<7} "
+                                 f"{entry['seconds']:7.2f} s  {entry['mb_per_s']:7.2f} Mo/s  "
+                                 f"{entry['pages_per_s']:8.1f} p/s  ratio {entry['ratio']:.3f}")
+                    else:
+                        progress(f"   {entry['document']:<24} {method:<9} {level:<7} ❌ {entry['error']}")
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'workers': workers,
+        'environment': _environment(),
+        'results': results,
+    }
+
+def save_results(results, path):
+    """Écrit les résultats au format JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+def load_results(path):
+    """Relit un fichier de résultats JSON"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Démon de compression PDF
+Garde des processus de compression préchargés derrière un socket Unix local
+
+    python compress_pdf.py --serve [--daemon-workers 4]
+    python compress_pdf.py fichier.pdf        # passe par le démon s'il tourne
+
+Ce module ne dépend que de la bibliothèque standard : le client reste léger,
+seuls les workers du démon importent PyMuPDF, pikepdf et Pillow.
+"""
+
+import io
+import json
+import os
+import queue
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+# Version du protocole : un client et un démon de versions différentes ne se parlent pas
+PROTOCOL_VERSION = 1
+# Fichiers traités par un worker avant son remplacement (borne la mémoire accumulée)
+TASKS_PER_WORKER = 200
+# Attente maximale de la connexion au démon avant de compresser sur place, en secondes
+CONNECT_TIMEOUT = 1.0
+# Attente maximale d'un worker libre côté démon, en secondes ; au-delà, le client compresse sur place
+WORKER_WAIT = 60.0
+# Intervalle de vérification qu'un worker occupé est toujours en vie, en secondes
+HEALTH_INTERVAL = 1.0
+# Délai de lecture supplémentaire du client : la réponse du démon arrive toujours avant
+RESPONSE_MARGIN = 10.0
+
+def default_socket_path():
+    """Socket du démon : $PDF_COMPRESSOR_SOCKET, sinon propre à l'utilisateur"""
+    if os.environ.get('PDF_COMPRESSOR_SOCKET'):
+        return os.environ['PDF_COMPRESSOR_SOCKET']
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    return os.path.join(directory, f"pdf-compressor-{user}.sock")
+
+def _owned_socket(path):
+    """Vrai si path est un socket appartenant à l'utilisateur courant (pas celui d'un autre compte)"""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+def _peer_uid(sock):
+    """Utilisateur du processus à l'autre bout du socket (SO_PEERCRED, Linux), None si inconnu"""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    try:
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    except OSError:
+        return None
+    return struct.unpack('3i', credentials)[1]
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n")
+
+def _receive(sock):
+    """Lit un message JSON terminé par un saut de ligne (None si la connexion est fermée avant)"""
+    buffer = bytearray()
+    while not buffer.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return json.loads(buffer)
+
+def request_compression(options, cache_dir=None, cache_size=512, socket_path=None, timeout=None):
+    """
+    Confie une compression au démon s'il tourne
+
+    Le socket n'est utilisé que s'il appartient à l'utilisateur courant, et le
+    processus qui l'écoute aussi (SO_PEERCRED sous Linux) : dans un répertoire
+    partagé comme /tmp, un autre compte pourrait sinon se faire passer pour le
+    démon.
+
+    Args:
+        options (dict): Paramètres de compress_pdf (chemins absolus, sans cache ni hook)
+        cache_dir (str): Cache disque des images, ouvert par le démon (optionnel)
+        cache_size (float): Taille maximale du cache en Mo
+        socket_path (str): Socket du démon (défaut: default_socket_path())
+        timeout (float): Durée maximale accordée au démon, en secondes (défaut: tant que son worker vit)
+
+    Returns:
+        dict: {'success': bool, 'log': messages de compress_pdf}, ou None si le démon est
+              indisponible ou n'appartient pas à l'utilisateur, refuse la requête (modes race
+              et shards, qui lancent leurs propres processus), n'a pas de worker libre, perd
+              son worker ou dépasse le délai : la compression doit alors se faire sur place
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    path = socket_path or default_socket_path()
+    if not _owned_socket(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(path)
+        except OSError:
+            return None
+        if _peer_uid(sock) not in (None, os.getuid()):
+            return None
+        # Le démon répond dès que son worker termine, meurt ou dépasse timeout : la marge couvre
+        # l'attente d'un worker libre et la réponse elle-même
+        sock.settimeout(None if timeout is None else timeout + WORKER_WAIT + RESPONSE_MARGIN)
+        _send(sock, {'version': PROTOCOL_VERSION, 'options': options, 'timeout': timeout,
+                     'cache': {'directory': cache_dir, 'size': cache_size} if cache_dir else None})
+        response = _receive(sock)
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+    if response is None or response.get('version') != PROTOCOL_VERSION or 'error' in response:
+        return None
+    return response
+
+def _preload():
+    """Initialisation d'un worker : bibliothèques chargées une fois pour toutes"""
+    for module in ('fitz', 'pikepdf', 'PIL.Image', 'numpy', 'compress_pdf'):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+_caches = {}
+
+def _worker_loop(conn):
+    """Boucle d'un worker : bibliothèques chargées une fois, puis une requête par message jusqu'à None"""
+    import signal
+
+    # Un worker remplaçant hérite du gestionnaire d'arrêt du démon : le démon seul réagit à Ctrl+C,
+    # le worker s'arrête sur SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _preload()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        conn.send(_compress(request))
+    conn.close()
+
+class _Workers:
+    """
+    Workers préchargés prêtés à une requête à la fois
+
+    Une requête dure aussi longtemps que son worker reste en vie, sauf délai
+    fixé par le client. Un worker mort en cours de requête (mémoire épuisée,
+    plantage de MuPDF) ou qui dépasse ce délai est arrêté et remplacé ; la
+    requête reçoit une erreur, et le client compresse alors sur place.
+    """
+
+    def __init__(self, count, context):
+        self.context = context
+        self.idle = queue.Queue()
+        self.processes = set()
+        self._lock = threading.Lock()
+        for _ in range(count):
+            self.idle.put(self._start())
+
+    def _start(self):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        with self._lock:
+            self.processes.add(process)
+        return process, parent_conn, 0
+
+    def _stop(self, process, conn, kill=False):
+        if kill:
+            process.terminate()
+        else:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        conn.close()
+        process.join()
+        with self._lock:
+            self.processes.discard(process)
+
+    def run(self, request, timeout=None):
+        """Exécute une requête dans un worker libre ; réponse d'erreur si le worker meurt ou dépasse timeout"""
+        try:
+            process, conn, served = self.idle.get(timeout=WORKER_WAIT)
+        except queue.Empty:
+            return {'version': PROTOCOL_VERSION, 'error': "aucun worker libre"}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            conn.send(request)
+            # Attente par intervalles : un worker mort sans fermer son tube est détecté
+            while not conn.poll(HEALTH_INTERVAL if deadline is None
+                                else max(0.0, min(HEALTH_INTERVAL, deadline - time.monotonic()))):
+                if not process.is_alive():
+                    raise EOFError
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError
+            response = conn.recv()
+        except TimeoutError:
+            error = f"délai dépassé ({timeout:g} s)"
+        except (EOFError, OSError):
+            error = f"worker interrompu (code {process.exitcode})"
+        else:
+            served += 1
+            if served >= TASKS_PER_WORKER:
+                # Mémoire accumulée bornée : le worker est remplacé
+                self._stop(process, conn)
+                self.idle.put(self._start())
+            else:
+                self.idle.put((process, conn, served))
+            return response
+        # Worker bloqué ou mort : arrêté avant la réponse, le client peut écrire la sortie sans conflit
+        self._stop(process, conn, kill=True)
+        self.idle.put(self._start())
+        return {'version': PROTOCOL_VERSION, 'error': error}
+
+    def close(self):
+        """Arrête tous les workers, y compris ceux encore occupés"""
+        with self._lock:
+            processes = list(self.processes)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+def _compress(request):
+    """Exécute une requête dans un worker et renvoie les messages affichés par compress_pdf"""
+    from contextlib import redirect_stdout
+
+    from compress_pdf import compress_pdf
+
+    cache = None
+    if request.get('cache'):
+        # Un cache par répertoire et par worker, conservé d'une requête à l'autre
+        key = (request['cache']['directory'], request['cache']['size'])
+        if key not in _caches:
+            from image_cache import ImageCache
+            _caches[key] = ImageCache(*key)
+        cache = _caches[key]
+    log = io.StringIO()
+    try:
+        with redirect_stdout(log):
+            result = compress_pdf(cache=cache, **request['options'])
+        success = bool(result)
+    except Exception as e:
+        log.write(f"❌ Erreur du démon: {e}\n")
+        success = False
+    return {'version': PROTOCOL_VERSION, 'success': success, 'log': log.getvalue()}
+
+def serve(socket_path=None, workers=None):
+    """
+    Lance le démon : workers préchargés et socket Unix, jusqu'à Ctrl+C ou SIGTERM
+
+    Chaque connexion porte une requête, confiée au pool de workers ; plusieurs
+    clients sont servis en parallèle dans la limite du nombre de workers. Le
+    socket n'est accessible qu'à l'utilisateur qui lance le démon.
+
+    Args:
+        socket_path (str): Socket d'écoute (défaut: default_socket_path())
+        workers (int): Nombre de processus préchargés (défaut: nombre de CPU)
+
+    Returns:
+        bool: False si le démon n'a pas pu démarrer
+    """
+    import multiprocessing
+    import signal
+    import socketserver
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print("❌ Les sockets Unix ne sont pas disponibles sur ce système")
+        return False
+    path = socket_path or default_socket_path()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            print(f"❌ Un démon écoute déjà sur {path}")
+            return False
+        except OSError:
+            # Socket laissé par un démon arrêté brutalement
+            os.remove(path)
+        finally:
+            probe.close()
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    pool = _Workers(workers, multiprocessing.get_context())
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                request = _receive(self.connection)
+            except ValueError:
+                return
+            if request is None:
+                return
+            if request.get('version') != PROTOCOL_VERSION:
+                response = {'version': PROTOCOL_VERSION, 'error': "version du protocole différente"}
+            elif request['options'].get('race') or request['options'].get('shards'):
+                # Les workers du pool ne peuvent pas lancer leurs propres processus
+                response = {'version': PROTOCOL_VERSION, 'error': "mode multi-processus"}
+            else:
+                response = pool.run(request, request.get('timeout'))
+            try:
+                _send(self.connection, response)
+            except OSError:
+                pass
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    previous_umask = os.umask(0o177)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(previous_umask)
+
+    def terminate(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, terminate)
+    print(f"🛰️  Démon de compression à l'écoute sur {path} ({workers} worker(s) préchargé(s)) - Ctrl+C pour arrêter")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+        if os.path.exists(path):
+            os.remove(path)
+        print("🛑 Démon arrêté")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if serve(*(sys.argv[1:2] or [None])) else 1)
@@ -4,19 +4,123 @@ Script de compression PDF
 Compresse les fichiers PDF en utilisant différentes méthodes
 """
 
+import io
+import json
+import logging
+import math
 import os
+import re
 import sys
+import time
 import argparse
+import threading
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 
-def compress_with_pikepdf(input_path, output_path, compression_level='medium'):
+# Messages des méthodes appelées sans Tracer (voir _note)
+logger = logging.getLogger("compress_pdf")
+
+def _as_stream(source):
+    """Enveloppe un PDF en mémoire dans un BytesIO (les chemins sont laissés tels quels)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+def _open_fitz(source):
+    """Ouvre un PDF avec PyMuPDF depuis un chemin, un contenu en mémoire ou un document ouvert"""
+    import fitz
+    if isinstance(source, fitz.Document):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype='pdf')
+    return fitz.open(source)
+
+class Tracer:
+    """
+    Mesure la durée des étapes d'une compression
+
+    Les durées sont cumulées par nom d'étape (open, detect, image.decode...)
+    et chaque étape terminée est transmise au hook optionnel sous forme
+    d'événement {'name', 'start', 'seconds', 'attributes'}, par exemple pour
+    un système de traçage. Une étape qui renseigne l'attribut 'memory'
+    (octets) alimente en plus le pic 'memory_peak' de son nom. Les erreurs
+    et avertissements des méthodes sont conservés dans messages, pour être
+    affichés par l'appelant : la bibliothèque n'écrit rien sur la console.
+    Utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.timings = {}
+        self.messages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Mesure le bloc encadré comme une étape nommée (le bloc reçoit ses attributs, modifiables)"""
+        start_time = time.time()
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record(name, time.perf_counter() - start, start_time, **attributes)
+
+    def record(self, name, seconds, start_time=None, **attributes):
+        """Enregistre une étape déjà mesurée (par exemple dans un autre processus)"""
+        with self._lock:
+            entry = self.timings.setdefault(name, {'count': 0, 'seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            if attributes.get('memory') is not None:
+                entry['memory_peak'] = max(entry.get('memory_peak', 0), attributes['memory'])
+        if self.hook is not None:
+            event = {
+                'name': name,
+                'start': start_time if start_time is not None else time.time() - seconds,
+                'seconds': seconds,
+                'attributes': attributes
+            }
+            try:
+                self.hook(event)
+            except Exception:
+                pass  # Un hook défaillant ne doit pas interrompre la compression
+
+    def note(self, message):
+        """Conserve une erreur ou un avertissement d'une méthode"""
+        with self._lock:
+            self.messages.append(message)
+
+    def merge(self, timings):
+        """Ajoute des durées cumulées (voir timings) sans les retransmettre au hook"""
+        with self._lock:
+            for name, other in timings.items():
+                entry = self.timings.setdefault(name, {'count': 0, 'seconds': 0.0})
+                entry['count'] += other['count']
+                entry['seconds'] += other['seconds']
+                if 'memory_peak' in other:
+                    entry['memory_peak'] = max(entry.get('memory_peak', 0), other['memory_peak'])
+
+def _span(tracer, name, **attributes):
+    """Étape mesurée si un Tracer est fourni, sans effet sinon"""
+    return tracer.span(name, **attributes) if tracer is not None else nullcontext(attributes)
+
+def _note(tracer, message):
+    """Erreur ou avertissement d'une méthode : conservé par le Tracer, sinon journalisé (logging)"""
+    if tracer is not None:
+        tracer.note(message)
+    else:
+        logger.warning(message)
+
+def compress_with_pikepdf(input_path, output_path, compression_level='medium', tracer=None):
     """
     Compresse un PDF avec pikepdf (recommandé)
     
     Args:
-        input_path (str): Chemin du fichier PDF d'entrée
-        output_path (str): Chemin du fichier PDF de sortie
+        input_path (str | bytes): Chemin du fichier PDF d'entrée ou son contenu
+        output_path (str | file): Chemin du fichier PDF de sortie ou flux en écriture
         compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        tracer (Tracer): Mesure des étapes (optionnel)
     """
     try:
         import pikepdf
@@ -41,185 +145,1008 @@ def compress_with_pikepdf(input_path, output_path, compression_level='medium'):
             }
         }
         
-        with pikepdf.open(input_path) as pdf:
+        with _span(tracer, 'pikepdf.open'):
+            pdf = pikepdf.open(_as_stream(input_path))
+        with pdf:
             params = compression_params.get(compression_level, compression_params['medium'])
-            pdf.save(output_path, **params)
+            with _span(tracer, 'pikepdf.save'):
+                pdf.save(output_path, **params)
             
         return True
         
     except ImportError:
-        print("❌ pikepdf n'est pas installé. Installez-le avec: pip install pikepdf")
+        _note(tracer, "pikepdf n'est pas installé. Installez-le avec: pip install pikepdf")
         return False
     except Exception as e:
-        print(f"❌ Erreur avec pikepdf: {e}")
+        _note(tracer, f"Erreur avec pikepdf: {e}")
         return False
 
-def compress_with_pypdf(input_path, output_path):
+def compress_with_pypdf(input_path, output_path, tracer=None):
     """
     Compresse un PDF avec PyPDF2 (alternative)
     
     Args:
-        input_path (str): Chemin du fichier PDF d'entrée
-        output_path (str): Chemin du fichier PDF de sortie
+        input_path (str | bytes): Chemin du fichier PDF d'entrée ou son contenu
+        output_path (str | file): Chemin du fichier PDF de sortie ou flux en écriture
+        tracer (Tracer): Mesure des étapes (optionnel)
     """
     try:
         from PyPDF2 import PdfReader, PdfWriter
         
-        reader = PdfReader(input_path)
+        with _span(tracer, 'pypdf.open'):
+            reader = PdfReader(_as_stream(input_path))
         writer = PdfWriter()
         
         # Copier toutes les pages
-        for page in reader.pages:
-            # Compresser le contenu de la page
-            page.compress_content_streams()
-            writer.add_page(page)
+        with _span(tracer, 'pypdf.pages'):
+            for page in reader.pages:
+                # Compresser le contenu de la page
+                page.compress_content_streams()
+                writer.add_page(page)
         
         # Écrire le PDF compressé
-        with open(output_path, 'wb') as output_file:
-            writer.write(output_file)
+        with _span(tracer, 'pypdf.save'):
+            if hasattr(output_path, 'write'):
+                writer.write(output_path)
+            else:
+                with open(output_path, 'wb') as output_file:
+                    writer.write(output_file)
             
         return True
         
     except ImportError:
-        print("❌ PyPDF2 n'est pas installé. Installez-le avec: pip install PyPDF2")
+        _note(tracer, "PyPDF2 n'est pas installé. Installez-le avec: pip install PyPDF2")
         return False
     except Exception as e:
-        print(f"❌ Erreur avec PyPDF2: {e}")
+        _note(tracer, f"Erreur avec PyPDF2: {e}")
+        return False
+
+# Paramètres de recompression des images selon le niveau (qualité JPEG, dimension max)
+FITZ_IMAGE_PARAMS = {
+    'low': {'quality': 85, 'max_size': None},
+    'medium': {'quality': 75, 'max_size': 1500},
+    'high': {'quality': 60, 'max_size': 1000}
+}
+
+# Espaces colorimétriques PDF des modes Pillow réencodés en JPEG
+JPEG_COLORSPACES = {
+    'L': '/DeviceGray',
+    'RGB': '/DeviceRGB'
+}
+
+# Paliers de rééchantillonnage : 'fast' réduit par blocs (box) puis termine en bilinéaire,
+# 'quality' garde le filtre de Lanczos sur une image au moins deux fois plus grande que la cible
+RESAMPLING = ('quality', 'fast')
+
+def _resampling(resample):
+    """Filtre Pillow et reducing_gap correspondant à un palier de RESAMPLING"""
+    from PIL import Image
+
+    if resample == 'fast':
+        return Image.Resampling.BILINEAR, 1.0
+    return Image.Resampling.LANCZOS, 2.0
+
+@dataclass
+class ImageOptions:
+    """
+    Réglages du traitement des images partagés par les méthodes fitz et advanced
+
+    Attributes:
+        resample: Palier de rééchantillonnage ('quality' ou 'fast', voir RESAMPLING)
+        target_dpi: Résolution visée d'après la taille d'affichage de chaque image sur la page ;
+            remplace les dimensions max fixes du niveau (None = dimensions du niveau)
+        classify: Choisir l'encodeur de chaque image d'après son aperçu (JPEG couleur ou gris,
+            palette, Flate sans perte, 1 bit), voir analyze_image ; sans NumPy, tout est en JPEG
+        trial: Encoder les deux meilleurs candidats et garder le plus petit (plus lent)
+    """
+    resample: str = 'quality'
+    target_dpi: float = None
+    classify: bool = True
+    trial: bool = False
+
+@dataclass
+class EncodedImage:
+    """
+    Flux d'image réencodé, prêt à remplacer celui d'un xref
+
+    Attributes:
+        data: Flux encodé
+        width, height: Dimensions en pixels
+        colorspace: Espace colorimétrique PDF
+        filter: Filtre PDF du flux (/DCTDecode, /FlateDecode, /CCITTFaxDecode)
+        bits: Bits par composante
+        decode_parms: Dictionnaire /DecodeParms du filtre (None = aucun)
+        codec: Encodeur utilisé (voir CODECS)
+        candidates: Encodeurs candidats, du plus au moins adapté (voir select_codecs)
+        sizes: Taille obtenue par chaque candidat encodé {encodeur: octets}
+    """
+    data: bytes
+    width: int
+    height: int
+    colorspace: str = '/DeviceRGB'
+    filter: str = '/DCTDecode'
+    bits: int = 8
+    decode_parms: str = None
+    codec: str = 'jpeg'
+    candidates: list = None
+    sizes: dict = None
+
+    def pack(self):
+        """Sérialise le flux et son dictionnaire pour le cache disque"""
+        header = {name: value for name, value in asdict(self).items() if name != 'data'}
+        return json.dumps(header).encode() + b"\n" + self.data
+
+    @classmethod
+    def unpack(cls, blob):
+        """Relit une entrée produite par pack"""
+        header, _, data = blob.partition(b"\n")
+        return cls(data=data, **json.loads(header))
+
+# Encodeurs d'images : JPEG couleur, JPEG 8 bits gris, palette indexée (Flate), Flate sans perte
+# avec prédicteurs PNG, 1 bit noir et blanc (CCITT G4 ou Flate)
+CODECS = ('jpeg', 'gray', 'palette', 'flate', 'bilevel')
+
+# Analyse des images (NumPy) sur un aperçu d'au plus CLASSIFY_PREVIEW pixels de côté
+CLASSIFY_PREVIEW = 256
+# Image grise : écart entre canaux d'au plus GRAY_TOLERANCE, hors GRAY_OUTLIERS des pixels
+# (bruit de chrominance des JPEG, liserés de numérisation)
+GRAY_TOLERANCE = 12
+GRAY_OUTLIERS = 0.005
+# Image noir et blanc : au plus BILEVEL_MIDTONES des pixels entre les bornes de BILEVEL_BAND
+# (contours lissés et artefacts JPEG autour du texte numérisé)
+BILEVEL_BAND = (64, 192)
+BILEVEL_MIDTONES = 0.05
+BILEVEL_THRESHOLD = 128
+# Contour franc : écart de luminance de plus de EDGE_STEP avec le pixel voisin ; une image
+# en compte au moins SHARP_EDGES (texte, traits, captures d'écran) ou a au moins
+# FLAT_AREAS de pixels en aplat (dessins, graphiques) quand elle n'est pas photographique
+EDGE_STEP = 48
+SHARP_EDGES = 0.03
+FLAT_AREAS = 0.5
+# Taille maximale d'une palette indexée
+PALETTE_COLORS = 256
+
+@dataclass
+class ImageAnalysis:
+    """
+    Caractéristiques d'une image mesurées sur son aperçu (voir analyze_image)
+
+    Attributes:
+        kind: 'bilevel', 'gray' ou 'color'
+        colors: Nombre de couleurs distinctes de l'aperçu (None au-delà de PALETTE_COLORS)
+        edges: Part des pixels sur un contour franc
+        flat: Part des pixels dans un aplat (aucun écart avec leurs voisins)
+        alpha: L'image a un masque de transparence (/SMask)
+        lossy: L'image source est un JPEG (ses artefacts rendraient un encodage sans perte coûteux)
+        codecs: Encodeurs candidats, du plus au moins adapté
+    """
+    kind: str = 'color'
+    colors: int = None
+    edges: float = 0.0
+    flat: float = 0.0
+    alpha: bool = False
+    lossy: bool = False
+    codecs: tuple = ('jpeg',)
+
+    @property
+    def subsampling(self):
+        """Sous-échantillonnage JPEG de Pillow : 4:4:4 (0) sur les contours francs, 4:2:0 (2) sinon"""
+        return 0 if self.alpha or self.edges >= SHARP_EDGES else 2
+
+def select_codecs(analysis):
+    """
+    Classe les encodeurs adaptés à une image analysée, du plus au moins adapté
+
+    Le noir et blanc passe en 1 bit ; les dessins et graphiques (aplats, ou
+    contours francs sous un masque de transparence) en palette s'ils ont peu
+    de couleurs, sinon en Flate sans perte ; les photos en JPEG, en gris si
+    l'image l'est. Le JPEG dégraderait les traits que les autres encodeurs
+    conservent à l'identique ; une source déjà en JPEG y reste toutefois en
+    premier choix, l'encodeur sans perte ne venant qu'en second.
+
+    Returns:
+        tuple: Noms d'encodeurs (voir CODECS)
+    """
+    if analysis.kind == 'bilevel':
+        return ('bilevel', 'palette')
+    jpeg = 'gray' if analysis.kind == 'gray' else 'jpeg'
+    synthetic = analysis.flat >= FLAT_AREAS or (analysis.alpha and analysis.edges >= SHARP_EDGES)
+    if synthetic and analysis.lossy:
+        return (jpeg, 'palette' if analysis.colors is not None else 'flate')
+    if synthetic and analysis.colors is not None:
+        return ('palette', 'flate')
+    if synthetic and analysis.edges >= SHARP_EDGES:
+        return ('flate', jpeg)
+    return (jpeg, 'flate')
+
+def analyze_image(image, alpha=False, lossy=False, gray_tolerance=GRAY_TOLERANCE,
+                  bilevel_midtones=BILEVEL_MIDTONES):
+    """
+    Mesure les caractéristiques d'une image qui orientent le choix de son encodeur
+
+    Les mesures portent sur un aperçu échantillonné au plus proche voisin : les
+    valeurs des pixels sont celles de l'image (un filtre moyenneur créerait
+    des gris sur les contours) et le coût reste constant sur les grands scans.
+    Deux aperçus décalés d'un pixel source, à droite et en bas, donnent l'écart
+    de chaque pixel échantillonné avec ses voisins immédiats.
+
+    Args:
+        image (PIL.Image.Image): Image décodée ('L' ou 'RGB')
+        alpha (bool): L'image a un masque de transparence dans le PDF
+        lossy (bool): L'image source est un JPEG
+        gray_tolerance (int): Écart maximal entre canaux d'un pixel gris
+        bilevel_midtones (float): Part maximale de tons intermédiaires d'une image noir et blanc
+
+    Returns:
+        ImageAnalysis: Caractéristiques et encodeurs candidats (JPEG seul si NumPy n'est pas installé)
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return ImageAnalysis(kind='gray' if image.mode == 'L' else 'color', alpha=alpha, lossy=lossy)
+    from PIL import Image
+
+    width, height = image.size
+    if width < 2 or height < 2:
+        return ImageAnalysis(kind='gray' if image.mode == 'L' else 'color', alpha=alpha, lossy=lossy)
+    scale = min(1.0, CLASSIFY_PREVIEW / max(width - 1, height - 1))
+    size = (max(1, round((width - 1) * scale)), max(1, round((height - 1) * scale)))
+
+    def sample(left, top):
+        return image.resize(size, Image.Resampling.NEAREST, box=(left, top, left + width - 1, top + height - 1))
+
+    preview = sample(0, 0)
+    colors = preview.getcolors(PALETTE_COLORS)
+    analysis = ImageAnalysis(kind='gray', colors=len(colors) if colors else None, alpha=alpha, lossy=lossy)
+
+    if preview.mode != 'L':
+        pixels = np.asarray(preview.convert('RGB'), dtype=np.int16)
+        spread = pixels.max(axis=2) - pixels.min(axis=2)
+        if np.count_nonzero(spread > gray_tolerance) > GRAY_OUTLIERS * spread.size:
+            analysis.kind = 'color'
+
+    luminance = np.asarray(preview.convert('L'), dtype=np.int16)
+    step = np.maximum(np.abs(np.asarray(sample(1, 0).convert('L'), dtype=np.int16) - luminance),
+                      np.abs(np.asarray(sample(0, 1).convert('L'), dtype=np.int16) - luminance))
+    analysis.edges = float(np.count_nonzero(step > EDGE_STEP)) / step.size
+    analysis.flat = float(np.count_nonzero(step <= 1)) / step.size
+
+    if analysis.kind == 'gray':
+        low, high = BILEVEL_BAND
+        midtones = np.count_nonzero((luminance > low) & (luminance < high))
+        if midtones <= bilevel_midtones * luminance.size:
+            analysis.kind = 'bilevel'
+    analysis.codecs = select_codecs(analysis)
+    return analysis
+
+def classify_image(image, gray_tolerance=GRAY_TOLERANCE, bilevel_midtones=BILEVEL_MIDTONES):
+    """
+    Détermine si une image est en pratique en niveaux de gris ou en noir et blanc
+
+    Returns:
+        str: 'bilevel', 'gray' ou 'color' (voir analyze_image)
+    """
+    return analyze_image(image, gray_tolerance=gray_tolerance, bilevel_midtones=bilevel_midtones).kind
+
+def _open_image(image_bytes, bounds=None, resample='quality', tracer=None):
+    """
+    Ouvre et décode une image, à échelle réduite si c'est un JPEG plus grand que bounds
+
+    Le décodeur JPEG sait produire directement l'image au 1/2, 1/4 ou 1/8
+    (mode draft de Pillow, réduction dans le domaine DCT) : pour ne garder
+    qu'un millier de pixels de côté, inutile de décoder le scan en pleine
+    résolution. L'échelle choisie reste au moins égale à la taille finale
+    ('fast') ou à son double ('quality', marge pour le filtre de Lanczos).
+
+    Args:
+        image_bytes (bytes): Image extraite du PDF
+        bounds (tuple): Dimensions maximales (largeur, hauteur) de l'image finale, None pour aucune
+        resample (str): Palier de rééchantillonnage ('quality' ou 'fast')
+        tracer (Tracer): L'étape image.decode rapporte dimensions, échelle et mémoire décodée
+
+    Returns:
+        PIL.Image.Image: Image décodée
+    """
+    from PIL import Image
+
+    with _span(tracer, 'image.decode') as attributes:
+        image = Image.open(io.BytesIO(image_bytes))
+        source_size = image.size
+        if bounds and image.format == 'JPEG':
+            scale = min(bounds[0] / image.width, bounds[1] / image.height)
+            if scale < 1:
+                margin = 1 if resample == 'fast' else 2
+                requested = (math.ceil(image.width * scale * margin), math.ceil(image.height * scale * margin))
+                image.draft(image.mode, requested)
+        image.load()
+        attributes.update(
+            format=image.format,
+            source_size=source_size,
+            decoded_size=image.size,
+            # Mémoire des pixels décodés : le poste dominant du traitement d'une image
+            memory=image.width * image.height * len(image.getbands())
+        )
+    return image
+
+def _box(max_size):
+    """Dimensions max (largeur, hauteur) d'une taille max en pixels ou d'un couple, None sans limite"""
+    if not max_size:
+        return None
+    return tuple(max_size) if isinstance(max_size, (tuple, list)) else (max_size, max_size)
+
+def _decode_for_jpeg(image_bytes, tracer=None, max_size=None, resample='quality'):
+    """Décode une image extraite dans un mode encodable en JPEG (None si impossible)"""
+    image = _open_image(image_bytes, _box(max_size), resample, tracer)
+    if image.mode in ('RGBA', 'LA', 'P', 'CMYK'):
+        image = image.convert('RGB')
+    if image.mode not in JPEG_COLORSPACES:
+        return None
+    return image
+
+def _fit_within(image, max_size=None, tracer=None, resample='quality'):
+    """
+    Copie réduite à max_size pixels de côté, ou dans le cadre (largeur, hauteur) donné
+    (l'image elle-même si elle est déjà assez petite)
+    """
+    box = _box(max_size)
+    if box and (image.width > box[0] or image.height > box[1]):
+        method, reducing_gap = _resampling(resample)
+        with _span(tracer, 'image.resize'):
+            image = image.copy()
+            image.thumbnail(box, method, reducing_gap)
+    return image
+
+def _encode_jpeg(image, quality, subsampling=None):
+    """Encode une image 'L' ou 'RGB' en JPEG (EncodedImage)"""
+    output_buffer = io.BytesIO()
+    extra = {} if subsampling is None else {'subsampling': subsampling}
+    image.save(output_buffer, format='JPEG', quality=quality, optimize=True, **extra)
+    return EncodedImage(output_buffer.getvalue(), image.width, image.height, JPEG_COLORSPACES[image.mode],
+                        codec='gray' if image.mode == 'L' else 'jpeg')
+
+def _encode_flate(image, palette=False):
+    """
+    Encode une image sans perte en Flate avec prédicteurs PNG, indexée si palette
+
+    Pillow choisit le filtre PNG de chaque ligne et réduit la profondeur des
+    petites palettes ; les données IDAT sont directement un flux /FlateDecode
+    avec /Predictor 15. Une palette de plus de PALETTE_COLORS couleurs est
+    quantifiée, sans tramage (qui ruinerait la compression).
+    """
+    import struct
+    from PIL import Image
+
+    if palette:
+        colors = image.getcolors(PALETTE_COLORS)
+        image = image.quantize(len(colors) if colors else PALETTE_COLORS, dither=Image.Dither.NONE)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    png = buffer.getvalue()
+
+    position, chunks, plte = 8, [], b""
+    while position < len(png):
+        length, chunk_type = struct.unpack('>I4s', png[position:position + 8])
+        chunk = png[position + 8:position + 8 + length]
+        if chunk_type == b'IHDR':
+            width, height, bits, color_type = struct.unpack('>IIBB', chunk[:10])
+        elif chunk_type == b'PLTE':
+            plte = chunk
+        elif chunk_type == b'IDAT':
+            chunks.append(chunk)
+        position += 12 + length
+
+    if color_type == 3:
+        colorspace = f"[/Indexed /DeviceRGB {len(plte) // 3 - 1} <{plte.hex()}>]"
+    else:
+        colorspace = '/DeviceGray' if color_type == 0 else '/DeviceRGB'
+    components = 3 if color_type == 2 else 1
+    parms = f"<< /Predictor 15 /Colors {components} /BitsPerComponent {bits} /Columns {width} >>"
+    return EncodedImage(b"".join(chunks), width, height, colorspace, '/FlateDecode', bits, parms,
+                        'palette' if palette else 'flate')
+
+def _encode_bilevel(image):
+    """
+    Seuille une image en 1 bit et l'encode en CCITT G4, ou en Flate si c'est plus petit
+    (ou si Pillow n'a pas été compilé avec libtiff)
+    """
+    import zlib
+
+    image = image.convert('L').point(lambda value: 255 if value >= BILEVEL_THRESHOLD else 0, mode='1')
+    # Mode '1' de Pillow : lignes empaquetées, bit à 1 = blanc, comme /DeviceGray sur 1 bit
+    encoded = EncodedImage(zlib.compress(image.tobytes(), 9), image.width, image.height, '/DeviceGray',
+                           '/FlateDecode', 1, codec='bilevel')
+    try:
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        # Une seule bande : le flux G4 du TIFF est directement un flux /CCITTFaxDecode
+        image.save(buffer, format='TIFF', compression='group4', tiffinfo={278: image.height})
+        with Image.open(io.BytesIO(buffer.getvalue())) as tiff:
+            offset, length = tiff.tag_v2[273][0], tiff.tag_v2[279][0]
+    except Exception:
+        return encoded
+    if length < len(encoded.data):
+        # Pillow écrit en « min-is-black » : les bits à 1 du flux G4 sont les pixels blancs
+        parms = f"<< /K -1 /Columns {image.width} /Rows {image.height} /BlackIs1 true >>"
+        encoded = EncodedImage(buffer.getvalue()[offset:offset + length], image.width, image.height,
+                               '/DeviceGray', '/CCITTFaxDecode', 1, parms, 'bilevel')
+    return encoded
+
+def _encode_image(image, quality, max_size=None, tracer=None, resample='quality', analysis=None, trial=False):
+    """
+    Redimensionne puis encode une image avec l'encodeur retenu par son analyse
+
+    En mode essai, les deux premiers candidats sont encodés et le plus petit
+    flux est gardé.
+
+    Args:
+        image (PIL.Image.Image): Image décodée ('L' ou 'RGB')
+        quality (int): Qualité JPEG
+        max_size (int | tuple): Dimension maximale ou cadre (largeur, hauteur), None sans limite
+        tracer (Tracer): Mesure des étapes resize/encode (optionnel)
+        resample (str): Palier de rééchantillonnage
+        analysis (ImageAnalysis): Analyse de l'image (défaut: JPEG)
+        trial (bool): Encoder les deux meilleurs candidats
+
+    Returns:
+        EncodedImage: Flux retenu, avec les candidats et leurs tailles
+    """
+    analysis = analysis or ImageAnalysis()
+    # Conversion avant le redimensionnement : un seul canal à rééchantillonner
+    if analysis.kind != 'color' and image.mode != 'L':
+        image = image.convert('L')
+    image = _fit_within(image, max_size, tracer, resample)
+
+    best, sizes = None, {}
+    for codec in analysis.codecs[:2 if trial else 1]:
+        with _span(tracer, 'image.encode', codec=codec):
+            if codec == 'bilevel':
+                encoded = _encode_bilevel(image)
+            elif codec in ('palette', 'flate'):
+                encoded = _encode_flate(image, codec == 'palette')
+            else:
+                encoded = _encode_jpeg(image, quality, analysis.subsampling if analysis.kind == 'color' else None)
+        sizes[encoded.codec] = len(encoded.data)
+        if best is None or len(encoded.data) < len(best.data):
+            best = encoded
+    best.candidates, best.sizes = list(analysis.codecs), sizes
+    return best
+
+def _is_jpeg(image_bytes):
+    """Vrai si les octets sont un JPEG (marqueur SOI)"""
+    return image_bytes[:2] == b"\xff\xd8"
+
+def _analyze(image, options, tracer=None, alpha=False, lossy=False):
+    """Analyse d'une image décodée, JPEG seul si la classification est désactivée"""
+    if not options.classify:
+        return ImageAnalysis(kind='gray' if image.mode == 'L' else 'color', alpha=alpha, lossy=lossy)
+    with _span(tracer, 'image.classify') as attributes:
+        analysis = analyze_image(image, alpha, lossy)
+        attributes.update(kind=analysis.kind, codecs=analysis.codecs)
+    return analysis
+
+def _record_encoding(counters, xref, encoded, original_size, kept):
+    """Consigne l'encodeur choisi et la taille obtenue pour une image distincte"""
+    counters['images'].append({
+        'xref': xref,
+        'codec': encoded.codec,
+        'candidates': encoded.candidates,
+        'sizes': encoded.sizes,
+        'width': encoded.width,
+        'height': encoded.height,
+        'original_size': original_size,
+        'size': original_size if kept else len(encoded.data),
+        'kept': kept
+    })
+    if not kept:
+        counters['codecs'][encoded.codec] = counters['codecs'].get(encoded.codec, 0) + 1
+
+def _recompress_image(image_bytes, quality, max_size=None, cache=None, tracer=None, options=None, alpha=False):
+    """
+    Décode, redimensionne et réencode une image avec l'encodeur adapté (voir analyze_image)
+
+    Exécutée dans les threads du pool : Pillow libère le GIL dans ses codecs.
+
+    Args:
+        image_bytes (bytes): Image extraite du PDF
+        quality (int): Qualité JPEG
+        max_size (int | tuple): Dimension maximale en pixels, ou cadre (largeur, hauteur)
+            (None = pas de redimensionnement)
+        cache (ImageCache): Cache disque des images déjà encodées (optionnel)
+        tracer (Tracer): Mesure des étapes decode/resize/encode (optionnel)
+        options (ImageOptions): Réglages du traitement des images (optionnel)
+        alpha (bool): L'image a un masque de transparence dans le PDF
+
+    Returns:
+        EncodedImage: Flux réencodé, ou None si l'image est ignorée
+    """
+    options = options or ImageOptions()
+    try:
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key(image_bytes, mode='fitz', quality=quality, max_size=max_size,
+                                  resample=options.resample, classify=options.classify, trial=options.trial,
+                                  alpha=alpha)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return EncodedImage.unpack(cached)
+
+        image = _decode_for_jpeg(image_bytes, tracer, max_size, options.resample)
+        if image is None:
+            return None
+
+        encoded = _encode_image(image, quality, max_size, tracer, options.resample,
+                                _analyze(image, options, tracer, alpha, _is_jpeg(image_bytes)), options.trial)
+        if cache_key is not None:
+            cache.put(cache_key, encoded.pack())
+        return encoded
+    except Exception:
+        return None
+
+# Table de quantification de luminance de référence (JPEG annexe K, qualité 50)
+JPEG_LUMINANCE_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99
+)
+
+def estimate_jpeg_quality(image_bytes):
+    """
+    Estime la qualité (1-100, échelle IJG) d'un JPEG d'après sa table de quantification
+
+    Seul l'en-tête est lu. Les encodeurs courants (libjpeg, Pillow, la plupart
+    des scanners) dérivent leurs tables de la table de référence par un facteur
+    d'échelle : le rapport des sommes des coefficients retrouve ce facteur,
+    indépendamment de l'ordre de stockage (zigzag ou naturel).
+
+    Returns:
+        int: Qualité estimée, ou None si l'image n'est pas un JPEG lisible
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            tables = getattr(image, 'quantization', None)
+            if image.format != 'JPEG' or not tables:
+                return None
+            table = tables.get(0) or next(iter(tables.values()))
+    except Exception:
+        return None
+
+    scale = sum(table) * 100 / sum(JPEG_LUMINANCE_TABLE)
+    if scale <= 0:
+        return None
+    quality = 5000 / scale if scale > 100 else (200 - scale) / 2
+    return max(1, min(100, round(quality)))
+
+def _jpeg_at_target(base_image, quality, max_size=None):
+    """
+    Vrai si un JPEG extrait ne gagnerait rien à être réencodé : ses dimensions
+    tiennent déjà dans max_size et sa qualité estimée ne dépasse pas quality
+    """
+    box = _box(max_size)
+    if box and (base_image["width"] > box[0] or base_image["height"] > box[1]):
         return False
+    source_quality = estimate_jpeg_quality(base_image["image"])
+    return source_quality is not None and source_quality <= quality
 
-def compress_with_fitz(input_path, output_path, compression_level='medium'):
+def _write_image_stream(doc, xref, encoded):
+    """
+    Remplace le flux d'une image par sa version réencodée et met à jour son dictionnaire
+    """
+    doc.update_stream(xref, encoded.data, compress=0)
+    doc.xref_set_key(xref, "Filter", encoded.filter)
+    doc.xref_set_key(xref, "Width", str(encoded.width))
+    doc.xref_set_key(xref, "Height", str(encoded.height))
+    doc.xref_set_key(xref, "BitsPerComponent", str(encoded.bits))
+    doc.xref_set_key(xref, "ColorSpace", encoded.colorspace)
+    if encoded.decode_parms:
+        doc.xref_set_key(xref, "DecodeParms", encoded.decode_parms)
+    elif doc.xref_get_key(xref, "DecodeParms")[0] != "null":
+        doc.xref_set_key(xref, "DecodeParms", "null")
+    if doc.xref_get_key(xref, "Decode")[0] != "null":
+        doc.xref_set_key(xref, "Decode", "null")
+
+def collect_image_inventory(doc):
+    """
+    Inventaire des images d'un document ouvert
+
+    Chaque xref image est associé aux pages qui l'utilisent, puis les xrefs dont
+    le flux brut et le dictionnaire sont identiques sont regroupés (empreinte du
+    contenu) : chaque image distincte n'est ainsi traitée qu'une seule fois.
+
+    Args:
+        doc (fitz.Document): Document ouvert
+
+    Returns:
+        dict: {'pages': {xref: [numéros de page]},
+               'groups': [[xref, ...], ...] (le premier xref sert de représentant),
+               'placements': nombre total d'occurrences page/image,
+               'masks': xrefs servant de /SMask ou de /Mask à une autre image}
+    """
+    import hashlib
+
+    pages = {}
+    placements = 0
+    masks = set()
+    for page_num in range(doc.page_count):
+        for img in doc[page_num].get_images():
+            placements += 1
+            if img[1]:
+                masks.add(img[1])
+            xref_pages = pages.setdefault(img[0], [])
+            if not xref_pages or xref_pages[-1] != page_num:
+                xref_pages.append(page_num)
+    for xref in pages:
+        try:
+            kind, value = doc.xref_get_key(xref, "Mask")
+        except Exception:
+            continue
+        if kind == "xref":
+            masks.add(int(value.split()[0]))
+
+    groups = {}
+    for xref in pages:
+        digest = hashlib.sha256()
+        try:
+            # /Length exclu : seul le contenu et les paramètres de décodage comptent
+            for key in doc.xref_get_keys(xref):
+                if key != "Length":
+                    digest.update(f"{key}={doc.xref_get_key(xref, key)[1]};".encode())
+            digest.update(doc.xref_stream_raw(xref) or b"")
+            key = digest.hexdigest()
+        except Exception:
+            key = f"xref:{xref}"
+        groups.setdefault(key, []).append(xref)
+
+    return {
+        'pages': pages,
+        'groups': list(groups.values()),
+        'placements': placements,
+        'masks': masks
+    }
+
+def _is_mask_image(doc, group, inventory):
+    """
+    Vrai pour un masque de découpe (/ImageMask true) ou une image servant de masque
+    à une autre : leur structure (1 bit sans espace colorimétrique, niveaux de gris)
+    doit être conservée, elles ne sont donc jamais réencodées
+    """
+    if any(xref in inventory['masks'] for xref in group):
+        return True
+    try:
+        return doc.xref_get_key(group[0], "ImageMask")[1] == "true"
+    except Exception:
+        return False
+
+def _inventory_stats(inventory):
+    """Compteurs de travail évité grâce à l'inventaire des images"""
+    unique = len(inventory['groups'])
+    return {
+        'image_placements': inventory['placements'],
+        'image_xrefs': len(inventory['pages']),
+        'images_unique': unique,
+        'images_processed': 0,
+        'images_skipped': 0,
+        'images_kept': 0,
+        'codecs': {},
+        'images': [],
+        'recompressions_saved': inventory['placements'] - unique
+    }
+
+# Une image n'est rééchantillonnée que si sa résolution dépasse la cible de plus de 10 %
+TARGET_DPI_SLACK = 1.1
+
+# Jetons d'un flux de contenu ; seuls q, Q, cm et Do sont interprétés
+_CONTENT_TOKENS = re.compile(rb"""
+    (?P<skip>\s+|%[^\r\n]*|<<|>>|[\[\]{}]|<[0-9A-Fa-f\s]*>)
+  | (?P<string>\()
+  | /(?P<name>[^\s/\[\]<>(){}%]*)
+  | (?P<number>[+-]?(?:\d+\.?\d*|\.\d+))
+  | (?P<operator>[^\s/\[\]<>(){}%]+)
+""", re.X)
+_STRING_DELIMITERS = re.compile(rb"[\\()]")
+_INLINE_IMAGE_DATA = re.compile(rb"\sID\s")
+_INLINE_IMAGE_END = re.compile(rb"\sEI(?=\s|$)")
+_NAME_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+# Profondeur maximale des formulaires (XObject /Form) imbriqués
+FORM_DEPTH = 12
+
+def _content_operations(content):
+    """
+    Opérations q, Q, cm et Do d'un flux de contenu, avec leurs opérandes
+
+    Les chaînes et les images en ligne sont sautées sans être interprétées.
+
+    Yields:
+        tuple: (opérateur, [opérandes : nombres ou noms])
+    """
+    operands = []
+    position, length = 0, len(content)
+    while position < length:
+        match = _CONTENT_TOKENS.match(content, position)
+        if match is None:
+            position += 1
+            continue
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'number':
+            operands.append(float(match.group('number')))
+        elif kind == 'name':
+            name = _NAME_ESCAPE.sub(lambda escape: bytes([int(escape.group(1), 16)]), match.group('name'))
+            operands.append(name.decode('latin-1'))
+        elif kind == 'string':
+            depth = 1
+            while depth and position < length:
+                delimiter = _STRING_DELIMITERS.search(content, position)
+                if delimiter is None:
+                    position = length
+                    break
+                position = delimiter.end()
+                if delimiter.group() == b"\\":
+                    position += 1
+                else:
+                    depth += 1 if delimiter.group() == b"(" else -1
+        elif kind == 'operator':
+            operator = match.group('operator')
+            if operator == b"BI":
+                data = _INLINE_IMAGE_DATA.search(content, position)
+                end = _INLINE_IMAGE_END.search(content, data.end()) if data else None
+                position = end.end() if end else length
+            elif operator in (b"q", b"Q", b"cm", b"Do"):
+                yield operator, operands
+            operands = []
+
+def _form_matrix(doc, xref):
+    """Matrice /Matrix d'un formulaire (identité si absente)"""
+    import fitz
+
+    try:
+        kind, value = doc.xref_get_key(xref, "Matrix")
+        if kind == 'array':
+            values = [float(number) for number in value.strip("[]").split()]
+            if len(values) == 6:
+                return fitz.Matrix(*values)
+    except Exception:
+        pass
+    return fitz.Matrix(1, 0, 0, 1, 0, 0)
+
+def _walk_placements(doc, content, ctm, invoker, images, forms, on_image, depth=0):
+    """Suit la matrice courante dans un flux de contenu et signale chaque image peinte (Do)"""
+    stack = []
+    for operator, operands in _content_operations(content):
+        if operator == b"q":
+            stack.append(ctm)
+        elif operator == b"Q":
+            if stack:
+                ctm = stack.pop()
+        elif operator == b"cm":
+            if len(operands) >= 6 and all(isinstance(value, float) for value in operands[-6:]):
+                ctm = type(ctm)(*operands[-6:]) * ctm
+        elif operands and isinstance(operands[-1], str):
+            name = operands[-1]
+            if name in images.get(invoker, {}):
+                on_image(images[invoker][name], ctm)
+            elif name in forms.get(invoker, {}) and depth < FORM_DEPTH:
+                form = forms[invoker][name]
+                try:
+                    stream = doc.xref_stream(form)
+                except Exception:
+                    continue
+                _walk_placements(doc, stream or b"", _form_matrix(doc, form) * ctm, form, images, forms,
+                                 on_image, depth + 1)
+
+def collect_placement_sizes(doc, inventory):
+    """
+    Plus grande taille d'affichage de chaque image distincte, toutes pages confondues
+
+    Les flux de contenu des pages et de leurs formulaires sont parcourus pour
+    suivre la matrice courante (q, Q, cm) jusqu'à chaque Do : la longueur des
+    deux côtés de l'image y est lue, rotations et déformations comprises.
+    Aucune image n'est décodée (get_image_rects décode chaque image pour la
+    retrouver par empreinte).
+
+    Args:
+        doc (fitz.Document): Document ouvert
+        inventory (dict): Inventaire des images (voir collect_image_inventory)
+
+    Returns:
+        dict: {xref représentant: (largeur, hauteur) en points}, sans les images dont
+              aucun placement n'est retrouvé (motifs, annotations...)
+    """
+    import fitz
+
+    group_of = {xref: group[0] for group in inventory['groups'] for xref in group}
+    pages = sorted({page_num for page_nums in inventory['pages'].values() for page_num in page_nums})
+    sizes = {}
+
+    def on_image(xref, ctm):
+        representative = group_of.get(xref)
+        if representative is None:
+            return
+        width, height = sizes.get(representative, (0.0, 0.0))
+        sizes[representative] = (max(width, math.hypot(ctm.a, ctm.b)), max(height, math.hypot(ctm.c, ctm.d)))
+
+    for page_num in pages:
+        # Noms des ressources par appelant : 0 pour la page, xref du formulaire sinon
+        images, forms = {}, {}
+        try:
+            for item in doc.get_page_images(page_num, full=True):
+                images.setdefault(item[-1], {})[item[7]] = item[0]
+            for xref, name, invoker, _bbox in doc.get_page_xobjects(page_num):
+                forms.setdefault(invoker, {})[name] = xref
+            content = doc[page_num].read_contents()
+        except Exception:
+            continue
+        _walk_placements(doc, content, fitz.Matrix(1, 0, 0, 1, 0, 0), 0, images, forms, on_image)
+    return {xref: size for xref, size in sizes.items() if size[0] and size[1]}
+
+def _dpi_bounds(width, height, placement, target_dpi):
+    """
+    Cadre en pixels suffisant pour afficher une image à target_dpi sur sa plus grande occurrence
+
+    Returns:
+        tuple: (largeur, hauteur) en pixels, ou None si l'image est déjà à la résolution cible
+    """
+    scale = max(placement[0] / 72 * target_dpi / width, placement[1] / 72 * target_dpi / height)
+    if scale * TARGET_DPI_SLACK >= 1:
+        return None
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+def _recompress_images(doc, quality, max_size=None, workers=None, stats=None, cache=None, tracer=None,
+                       options=None):
+    """
+    Recompresse les images d'un document ouvert avec un pool de threads
+
+    Les images distinctes sont collectées d'abord via l'inventaire du document,
+    l'extraction et les écritures restent dans le thread principal (PyMuPDF n'est
+    pas thread-safe) et seuls le décodage, le redimensionnement et l'encodage sont
+    parallélisés. Les résultats sont appliqués dans l'ordre de collecte : la
+    sortie est identique quel que soit le nombre de workers.
+
+    Avec options.target_dpi, chaque image est réduite d'après sa plus grande
+    taille d'affichage. Un JPEG déjà aux dimensions et à la qualité cibles est
+    conservé tel quel, sans décodage ni réencodage, et le flux d'origine est
+    gardé chaque fois que le réencodage ne le rend pas plus petit. Avec
+    options.classify, l'encodeur de chaque image (JPEG, palette, Flate, 1 bit)
+    est choisi d'après son aperçu (voir analyze_image) ; stats['images'] rapporte
+    la décision et la taille obtenue pour chacune.
+
+    Args:
+        doc (fitz.Document): Document ouvert
+        quality (int): Qualité JPEG
+        max_size (int): Dimension maximale en pixels
+        workers (int): Nombre de threads (défaut: nombre de CPU)
+        stats (dict): Compteurs mis à jour (images distinctes, recompressions évitées)
+        cache (ImageCache): Cache disque des images déjà encodées (optionnel)
+        tracer (Tracer): Mesure des étapes (optionnel)
+        options (ImageOptions): Réglages du traitement des images (optionnel)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with _span(tracer, 'fitz.inventory'):
+        inventory = collect_image_inventory(doc)
+    groups = inventory['groups']
+    counters = _inventory_stats(inventory)
+    options = options or ImageOptions()
+    placements = {}
+    if options.target_dpi:
+        with _span(tracer, 'fitz.placements'):
+            placements = collect_placement_sizes(doc, inventory)
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    # Fenêtre bornée : seules quelques images extraites sont en mémoire à la fois
+    window = workers * 4
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(groups), window):
+            batch = []
+            for group in groups[start:start + window]:
+                if _is_mask_image(doc, group, inventory):
+                    continue
+                try:
+                    with _span(tracer, 'image.extract'):
+                        base_image = doc.extract_image(group[0])
+                except Exception:
+                    continue
+                if not base_image or base_image["ext"] not in ["png", "jpg", "jpeg"]:
+                    continue
+                bounds, at_dpi = max_size, False
+                if group[0] in placements:
+                    bounds = _dpi_bounds(base_image["width"], base_image["height"], placements[group[0]],
+                                         options.target_dpi)
+                    at_dpi = bounds is None
+                # Un PNG déjà sous la résolution cible est tout de même réencodé : le choix de l'encodeur
+                # (palette, 1 bit, JPEG) le réduit souvent, et il est conservé s'il grossirait
+                if base_image["ext"] != "png" and (at_dpi or _jpeg_at_target(base_image, quality, bounds)):
+                    # Rien à gagner : ni décodage ni réencodage
+                    counters['images_kept'] += 1
+                    continue
+                original_size = _xref_int(doc, group[0], "Length") or len(base_image["image"])
+                batch.append((group, base_image["image"], bounds, original_size, bool(base_image.get("smask"))))
+
+            results = executor.map(
+                lambda item: _recompress_image(item[1], quality, item[2], cache, tracer, options, item[4]), batch
+            )
+            for (group, _, _, original_size, _), encoded in zip(batch, results):
+                if encoded is None:
+                    counters['images_skipped'] += 1
+                    continue
+                kept = len(encoded.data) >= original_size
+                _record_encoding(counters, group[0], encoded, original_size, kept)
+                if kept:
+                    # Le réencodage grossirait l'image : flux d'origine conservé
+                    counters['images_kept'] += 1
+                    continue
+                counters['images_processed'] += 1
+                with _span(tracer, 'image.write'):
+                    for xref in group:
+                        try:
+                            _write_image_stream(doc, xref, encoded)
+                        except Exception:
+                            continue
+
+    if stats is not None:
+        stats.update(counters)
+    return counters
+
+def compress_with_fitz(input_path, output_path, compression_level='medium', workers=None, stats=None, cache=None,
+                       tracer=None, options=None):
     """
     Compresse un PDF avec PyMuPDF (fitz) - très efficace pour les images
     
     Args:
-        input_path (str): Chemin du fichier PDF d'entrée
-        output_path (str): Chemin du fichier PDF de sortie
+        input_path (str | bytes | fitz.Document): PDF d'entrée (chemin, contenu ou document ouvert,
+            modifié sur place)
+        output_path (str | file): Chemin du fichier PDF de sortie ou flux en écriture
         compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        workers (int): Nombre de threads pour la recompression des images
+        stats (dict): Compteurs d'images renseignés pendant le traitement (optionnel)
+        cache (ImageCache): Cache disque des images déjà encodées (optionnel)
+        tracer (Tracer): Mesure des étapes (optionnel)
+        options (ImageOptions): Réglages du traitement des images (optionnel)
     """
     try:
         import fitz  # PyMuPDF
+        import PIL  # noqa: F401 - requis pour la recompression des images
         
-        doc = fitz.open(input_path)
+        with _span(tracer, 'fitz.open'):
+            doc = _open_fitz(input_path)
         
         # Compression des images selon le niveau
-        if compression_level == 'low':
-            # Compression légère des images
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                image_list = page.get_images()
-                for img_index, img in enumerate(image_list):
-                    try:
-                        xref = img[0]
-                        base_image = doc.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        image_ext = base_image["ext"]
-                        
-                        if image_ext in ["png", "jpg", "jpeg"]:
-                            # Recompresser en JPEG avec qualité 85
-                            import io
-                            from PIL import Image
-                            image = Image.open(io.BytesIO(image_bytes))
-                            if image.mode == 'RGBA':
-                                image = image.convert('RGB')
-                            
-                            output_buffer = io.BytesIO()
-                            image.save(output_buffer, format='JPEG', quality=85, optimize=True)
-                            new_image_bytes = output_buffer.getvalue()
-                            
-                            # Remplacer l'image dans le PDF
-                            doc._update_stream(xref, new_image_bytes)
-                    except:
-                        continue
-                        
-        elif compression_level == 'medium':
-            # Compression modérée des images
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                image_list = page.get_images()
-                for img_index, img in enumerate(image_list):
-                    try:
-                        xref = img[0]
-                        base_image = doc.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        image_ext = base_image["ext"]
-                        
-                        if image_ext in ["png", "jpg", "jpeg"]:
-                            import io
-                            from PIL import Image
-                            image = Image.open(io.BytesIO(image_bytes))
-                            if image.mode == 'RGBA':
-                                image = image.convert('RGB')
-                            
-                            # Réduire la résolution si trop élevée
-                            max_width, max_height = 1500, 1500
-                            if image.width > max_width or image.height > max_height:
-                                image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-                            
-                            output_buffer = io.BytesIO()
-                            image.save(output_buffer, format='JPEG', quality=75, optimize=True)
-                            new_image_bytes = output_buffer.getvalue()
-                            
-                            doc._update_stream(xref, new_image_bytes)
-                    except:
-                        continue
-                        
-        elif compression_level == 'high':
-            # Compression maximale des images
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                image_list = page.get_images()
-                for img_index, img in enumerate(image_list):
-                    try:
-                        xref = img[0]
-                        base_image = doc.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        image_ext = base_image["ext"]
-                        
-                        if image_ext in ["png", "jpg", "jpeg"]:
-                            import io
-                            from PIL import Image
-                            image = Image.open(io.BytesIO(image_bytes))
-                            if image.mode == 'RGBA':
-                                image = image.convert('RGB')
-                            
-                            # Réduire significativement la résolution
-                            max_width, max_height = 1000, 1000
-                            if image.width > max_width or image.height > max_height:
-                                image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-                            
-                            output_buffer = io.BytesIO()
-                            image.save(output_buffer, format='JPEG', quality=60, optimize=True)
-                            new_image_bytes = output_buffer.getvalue()
-                            
-                            doc._update_stream(xref, new_image_bytes)
-                    except:
-                        continue
+        params = FITZ_IMAGE_PARAMS.get(compression_level, FITZ_IMAGE_PARAMS['medium'])
+        _recompress_images(doc, params['quality'], params['max_size'], workers, stats, cache, tracer, options)
         
-        # Sauvegarder avec compression de base
-        doc.save(output_path, garbage=4, clean=True, deflate=True)
-        doc.close()
+        # Sauvegarder avec compression de base (identifiant conservé : sortie reproductible)
+        with _span(tracer, 'fitz.save'):
+            doc.save(output_path, garbage=4, clean=True, deflate=True, no_new_id=True)
+        if doc is not input_path:
+            doc.close()
         
         return True
         
     except ImportError as ie:
         if "PIL" in str(ie) or "Pillow" in str(ie):
-            print("⚠️  Pillow non disponible, tentative sans compression d'images...")
-            return compress_with_fitz_basic(input_path, output_path, compression_level)
+            _note(tracer, "Pillow non disponible, compression PyMuPDF sans recompression des images")
+            return compress_with_fitz_basic(input_path, output_path, compression_level, tracer)
         else:
-            print("❌ PyMuPDF n'est pas installé. Installez-le avec: pip install PyMuPDF")
+            _note(tracer, "PyMuPDF n'est pas installé. Installez-le avec: pip install PyMuPDF")
             return False
     except Exception as e:
-        print(f"❌ Erreur avec PyMuPDF: {e}")
+        _note(tracer, f"Erreur avec PyMuPDF: {e}")
         return False
 
-def compress_with_fitz_basic(input_path, output_path, compression_level='medium'):
+def compress_with_fitz_basic(input_path, output_path, compression_level='medium', tracer=None):
     """
     Version basique de compression PyMuPDF sans Pillow
     """
     try:
-        import fitz
-        
-        doc = fitz.open(input_path)
+        doc = _open_fitz(input_path)
         
         # Paramètres selon le niveau
         if compression_level == 'high':
@@ -230,218 +1157,1840 @@ def compress_with_fitz_basic(input_path, output_path, compression_level='medium'
             params = {'garbage': 1, 'clean': True, 'deflate': True}
         
         doc.save(output_path, **params)
-        doc.close()
+        if doc is not input_path:
+            doc.close()
         
         return True
         
     except Exception as e:
-        print(f"❌ Erreur avec PyMuPDF basique: {e}")
+        _note(tracer, f"Erreur avec PyMuPDF basique: {e}")
         return False
 
-def compress_image_pdf_advanced(input_path, output_path, quality=75, max_width=1200):
+# Mémoire de travail d'une image, en multiple de ses pixels décodés : image décodée,
+# copie convertie ou réduite, tampons de l'encodeur
+DECODE_MEMORY_FACTOR = 3
+# Budget mémoire par défaut du traitement par lots (--memory-budget), en octets
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+class MemoryBudgetExceeded(Exception):
+    """Une image dépasse à elle seule le budget mémoire du traitement par lots"""
+
+def estimate_image_memory(doc, xref, bounds=None, resample='quality'):
     """
-    Compression avancée pour PDF contenant principalement des images
+    Mémoire de travail estimée pour recompresser une image, d'après son seul dictionnaire
+
+    Le flux n'est pas lu : dimensions, longueur et filtre suffisent. Un JPEG
+    plus grand que bounds est compté à l'échelle de son décodage réduit
+    (voir _open_image), les autres en pleine résolution.
+
+    Args:
+        doc (fitz.Document): Document ouvert
+        xref (int): xref de l'image
+        bounds (int | tuple): Dimension maximale ou cadre (largeur, hauteur) visé
+        resample (str): Palier de rééchantillonnage ('quality' ou 'fast')
+
+    Returns:
+        int: Octets
+    """
+    width, height = _xref_int(doc, xref, "Width"), _xref_int(doc, xref, "Height")
+    box = _box(bounds)
+    if box and width and height and "DCTDecode" in doc.xref_get_key(xref, "Filter")[1]:
+        scale = min(box[0] / width, box[1] / height)
+        if scale < 1:
+            # Même choix que le mode draft de Pillow : la plus forte réduction (1/8 à 1/2) qui
+            # garde au moins la taille demandée
+            margin = 1 if resample == 'fast' else 2
+            requested = (max(1, math.ceil(width * scale * margin)), max(1, math.ceil(height * scale * margin)))
+            limit = min(width // requested[0], height // requested[1])
+            reduction = next((factor for factor in (8, 4, 2) if factor <= limit), 1)
+            width, height = math.ceil(width / reduction), math.ceil(height / reduction)
+    # Les conversions passent par le RVB (ou le CMJN) : au moins trois octets par pixel
+    colorspace = doc.xref_get_key(xref, "ColorSpace")[1]
+    bands = 4 if "CMYK" in colorspace else 3
+    return _xref_int(doc, xref, "Length") + width * height * bands * DECODE_MEMORY_FACTOR
+
+def compress_with_fitz_chunked(input_path, output_path, compression_level='medium',
+                               memory_budget=DEFAULT_MEMORY_BUDGET, workers=None, stats=None, cache=None,
+                               tracer=None, options=None):
+    """
+    Compresse un gros PDF par lots de pages sans dépasser un budget mémoire
+
+    Le document est copié à côté de la sortie puis ouvert depuis le disque
+    (seuls les objets lus sont chargés). Les images distinctes sont traitées
+    dans l'ordre des pages, par lots dont la mémoire de travail estimée
+    (voir estimate_image_memory) tient dans le budget ; chaque lot est écrit
+    par sauvegarde incrémentale puis le document est rouvert, ce qui libère
+    les flux modifiés et le cache de MuPDF. La sauvegarde finale réécrit le
+    fichier complet en supprimant les anciens flux. Le pic de mémoire dépend
+    ainsi du budget, pas du nombre de pages.
+
+    Args:
+        input_path (str): Chemin du PDF d'entrée
+        output_path (str): Chemin du PDF de sortie
+        compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        memory_budget (int): Mémoire de travail maximale des images d'un lot, en octets
+            (hors empreinte de base du processus)
+        workers (int): Nombre de threads pour la recompression des images
+        stats (dict): Compteurs d'images (optionnel)
+        cache (ImageCache): Cache disque des images déjà encodées (optionnel)
+        tracer (Tracer): Mesure des étapes (optionnel)
+        options (ImageOptions): Réglages du traitement des images (optionnel)
+
+    Returns:
+        bool: Succès
+
+    Raises:
+        MemoryBudgetExceeded: Une image demande à elle seule plus que le budget
     """
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
     try:
         import fitz
-        from PIL import Image
-        import io
-        
-        doc = fitz.open(input_path)
-        new_doc = fitz.open()
-        
-        for page_num in range(doc.page_count):
-            page = doc[page_num]
-            page_rect = page.rect
-            new_page = new_doc.new_page(width=page_rect.width, height=page_rect.height)
-            image_list = page.get_images()
-            
-            for img_index, img in enumerate(image_list):
-                try:
-                    xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    
-                    # Compression avec Pillow
-                    pil_image = Image.open(io.BytesIO(image_bytes))
-                    
-                    if pil_image.mode in ('RGBA', 'LA', 'P'):
-                        background = Image.new('RGB', pil_image.size, (255, 255, 255))
-                        if pil_image.mode == 'P':
-                            pil_image = pil_image.convert('RGBA')
-                        background.paste(pil_image, mask=pil_image.split()[-1] if pil_image.mode in ('RGBA', 'LA') else None)
-                        pil_image = background
-                    elif pil_image.mode != 'RGB':
-                        pil_image = pil_image.convert('RGB')
-                    
-                    # Redimensionner si nécessaire
-                    if pil_image.width > max_width:
-                        ratio = max_width / pil_image.width
-                        new_height = int(pil_image.height * ratio)
-                        pil_image = pil_image.resize((max_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    # Compresser en JPEG
-                    compressed_buffer = io.BytesIO()
-                    pil_image.save(compressed_buffer, format='JPEG', quality=quality, optimize=True)
-                    compressed_bytes = compressed_buffer.getvalue()
-                    
-                    # Insérer l'image compressée
-                    image_rects = page.get_image_rects(xref)
-                    if image_rects:
-                        for rect in image_rects:
-                            new_page.insert_image(rect, stream=compressed_bytes)
-                    else:
-                        new_page.insert_image(page_rect, stream=compressed_bytes)
-                        
-                except:
-                    continue
-        
-        new_doc.save(output_path, garbage=4, clean=True, deflate=True)
-        new_doc.close()
-        doc.close()
-        
-        return True
-        
+        import PIL  # noqa: F401 - requis pour la recompression des images
     except ImportError:
+        _note(tracer, "PyMuPDF et Pillow sont requis pour le traitement par lots")
         return False
-    except:
+
+    params = FITZ_IMAGE_PARAMS.get(compression_level, FITZ_IMAGE_PARAMS['medium'])
+    quality, max_size = params['quality'], params['max_size']
+    options = options or ImageOptions()
+    workers = max(1, workers or os.cpu_count() or 1)
+
+    fd, work_path = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
+    doc = None
+    try:
+        with _span(tracer, 'chunked.copy'):
+            shutil.copyfile(input_path, work_path)
+        with _span(tracer, 'fitz.open'):
+            doc = fitz.open(work_path)
+        incremental = doc.can_save_incrementally()
+        if not incremental:
+            _note(tracer, "Sauvegarde incrémentale impossible (document réparé ou chiffré) : "
+                          "les images modifiées restent en mémoire jusqu'à la fin")
+
+        with _span(tracer, 'fitz.inventory'):
+            inventory = collect_image_inventory(doc)
+        counters = _inventory_stats(inventory)
+        placements = {}
+        if options.target_dpi:
+            with _span(tracer, 'fitz.placements'):
+                placements = collect_placement_sizes(doc, inventory)
+
+        # Lots d'images consécutives (ordre des pages) dont la mémoire estimée tient dans le budget
+        batches, batch, batch_memory = [], [], 0
+        for group in inventory['groups']:
+            if _is_mask_image(doc, group, inventory):
+                continue
+            bounds = max_size
+            if group[0] in placements:
+                bounds = _dpi_bounds(_xref_int(doc, group[0], "Width") or 1, _xref_int(doc, group[0], "Height") or 1,
+                                     placements[group[0]], options.target_dpi)
+            memory = estimate_image_memory(doc, group[0], bounds, options.resample)
+            if memory > memory_budget:
+                raise MemoryBudgetExceeded(
+                    f"L'image xref {group[0]} ({_xref_int(doc, group[0], 'Width')}x"
+                    f"{_xref_int(doc, group[0], 'Height')} px, page {inventory['pages'][group[0]][0] + 1}) "
+                    f"demande environ {memory / (1024 * 1024):.0f} Mo, au-delà du budget mémoire de "
+                    f"{memory_budget / (1024 * 1024):.0f} Mo"
+                )
+            if batch and batch_memory + memory > memory_budget:
+                batches.append(batch)
+                batch, batch_memory = [], 0
+            batch.append((group, bounds, group[0] in placements and bounds is None))
+            batch_memory += memory
+        if batch:
+            batches.append(batch)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for number, batch in enumerate(batches):
+                with _span(tracer, 'chunked.batch', images=len(batch)):
+                    items = []
+                    for group, bounds, at_dpi in batch:
+                        try:
+                            with _span(tracer, 'image.extract'):
+                                base_image = doc.extract_image(group[0])
+                        except Exception:
+                            continue
+                        if not base_image or base_image["ext"] not in ["png", "jpg", "jpeg"]:
+                            continue
+                        if base_image["ext"] != "png" and (at_dpi or _jpeg_at_target(base_image, quality, bounds)):
+                            counters['images_kept'] += 1
+                            continue
+                        original_size = _xref_int(doc, group[0], "Length") or len(base_image["image"])
+                        items.append((group, base_image["image"], bounds, original_size,
+                                      bool(base_image.get("smask"))))
+                        del base_image
+
+                    results = executor.map(
+                        lambda item: _recompress_image(item[1], quality, item[2], cache, tracer, options, item[4]),
+                        items
+                    )
+                    for (group, _, _, original_size, _), encoded in zip(items, results):
+                        if encoded is None:
+                            counters['images_skipped'] += 1
+                            continue
+                        kept = len(encoded.data) >= original_size
+                        _record_encoding(counters, group[0], encoded, original_size, kept)
+                        if kept:
+                            counters['images_kept'] += 1
+                            continue
+                        counters['images_processed'] += 1
+                        with _span(tracer, 'image.write'):
+                            for xref in group:
+                                try:
+                                    _write_image_stream(doc, xref, encoded)
+                                except Exception:
+                                    continue
+                    del items, results
+
+                if incremental and number < len(batches) - 1:
+                    # Lot écrit sur disque : les flux modifiés et le cache de MuPDF sont libérés
+                    with _span(tracer, 'chunked.flush'):
+                        doc.saveIncr()
+                        doc.close()
+                        fitz.TOOLS.store_shrink(100)
+                        doc = fitz.open(work_path)
+
+        with _span(tracer, 'fitz.save'):
+            doc.save(output_path, garbage=4, clean=True, deflate=True, no_new_id=True)
+        counters['batches'] = len(batches)
+        if stats is not None:
+            stats.update(counters)
+        return True
+
+    except MemoryBudgetExceeded:
+        raise
+    except Exception as e:
+        _note(tracer, f"Erreur avec le traitement par lots: {e}")
         return False
+    finally:
+        if doc is not None:
+            doc.close()
+        os.remove(work_path)
 
-def get_file_size(file_path):
-    """Retourne la taille du fichier en Mo"""
-    return os.path.getsize(file_path) / (1024 * 1024)
+# Recherche de la taille cible : qualités JPEG extrêmes et dimensions max essayées,
+# de la moins à la plus agressive (les préréglages de niveau servent de point de départ)
+TARGET_QUALITY_RANGE = (30, 95)
+TARGET_DIMENSIONS = (None, 3000, 2400, 2000, 1500, 1200, 1000, 800, 600, 400)
+# Marge de sécurité appliquée à l'estimation (dictionnaires d'images, arrondis)
+TARGET_MARGIN = 0.02
+# Sauvegardes au plus : la taille écrite corrige l'estimation de la recherche suivante
+TARGET_ATTEMPTS = 3
 
-def compress_pdf(input_path, output_path=None, method='auto', compression_level='medium'):
-    """
-    Fonction principale de compression PDF
+def _highest_fitting(low, high, fits):
+    """Plus grande valeur de [low, high] vérifiant fits (décroissante), ou None"""
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        if fits(middle):
+            best, low = middle, middle + 1
+        else:
+            high = middle - 1
+    return best
+
+def _lowest_fitting(low, high, fits):
+    """Plus petite valeur de [low, high] vérifiant fits (croissante), ou None"""
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        if fits(middle):
+            best, high = middle, middle - 1
+        else:
+            low = middle + 1
+    return best
+
+def compress_to_target_size(input_path, output_path, target_size, compression_level='medium', workers=None,
+                            stats=None, cache=None, tracer=None, options=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Compresse un PDF sous une taille cible en sauvegardant le document le moins de fois possible
+
+    La taille de sortie est estimée comme la somme des tailles des images
+    réencodées et du reste du document (mesuré une seule fois, images vidées).
+    La qualité JPEG et la dimension maximale sont ajustées par dichotomie sur
+    cette estimation : d'abord la qualité autour du préréglage du niveau, puis
+    la dimension si la qualité minimale ne suffit pas (ou, si le préréglage
+    tient dans la cible, une dimension plus grande et une meilleure qualité).
+    La taille réellement écrite est ensuite vérifiée : si elle dépasse la
+    cible, l'écart corrige l'estimation et la recherche reprend (au plus
+    TARGET_ATTEMPTS sauvegardes).
+
+    Seuls les octets d'origine et l'analyse de chaque image sont conservés ; les
+    images sont décodées à la dimension essayée quand il le faut, et les images
+    réduites ne sont gardées d'une qualité à l'autre que dans la limite de
+    memory_budget.
+
+    Args:
+        input_path (str | bytes | fitz.Document): PDF d'entrée
+        output_path (str | file): Chemin du fichier PDF de sortie ou flux en écriture
+        target_size (int): Taille maximale visée en octets
+        compression_level (str): Préréglage de départ ('low', 'medium', 'high')
+        workers (int): Nombre de threads pour l'encodage des images
+        stats (dict): Compteurs d'images (optionnel)
+        cache (ImageCache): Cache disque des images (encodages retenus uniquement)
+        tracer (Tracer): Mesure des étapes (optionnel)
+        options (ImageOptions): Réglages du traitement des images (optionnel)
+        memory_budget (int): Mémoire en octets des images réduites gardées entre deux estimations
+
+    Returns:
+        dict: Paramètres retenus et estimation ({'quality', 'max_size', 'estimated_size',
+              'written_size', 'overhead', 'fits', 'evaluations', 'saves'}), ou None en cas d'échec
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    options = options or ImageOptions()
+    resample = options.resample
+    try:
+        import fitz
+
+        with _span(tracer, 'fitz.open'):
+            doc = _open_fitz(input_path)
+        # Source d'origine, rouverte si une sauvegarde dépasse la cible
+        original = input_path if isinstance(input_path, (str, bytes)) else doc.tobytes()
+        with _span(tracer, 'fitz.inventory'):
+            inventory = collect_image_inventory(doc)
+        skipped = 0
+
+        # Analyse faite une fois par image distincte ; seule l'image encodée d'origine est gardée
+        sources = []
+        for group in inventory['groups']:
+            if _is_mask_image(doc, group, inventory):
+                continue
+            try:
+                with _span(tracer, 'image.extract'):
+                    base_image = doc.extract_image(group[0])
+            except Exception:
+                continue
+            if not base_image or base_image["ext"] not in ["png", "jpg", "jpeg"]:
+                continue
+            try:
+                image = _decode_for_jpeg(base_image["image"], tracer)
+            except Exception:
+                image = None
+            if image is None:
+                skipped += 1
+                continue
+            analysis = _analyze(image, options, tracer, bool(base_image.get("smask")),
+                                _is_jpeg(base_image["image"]))
+            del image
+            original_size = _xref_int(doc, group[0], "Length") or len(base_image["image"])
+            sources.append((group, base_image["image"], original_size, analysis))
+
+        # Reste du document : une copie dont les images traitées sont vidées. garbage=3 et non 4 :
+        # une fois vidées, les images de même dictionnaire seraient fusionnées et leur coût oublié
+        with _span(tracer, 'target.overhead'):
+            shell = fitz.open("pdf", original) if isinstance(original, bytes) else fitz.open(original)
+            for group, *_ in sources:
+                for xref in group:
+                    shell.update_stream(xref, b"", compress=0)
+            overhead = len(shell.tobytes(garbage=3, clean=True, deflate=True, no_new_id=True))
+            shell.close()
+
+        workers = max(1, workers or os.cpu_count() or 1)
+        budget = target_size * (1 - TARGET_MARGIN)
+        estimates = {}
+        kept = {'settings': None, 'encoded': None}
+        # Images réduites à la dimension en cours : réutilisées pour chaque qualité essayée tant que
+        # le budget mémoire le permet, de même que les encodages sans perte (palette, Flate, 1 bit)
+        # qui ne dépendent pas de la qualité
+        resized = {'max_size': 0, 'images': {}, 'memory': 0, 'lossless': {}}
+        lock = threading.Lock()
+
+        def prepare(index, max_size):
+            image = resized['images'].get(index)
+            if image is not None:
+                return image
+            image = _decode_for_jpeg(sources[index][1], tracer, max_size, resample)
+            if sources[index][3].kind != 'color' and image.mode != 'L':
+                # Images grises ou noir et blanc : un seul canal
+                image = image.convert('L')
+            image = _fit_within(image, max_size, tracer, resample)
+            memory = image.width * image.height * len(image.getbands())
+            with lock:
+                if resized['memory'] + memory <= memory_budget:
+                    resized['images'][index] = image
+                    resized['memory'] += memory
+            return image
+
+        def encode(index, quality, max_size):
+            analysis = sources[index][3]
+            lossless = not {'jpeg', 'gray'} & set(analysis.codecs[:2 if options.trial else 1])
+            if lossless and index in resized['lossless']:
+                return resized['lossless'][index]
+            encoded = _encode_image(prepare(index, max_size), quality, None, tracer, resample, analysis,
+                                    options.trial)
+            if lossless:
+                resized['lossless'][index] = encoded
+            return encoded
+
+        def evaluate(quality, max_size):
+            settings = (quality, max_size)
+            if settings not in estimates:
+                with _span(tracer, 'target.evaluate', quality=quality, max_size=max_size):
+                    if resized['max_size'] != max_size:
+                        resized.update(max_size=max_size, images={}, memory=0, lossless={})
+                    encoded = list(executor.map(lambda index: encode(index, quality, max_size),
+                                                range(len(sources))))
+                # Une image que le réencodage grossirait garde son flux d'origine
+                size = overhead + sum(min(len(item.data), source[2]) for item, source in zip(encoded, sources))
+                estimates[settings] = size
+                # Seuls les encodages de la meilleure solution connue restent en mémoire
+                if size <= budget or kept['settings'] is None or estimates[kept['settings']] > budget:
+                    kept.update(settings=settings, encoded=encoded)
+            return estimates[settings] <= budget
+
+        params = FITZ_IMAGE_PARAMS.get(compression_level, FITZ_IMAGE_PARAMS['medium'])
+        start_quality = params['quality']
+        dimensions = list(TARGET_DIMENSIONS)
+        if params['max_size'] not in dimensions:
+            dimensions.append(params['max_size'])
+            dimensions.sort(key=lambda size: -(size or float('inf')))
+        start = dimensions.index(params['max_size'])
+        min_quality, max_quality = TARGET_QUALITY_RANGE
+
+        def search():
+            if evaluate(start_quality, dimensions[start]):
+                # Le préréglage tient : dimension la plus grande, puis meilleure qualité possibles
+                index = _lowest_fitting(0, start, lambda i: evaluate(start_quality, dimensions[i]))
+                quality = _highest_fitting(start_quality, max_quality,
+                                           lambda q: evaluate(q, dimensions[index]))
+            else:
+                index = start
+                quality = _highest_fitting(min_quality, start_quality - 1,
+                                           lambda q: evaluate(q, dimensions[index]))
+                if quality is None:
+                    # Qualité minimale insuffisante : réduire aussi les dimensions
+                    index = _lowest_fitting(start + 1, len(dimensions) - 1,
+                                            lambda i: evaluate(min_quality, dimensions[i]))
+                    if index is None:
+                        index, quality = len(dimensions) - 1, min_quality
+                    else:
+                        quality = _highest_fitting(min_quality, start_quality,
+                                                   lambda q: evaluate(q, dimensions[index]))
+            settings = (quality, dimensions[index])
+            evaluate(*settings)
+            if kept['settings'] != settings:
+                # Solution retenue écartée de la mémoire entre-temps : dernier encodage
+                estimates.pop(settings)
+                kept['settings'] = None
+                evaluate(*settings)
+            return settings
+
+        evaluations = 0
+        for attempt in range(1, TARGET_ATTEMPTS + 1):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                settings = search()
+            evaluations += len(estimates)
+
+            counters = _inventory_stats(inventory)
+            counters['images_skipped'] = skipped
+            with _span(tracer, 'image.write'):
+                for (group, _, original_size, _), encoded in zip(sources, kept['encoded']):
+                    kept_original = len(encoded.data) >= original_size
+                    _record_encoding(counters, group[0], encoded, original_size, kept_original)
+                    if kept_original:
+                        counters['images_kept'] += 1
+                        continue
+                    counters['images_processed'] += 1
+                    for xref in group:
+                        try:
+                            _write_image_stream(doc, xref, encoded)
+                        except Exception:
+                            continue
+
+            with _span(tracer, 'fitz.save'):
+                data = doc.tobytes(garbage=4, clean=True, deflate=True, no_new_id=True)
+            estimated = estimates[settings]
+            if len(data) <= target_size or settings == (min_quality, dimensions[-1]) or attempt == TARGET_ATTEMPTS:
+                break
+            # Estimation trop optimiste : l'écart mesuré est reporté sur le reste du document
+            overhead += len(data) - estimated
+            estimates.clear()
+            kept.update(settings=None, encoded=None)
+            del data
+            if doc is not input_path:
+                doc.close()
+            doc = _open_fitz(original)
+
+        if hasattr(output_path, 'write'):
+            output_path.write(data)
+        else:
+            with open(output_path, 'wb') as output_file:
+                output_file.write(data)
+        if doc is not input_path:
+            doc.close()
+
+        if cache is not None:
+            for (group, image_bytes, original_size, analysis), encoded in zip(sources, kept['encoded']):
+                if len(encoded.data) < original_size:
+                    cache.put(cache.key(image_bytes, mode='fitz', quality=settings[0], max_size=settings[1],
+                                        resample=resample, classify=options.classify, trial=options.trial,
+                                        alpha=analysis.alpha), encoded.pack())
+
+        if stats is not None:
+            stats.update(counters)
+        return {
+            'target_size': target_size,
+            'quality': settings[0],
+            'max_size': settings[1],
+            'estimated_size': estimated,
+            'written_size': len(data),
+            'overhead': overhead,
+            'fits': estimated <= budget,
+            'evaluations': evaluations,
+            'saves': attempt
+        }
+
+    except ImportError:
+        _note(tracer, "PyMuPDF et Pillow sont requis pour la compression à taille cible")
+        return None
+    except Exception as e:
+        _note(tracer, f"Erreur lors de la compression à taille cible: {e}")
+        return None
+
+def _encode_advanced_image(image_bytes, quality=75, max_width=1200, cache=None, tracer=None, options=None,
+                           alpha=False):
+    """
+    Aplatit une image sur fond blanc, limite sa largeur et l'encode avec l'encodeur
+    adapté (JPEG, palette, Flate ou 1 bit : voir analyze_image)
+
+    Les JPEG plus larges que max_width sont décodés à échelle réduite (voir _open_image).
+
+    Returns:
+        EncodedImage: Image compressée
+    """
+    from PIL import Image
+
+    options = options or ImageOptions()
+    resample = options.resample
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key(image_bytes, mode='advanced', quality=quality, max_width=max_width,
+                              resample=resample, classify=options.classify, trial=options.trial, alpha=alpha)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return EncodedImage.unpack(cached)
+
+    pil_image = _open_image(image_bytes, (max_width, float('inf')), resample, tracer)
+
+    if pil_image.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', pil_image.size, (255, 255, 255))
+        if pil_image.mode == 'P':
+            pil_image = pil_image.convert('RGBA')
+        background.paste(pil_image, mask=pil_image.split()[-1] if pil_image.mode in ('RGBA', 'LA') else None)
+        pil_image = background
+    elif pil_image.mode not in ('RGB', 'L'):
+        pil_image = pil_image.convert('RGB')
+    analysis = _analyze(pil_image, options, tracer, alpha, _is_jpeg(image_bytes))
+    if analysis.kind != 'color' and pil_image.mode != 'L':
+        pil_image = pil_image.convert('L')
+
+    # Redimensionner si nécessaire
+    if pil_image.width > max_width:
+        ratio = max_width / pil_image.width
+        new_height = int(pil_image.height * ratio)
+        method, reducing_gap = _resampling(resample)
+        with _span(tracer, 'image.resize'):
+            pil_image = pil_image.resize((max_width, new_height), method, reducing_gap=reducing_gap)
+
+    encoded = _encode_image(pil_image, quality, None, tracer, resample, analysis, options.trial)
+    if cache_key is not None:
+        cache.put(cache_key, encoded.pack())
+    return encoded
+
+def compress_image_pdf_advanced(input_path, output_path, quality=75, max_width=1200, stats=None, cache=None,
+                                tracer=None, options=None):
+    """
+    Compression avancée pour PDF contenant principalement des images
+
+    Chaque image distincte (voir collect_image_inventory) est compressée une
+    seule fois et son flux remplacé sous ses xrefs existants : flux de contenu,
+    polices, texte et graphismes vectoriels restent intacts, et une image
+    affichée à plusieurs endroits reste un seul objet. Le cache disque
+    optionnel (ImageCache) évite de les réencoder d'un document à l'autre.
+    L'entrée peut être un chemin, un contenu en mémoire ou un document ouvert
+    (modifié sur place). Avec options.target_dpi, la largeur max dépend de la
+    plus grande taille d'affichage de chaque image au lieu de max_width.
+    """
+    try:
+        import PIL  # noqa: F401 - requis pour la compression des images
+
+        with _span(tracer, 'advanced.open'):
+            doc = _open_fitz(input_path)
+
+        with _span(tracer, 'advanced.inventory'):
+            inventory = collect_image_inventory(doc)
+        counters = _inventory_stats(inventory)
+        options = options or ImageOptions()
+        placements = {}
+        if options.target_dpi:
+            with _span(tracer, 'advanced.placements'):
+                placements = collect_placement_sizes(doc, inventory)
+
+        for group in inventory['groups']:
+            representative = group[0]
+            if _is_mask_image(doc, group, inventory):
+                continue
+            try:
+                with _span(tracer, 'image.extract'):
+                    base_image = doc.extract_image(representative)
+                if not base_image:
+                    continue
+                width, at_dpi = max_width, False
+                if representative in placements:
+                    bounds = _dpi_bounds(base_image["width"], base_image["height"],
+                                         placements[representative], options.target_dpi)
+                    width = bounds[0] if bounds else base_image["width"]
+                    at_dpi = bounds is None
+                jpeg = base_image["ext"] in ("jpg", "jpeg")
+                if jpeg and (at_dpi or _jpeg_at_target(base_image, quality, (width, float('inf')))):
+                    # JPEG déjà aux dimensions et à la qualité cibles : conservé sans décodage ni réencodage
+                    counters['images_kept'] += 1
+                    continue
+
+                encoded = _encode_advanced_image(base_image["image"], quality, width, cache, tracer, options,
+                                                 bool(base_image.get("smask")))
+            except Exception:
+                counters['images_skipped'] += 1
+                continue
+
+            original_size = _xref_int(doc, representative, "Length") or len(base_image["image"])
+            kept = len(encoded.data) >= original_size
+            _record_encoding(counters, representative, encoded, original_size, kept)
+            if kept:
+                # Le réencodage grossirait l'image : flux d'origine conservé
+                counters['images_kept'] += 1
+                continue
+            counters['images_processed'] += 1
+            with _span(tracer, 'image.write'):
+                for xref in group:
+                    try:
+                        _write_image_stream(doc, xref, encoded)
+                    except Exception:
+                        continue
+
+        # Sauvegarde avec identifiant conservé : sortie reproductible
+        with _span(tracer, 'advanced.save'):
+            doc.save(output_path, garbage=4, clean=True, deflate=True, no_new_id=True)
+        if doc is not input_path:
+            doc.close()
+
+        if stats is not None:
+            stats.update(counters)
+
+        return True
+
+    except ImportError:
+        _note(tracer, "PyMuPDF et Pillow sont requis pour la compression avancée")
+        return False
+    except Exception as e:
+        _note(tracer, f"Erreur avec la compression avancée: {e}")
+        return False
+
+# Étapes enchaînées en mémoire pour chaque méthode du mode auto : les passes
+# d'images PyMuPDF sont suivies d'une passe structurelle pikepdf (flux d'objets)
+AUTO_PIPELINES = {
+    'pikepdf': ('pikepdf',),
+    'fitz': ('fitz', 'pikepdf'),
+    'pypdf': ('pypdf',),
+    'advanced': ('advanced', 'pikepdf')
+}
+
+# Méthodes essayées (ou mises en concurrence par le mode course) en mode auto
+RACE_BACKENDS = ('pikepdf', 'fitz', 'pypdf')
+
+def _run_method(method, source, output, compression_level='medium', workers=None, stats=None, cache=None,
+                tracer=None, options=None):
+    """Exécute une seule méthode de compression (entrée et sortie: chemin ou mémoire)"""
+    if method == 'pikepdf':
+        return compress_with_pikepdf(source, output, compression_level, tracer)
+    elif method == 'fitz':
+        return compress_with_fitz(source, output, compression_level, workers, stats, cache, tracer, options)
+    elif method == 'pypdf':
+        return compress_with_pypdf(source, output, tracer)
+    elif method == 'advanced':
+        return compress_image_pdf_advanced(source, output, 75, 1200, stats, cache, tracer, options)
+    raise ValueError(f"Méthode inconnue: {method}")
+
+def run_pipeline(source, stages, compression_level='medium', workers=None, stats=None, cache=None, tracer=None,
+                 options=None):
+    """
+    Enchaîne des méthodes en mémoire sans écrire de fichier intermédiaire
+
+    Chaque étape lit la sortie de la précédente depuis un BytesIO. La première
+    étape est obligatoire ; les suivantes sont des passes de finition conservées
+    seulement si elles réussissent et réduisent la taille.
+
+    Args:
+        source (str | bytes | fitz.Document): PDF d'entrée
+        stages (tuple): Méthodes à enchaîner ('pikepdf', 'fitz', 'pypdf', 'advanced')
+        compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        workers (int): Nombre de threads pour la recompression des images
+        stats (dict): Compteurs d'images (optionnel)
+        cache (ImageCache): Cache disque des images recompressées (optionnel)
+        tracer (Tracer): Mesure des étapes (optionnel)
+        options (ImageOptions): Réglages du traitement des images (optionnel)
+
+    Returns:
+        bytes: PDF produit, ou None si la première étape a échoué
+    """
+    data = None
+    for stage in stages:
+        buffer = io.BytesIO()
+        if not _run_method(stage, source if data is None else data, buffer,
+                           compression_level, workers, stats, cache, tracer, options):
+            if data is None:
+                return None
+            continue
+        result = buffer.getvalue()
+        if data is None or len(result) < len(data):
+            data = result
+    return data
+
+def _race_worker(method, source, compression_level, workers, cache, options, forward_events, conn):
+    """Exécute une méthode dans un processus séparé et renvoie son résultat au parent"""
+    start = time.perf_counter()
+    image_stats = {}
+    # Après un fork, le cache hérite des compteurs du parent : seul l'écart est renvoyé
+    cache_before = cache.stats() if cache is not None else None
+    # Les durées des étapes sont renvoyées au parent avec le résultat : les événements un par un
+    # si le parent a un hook, sinon les seuls cumuls
+    events = [] if forward_events else None
+    tracer = Tracer(events.append if forward_events else None)
+    data = run_pipeline(source, AUTO_PIPELINES[method], compression_level, workers, image_stats, cache, tracer,
+                        options)
+    cache_stats = None
+    if cache is not None:
+        cache_stats = {name: value - cache_before[name] for name, value in cache.stats().items()
+                       if name in ('hits', 'misses', 'stores', 'evictions')}
+    conn.send((data, time.perf_counter() - start, image_stats, cache_stats,
+               events if forward_events else tracer.timings, tracer.messages))
+    conn.close()
+
+def _is_valid_pdf(data):
+    """Vérification rapide d'une sortie : en-tête %PDF et marqueur de fin présents"""
+    return bool(data) and data[:5] == b'%PDF-' and b'%%EOF' in data[-1024:]
+
+def race_backends(source, compression_level='medium', backends=RACE_BACKENDS,
+                  timeout=120, workers=None, stats=None, cache=None, tracer=None, options=None):
+    """
+    Lance les méthodes en parallèle et conserve la plus petite sortie valide
+
+    Chaque méthode tourne dans son propre processus et renvoie sa sortie par
+    un tube qui lui est propre ; les processus encore actifs à l'échéance sont
+    arrêtés sans affecter les autres. Les threads de recompression sont
+    répartis entre les processus, pour ne pas avantager la méthode la moins
+    gourmande en CPU. Avec un hook, les étapes de chaque processus lui sont
+    transmises à la fin de ce processus, avec l'attribut 'backend' (rien pour
+    une méthode arrêtée à l'échéance).
+
+    Args:
+        source (str | bytes): PDF d'entrée (chemin ou contenu)
+        compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        backends (tuple): Méthodes mises en concurrence
+        timeout (float): Budget de temps par méthode en secondes
+        workers (int): Nombre total de threads pour la recompression des images (défaut: nombre de CPU)
+        stats (dict): Compteurs d'images de la méthode gagnante (optionnel)
+        cache (ImageCache): Cache disque des images recompressées (optionnel)
+        tracer (Tracer): Reçoit les étapes de chaque processus (optionnel)
+        options (ImageOptions): Réglages du traitement des images (optionnel)
+
+    Returns:
+        dict: {'winner': méthode retenue ou None, 'data': sortie retenue ou None,
+               'attempts': [{'method', 'status', 'seconds', 'size'}, ...]}
+    """
+    import multiprocessing
+    from multiprocessing.connection import wait
+
+    context = multiprocessing.get_context()
+    workers = max(1, (workers or os.cpu_count() or 1) // len(backends))
+    forward_events = tracer is not None and tracer.hook is not None
+    attempts = {method: {'method': method, 'status': 'timeout', 'seconds': None, 'size': None}
+                for method in backends}
+    processes = {}
+    connections = {}
+    for method in backends:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_race_worker,
+            args=(method, source, compression_level, workers, cache, options, forward_events, sender),
+            daemon=True
+        )
+        process.start()
+        sender.close()
+        processes[method] = process
+        connections[receiver] = method
+
+    deadline = time.monotonic() + timeout
+    outputs = {}
+    worker_stats = {}
+    while connections:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        for conn in wait(list(connections), timeout=remaining):
+            method = connections.pop(conn)
+            try:
+                data, seconds, image_stats, cache_stats, steps, messages = conn.recv()
+            except (EOFError, OSError):
+                # Processus mort sans réponse (crash)
+                attempts[method]['status'] = 'crashed'
+                continue
+            finally:
+                conn.close()
+
+            attempts[method]['seconds'] = seconds
+            worker_stats[method] = image_stats
+            if forward_events:
+                for event in steps:
+                    tracer.record(event['name'], event['seconds'], event['start'],
+                                  **dict(event['attributes'], backend=method))
+            elif tracer is not None:
+                tracer.merge(steps)
+            for message in messages:
+                _note(tracer, message)
+            if cache is not None and cache_stats:
+                cache.merge(cache_stats)
+            if _is_valid_pdf(data):
+                outputs[method] = data
+                attempts[method]['status'] = 'ok'
+                attempts[method]['size'] = len(data)
+            else:
+                attempts[method]['status'] = 'failed'
+
+    # Échéance atteinte : arrêter les méthodes encore en cours
+    for conn, method in connections.items():
+        attempts[method]['seconds'] = timeout
+        conn.close()
+    for process in processes.values():
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+    winner = None
+    if outputs:
+        winner = min(outputs, key=lambda method: (len(outputs[method]), backends.index(method)))
+        if stats is not None:
+            stats.update(worker_stats.get(winner, {}))
+
+    return {
+        'winner': winner,
+        'data': outputs.get(winner),
+        'attempts': [attempts[method] for method in backends]
+    }
+
+SHARD_METHODS = ('fitz', 'advanced')
+
+def split_page_ranges(page_count, shards):
+    """
+    Découpe les pages en plages contiguës de tailles égales (à une page près)
+
+    Returns:
+        list: [(première page, page suivant la dernière), ...], au plus une plage par page
+    """
+    shards = max(1, min(shards, page_count))
+    size, extra = divmod(page_count, shards)
+    ranges, start = [], 0
+    for index in range(shards):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def compress_shard_images(method, compression_level, workers, cache, options, input_path, output_path):
+    """
+    Compresseur de tranche pour compress_sharded : passe d'images fitz ou méthode avancée
+
+    Les premiers arguments sont liés avec functools.partial, les chemins sont
+    fournis par compress_sharded.
+
+    Returns:
+        dict: {'images': compteurs d'images, 'cache': écart des compteurs du cache,
+               'messages': avertissements de la méthode}, ou None en cas d'échec
+    """
+    image_stats = {}
+    # Après un fork, le cache hérite des compteurs du parent : seul l'écart est renvoyé
+    cache_before = cache.stats() if cache is not None else None
+    tracer = Tracer()
+    if not _run_method(method, input_path, output_path, compression_level, workers, image_stats, cache, tracer,
+                       options):
+        return None
+    cache_stats = None
+    if cache is not None:
+        cache_stats = {name: value - cache_before[name] for name, value in cache.stats().items()
+                       if name in ('hits', 'misses', 'stores', 'evictions')}
+    return {'images': image_stats, 'cache': cache_stats, 'messages': tracer.messages}
+
+def _shard_worker(input_path, first, last, directory, compressor):
+    """Extrait une plage de pages dans un PDF temporaire puis la compresse dans le processus fils"""
+    import fitz
+
+    start = time.perf_counter()
+    sys.stdout = open(os.devnull, 'w')
+    shard_input = os.path.join(directory, f"shard-{first:06d}-input.pdf")
+    shard_output = os.path.join(directory, f"shard-{first:06d}.pdf")
+    with fitz.open(input_path) as doc:
+        doc.select(range(first, last))
+        # Seuls les objets atteints depuis les pages retenues sont écrits
+        doc.save(shard_input, garbage=3)
+    try:
+        report = compressor(shard_input, shard_output)
+    finally:
+        os.remove(shard_input)
+    if report is None or not os.path.exists(shard_output):
+        return None, time.perf_counter() - start
+    return (shard_output, report), time.perf_counter() - start
+
+def _merge_image_stats(total, stats):
+    """Additionne les compteurs d'images d'une tranche à ceux du document"""
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            merged = total.setdefault(name, {})
+            for key, count in value.items():
+                merged[key] = merged.get(key, 0) + count
+        elif isinstance(value, list):
+            total.setdefault(name, []).extend(value)
+        elif isinstance(value, (int, float)):
+            total[name] = total.get(name, 0) + value
+
+def compress_sharded(input_path, output_path, compressor, shards=None, processes=None, stats=None, cache=None,
+                     tracer=None):
+    """
+    Compresse un gros PDF par plages de pages réparties sur plusieurs processus
+
+    Chaque processus extrait sa plage de pages (avec les seules ressources
+    qu'elle utilise), la compresse avec compressor puis l'écrit dans un
+    fichier temporaire. Les tranches sont ensuite réassemblées dans l'ordre et
+    la sauvegarde finale (garbage=4) fusionne les objets identiques : une
+    police ou une image partagée, extraite puis encodée de la même façon dans
+    chaque tranche (les encodeurs sont déterministes), ne figure qu'une fois
+    dans le document produit. Les métadonnées et les signets de l'original
+    sont repris.
+
+    Args:
+        input_path (str): Chemin du PDF d'entrée
+        output_path (str): Chemin du PDF de sortie
+        compressor (callable): compressor(entrée, sortie) compresse une tranche et renvoie un dict
+            (voir compress_shard_images ; 'images' et 'cache' y sont cumulés, 'messages' transmis
+            au tracer) ou None en cas d'échec.
+            Il doit pouvoir être transmis à un processus (fonction de module, functools.partial)
+        shards (int): Nombre de tranches (défaut: processes)
+        processes (int): Nombre de processus (défaut: nombre de CPU)
+        stats (dict): Compteurs d'images cumulés de toutes les tranches (optionnel)
+        cache (ImageCache): Cache dont les compteurs reçoivent l'activité des tranches (optionnel)
+        tracer (Tracer): Mesure des étapes (optionnel)
+
+    Returns:
+        bool: Succès (toutes les tranches compressées et réassemblées)
+    """
+    import multiprocessing
+    import shutil
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    try:
+        import fitz
+    except ImportError:
+        _note(tracer, "PyMuPDF est requis pour la compression par tranches")
+        return False
+
+    with fitz.open(input_path) as doc:
+        page_count = doc.page_count
+        metadata = doc.metadata
+        toc = doc.get_toc(simple=False)
+    processes = max(1, processes or os.cpu_count() or 1)
+    ranges = split_page_ranges(page_count, shards or processes)
+
+    directory = tempfile.mkdtemp(prefix="shards-", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with _span(tracer, 'shard.compress', shards=len(ranges)):
+            with ProcessPoolExecutor(max_workers=min(processes, len(ranges)),
+                                     mp_context=multiprocessing.get_context()) as executor:
+                futures = [executor.submit(_shard_worker, input_path, first, last, directory, compressor)
+                           for first, last in ranges]
+                outcomes = [future.result() for future in futures]
+
+        shard_paths = []
+        for (first, last), (outcome, seconds) in zip(ranges, outcomes):
+            if tracer is not None:
+                tracer.record('shard', seconds, pages=last - first)
+            if outcome is None:
+                _note(tracer, f"Échec de la tranche des pages {first + 1} à {last}")
+                return False
+            shard_path, report = outcome
+            shard_paths.append(shard_path)
+            if stats is not None:
+                _merge_image_stats(stats, report.get('images') or {})
+            if cache is not None and report.get('cache'):
+                cache.merge(report['cache'])
+            for message in report.get('messages') or ():
+                _note(tracer, message)
+
+        with _span(tracer, 'shard.merge'):
+            merged = fitz.open()
+            try:
+                for shard_path in shard_paths:
+                    with fitz.open(shard_path) as shard:
+                        merged.insert_pdf(shard)
+                merged.set_metadata(metadata)
+                if toc:
+                    merged.set_toc(toc)
+                # garbage=4 fusionne aussi les flux identiques (polices, images) répétés d'une tranche à l'autre
+                merged.save(output_path, garbage=4, clean=True, deflate=True, no_new_id=True)
+            finally:
+                merged.close()
+        if stats is not None:
+            stats['shards'] = len(ranges)
+        return True
+
+    except Exception as e:
+        _note(tracer, f"Erreur avec la compression par tranches: {e}")
+        return False
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# Seuils de la détection des PDF composés principalement d'images
+LARGE_IMAGE_BYTES = 1024 * 1024
+IMAGE_PAGE_RATIO = 0.5
+
+@dataclass
+class ImageInfo:
+    """Description d'une image lue dans son dictionnaire, sans décoder le flux"""
+    xref: int
+    width: int
+    height: int
+    bits_per_component: int
+    filters: list
+    length: int
+    pages: list = field(default_factory=list)
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+@dataclass
+class DocumentProfile:
+    """Profil d'un document produit par probe_pdf"""
+    page_count: int
+    sampled_pages: list
+    image_placements: int
+    images: list
+    file_size: int = 0
+
+    @property
+    def images_per_page(self):
+        """Nombre moyen d'images par page échantillonnée"""
+        return self.image_placements / len(self.sampled_pages) if self.sampled_pages else 0.0
+
+    @property
+    def large_images(self):
+        """Images dont le flux encodé dépasse LARGE_IMAGE_BYTES"""
+        return sum(1 for image in self.images if image.length > LARGE_IMAGE_BYTES)
+
+    @property
+    def image_bytes(self):
+        """Taille encodée des images distinctes des pages échantillonnées"""
+        return sum(image.length for image in self.images)
+
+    @property
+    def image_pixels(self):
+        """Nombre de pixels décodés des images distinctes des pages échantillonnées"""
+        return sum(image.pixels for image in self.images)
+
+    @property
+    def filters(self):
+        """Nombre d'images par filtre de compression (/DCTDecode, /FlateDecode...)"""
+        counts = {}
+        for image in self.images:
+            name = '+'.join(image.filters) or 'aucun'
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    @property
+    def image_heavy(self):
+        """Au moins une grande image et une image pour deux pages en moyenne"""
+        return self.large_images >= 1 and self.images_per_page >= IMAGE_PAGE_RATIO
+
+def _sample_page_numbers(page_count, sample_pages):
+    """Pages réparties régulièrement sur tout le document (première et dernière incluses)"""
+    if page_count <= sample_pages:
+        return list(range(page_count))
+    if sample_pages <= 1:
+        return [0]
+    step = (page_count - 1) / (sample_pages - 1)
+    return sorted({round(i * step) for i in range(sample_pages)})
+
+def _xref_int(doc, xref, key, default=0):
+    """Lit une clé entière d'un dictionnaire, référence indirecte comprise"""
+    kind, value = doc.xref_get_key(xref, key)
+    try:
+        if kind == 'xref':
+            return int(doc.xref_object(int(value.split()[0])).strip())
+        return int(float(value))
+    except (ValueError, TypeError):
+        return default
+
+def probe_pdf(source, sample_pages=12):
+    """
+    Profil rapide d'un PDF à partir des seuls dictionnaires d'images
+
+    Lit /Length, /Filter, /Width, /Height et /BitsPerComponent de chaque image
+    des pages échantillonnées sans jamais lire ni décoder les flux.
+
+    Args:
+        source (str | bytes | fitz.Document): Chemin du PDF, contenu en mémoire ou document déjà ouvert
+        sample_pages (int): Nombre maximal de pages analysées, réparties sur le document
+
+    Returns:
+        DocumentProfile: Profil du document
+    """
+    doc = _open_fitz(source)
+    try:
+        pages = _sample_page_numbers(doc.page_count, sample_pages)
+        images = {}
+        placements = 0
+        for page_num in pages:
+            for img in doc[page_num].get_images():
+                placements += 1
+                xref = img[0]
+                if xref not in images:
+                    kind, value = doc.xref_get_key(xref, "Filter")
+                    images[xref] = ImageInfo(
+                        xref=xref,
+                        width=_xref_int(doc, xref, "Width"),
+                        height=_xref_int(doc, xref, "Height"),
+                        bits_per_component=_xref_int(doc, xref, "BitsPerComponent", 8),
+                        filters=value.strip('[]').split() if kind in ('name', 'array') else [],
+                        length=_xref_int(doc, xref, "Length")
+                    )
+                if page_num not in images[xref].pages:
+                    images[xref].pages.append(page_num)
+
+        file_size = 0
+        if isinstance(source, (str, os.PathLike)):
+            file_size = os.path.getsize(source)
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            file_size = len(source)
+
+        return DocumentProfile(
+            page_count=doc.page_count,
+            sampled_pages=pages,
+            image_placements=placements,
+            images=list(images.values()),
+            file_size=file_size
+        )
+    finally:
+        if doc is not source:
+            doc.close()
+
+# Méthodes acceptées par compress_pdf et compress_pdf_bytes
+METHODS = ('auto', 'pikepdf', 'fitz', 'pypdf', 'advanced')
+
+@dataclass
+class CompressionResult:
+    """
+    Résultat d'une compression : PDF produit et statistiques structurées
+
+    Évalué comme booléen, il vaut success (compatible avec les appels qui
+    testaient le True/False de compress_pdf).
+    """
+    success: bool
+    method: str
+    compression_level: str
+    input_size: int
+    data: bytes = None
+    backend: str = None
+    attempts: list = field(default_factory=list)
+    image_stats: dict = field(default_factory=dict)
+    cache_stats: dict = None
+    profile: DocumentProfile = None
+    error: str = None
+    timings: dict = field(default_factory=dict)
+    memory_peak: int = None
+    rss_peak: int = None
+    output_path: str = None
+    written_size: int = None
+    target_size: int = None
+    target_search: dict = None
+    messages: list = field(default_factory=list)
+    image_options: ImageOptions = field(default_factory=ImageOptions)
+
+    def __bool__(self):
+        return self.success
+
+    def to_dict(self):
+        """Résultat sans le PDF produit, sérialisable en JSON (métriques, journaux)"""
+        values = {name: getattr(self, name) for name in self.__dataclass_fields__
+                  if name not in ('data', 'profile', 'image_options')}
+        values['image_options'] = asdict(self.image_options)
+        values['output_size'] = self.output_size
+        values['reduction'] = self.reduction
+        values['profile'] = asdict(self.profile) if self.profile is not None else None
+        return values
+
+    @property
+    def output_size(self):
+        if self.data is not None:
+            return len(self.data)
+        # Traitement par lots : la sortie est écrite directement sur le disque
+        return self.written_size or 0
+
+    @property
+    def reduction(self):
+        """Réduction de taille en pourcentage"""
+        if not self.success or not self.input_size:
+            return 0.0
+        return ((self.input_size - self.output_size) / self.input_size) * 100
+
+def _timed_pipeline(method, source, stages, compression_level, workers, stats, cache, tracer, options=None):
+    """Exécute un pipeline et retourne (sortie, tentative décrite pour CompressionResult)"""
+    start = time.perf_counter()
+    with tracer.span('attempt', method=method):
+        data = run_pipeline(source, stages, compression_level, workers, stats, cache, tracer, options)
+    attempt = {
+        'method': method,
+        'status': 'ok' if data is not None else 'failed',
+        'seconds': time.perf_counter() - start,
+        'size': len(data) if data is not None else None
+    }
+    return data, attempt
+
+def _peak_rss():
+    """Pic de mémoire résidente du processus en octets (None si indisponible)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilo-octets sous Linux, octets sous macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _options_error(method, resample, target_size, target_dpi):
+    """Message d'erreur pour une combinaison de réglages invalide (None si elle est valide)"""
+    if method not in METHODS:
+        return f"Méthode inconnue: {method}"
+    if resample not in RESAMPLING:
+        return f"Palier de rééchantillonnage inconnu: {resample}"
+    if target_size and method not in ('auto', 'fitz'):
+        return f"La taille cible n'est disponible qu'avec les méthodes auto et fitz (pas {method})"
+    if target_dpi is not None and target_dpi <= 0:
+        return f"Résolution cible invalide: {target_dpi}"
+    if target_dpi and target_size:
+        # La recherche de taille cible choisit elle-même les dimensions des images
+        return "La taille cible et la résolution cible ne peuvent pas être combinées"
+    return None
+
+@contextmanager
+def _measured(result, hook=None, trace_memory=False):
+    """Mesure une compression : durées par étape, pic tracemalloc et pic RSS, enregistrés dans result"""
+    import tracemalloc
+
+    tracer = Tracer(hook)
+    result.timings = tracer.timings
+    result.messages = tracer.messages
+    started_tracing = False
+    if trace_memory:
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+            started_tracing = True
+
+    try:
+        with tracer.span('total', method=result.method, compression_level=result.compression_level):
+            yield tracer
+    finally:
+        if trace_memory:
+            result.memory_peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+        result.rss_peak = _peak_rss()
+
+def _compress_into(result, data, workers, cache, race, backend_timeout, tracer):
+    """Exécute la compression décrite par result et y enregistre sortie et tentatives"""
+    method = result.method
+    compression_level = result.compression_level
+    options = result.image_options
+    output_data = None
+
+    if result.target_size:
+        # Taille cible : recherche des paramètres d'images sur estimations, une seule sauvegarde
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        with tracer.span('attempt', method='target'):
+            result.target_search = compress_to_target_size(data, buffer, result.target_size, compression_level,
+                                                           workers, result.image_stats, cache, tracer,
+                                                           options)
+        if result.target_search is not None:
+            output_data = buffer.getvalue()
+            result.backend = 'fitz'
+        result.attempts.append({
+            'method': 'target',
+            'status': 'ok' if output_data is not None else 'failed',
+            'seconds': time.perf_counter() - start,
+            'size': len(output_data) if output_data is not None else None
+        })
+    elif method == 'auto':
+        # Détecter si c'est un PDF principalement composé d'images
+        doc = None
+        try:
+            # Document ouvert une seule fois pour la sonde et la compression avancée
+            with tracer.span('open'):
+                doc = _open_fitz(data)
+            with tracer.span('detect'):
+                result.profile = probe_pdf(doc)
+
+            # Si beaucoup d'images volumineuses, utiliser la compression avancée
+            if result.profile.image_heavy:
+                output_data, attempt = _timed_pipeline('advanced', doc, AUTO_PIPELINES['advanced'],
+                                                       compression_level, workers, result.image_stats,
+                                                       cache, tracer, options)
+                result.attempts.append(attempt)
+                if output_data is not None:
+                    result.backend = 'advanced'
+        except Exception as e:
+            result.error = f"Erreur détection: {e}"
+        finally:
+            if doc is not None:
+                doc.close()
+
+        # Si pas de compression avancée ou si elle a échoué, essayer les méthodes classiques
+        if output_data is None and race:
+            with tracer.span('race'):
+                report = race_backends(data, compression_level, RACE_BACKENDS, backend_timeout,
+                                       workers, result.image_stats, cache, tracer, options)
+            for attempt in report['attempts']:
+                tracer.record('attempt', attempt['seconds'] or 0.0, method=attempt['method'],
+                              status=attempt['status'])
+            result.attempts.extend(report['attempts'])
+            if report['winner']:
+                output_data = report['data']
+                result.backend = report['winner']
+        elif output_data is None:
+            for method_name in RACE_BACKENDS:
+                candidate, attempt = _timed_pipeline(method_name, data, AUTO_PIPELINES[method_name],
+                                                     compression_level, workers, result.image_stats,
+                                                     cache, tracer, options)
+                result.attempts.append(attempt)
+                if candidate is None:
+                    continue
+                # Vérifier si la compression est efficace : au moins 5% de réduction
+                if (len(data) - len(candidate)) / len(data) * 100 > 5:
+                    output_data = candidate
+                    result.backend = method_name
+                    break
+                attempt['status'] = 'inefficient'
+    else:
+        # Utiliser la méthode spécifiée
+        output_data, attempt = _timed_pipeline(method, data, (method,), compression_level,
+                                               workers, result.image_stats, cache, tracer, options)
+        result.attempts.append(attempt)
+        if output_data is not None:
+            result.backend = method
+
+    if output_data is not None:
+        result.success = True
+        result.data = output_data
+        result.error = None
+    elif result.error is None:
+        result.error = "Échec de la compression avec toutes les méthodes"
+
+def compress_pdf_bytes(data, method='auto', compression_level='medium', workers=None, cache=None,
+                       race=False, backend_timeout=120, hook=None, trace_memory=False, target_size=None,
+                       resample='quality', target_dpi=None, classify=True, trial=False):
+    """
+    Compresse un PDF entièrement en mémoire, sans accès au système de fichiers
+
+    Args:
+        data (bytes): Contenu du PDF d'entrée
+        method (str): Méthode de compression ('auto', 'pikepdf', 'fitz', 'pypdf', 'advanced')
+        compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        workers (int): Nombre de threads pour la recompression des images (défaut: nombre de CPU)
+        cache (ImageCache): Cache disque des images recompressées (optionnel)
+        race (bool): En mode auto, lancer les méthodes en parallèle et garder la plus petite sortie
+        backend_timeout (float): Budget de temps par méthode en mode course (secondes)
+        hook (callable): Reçoit un événement par étape terminée (voir Tracer), optionnel
+        trace_memory (bool): Mesurer le pic de mémoire Python avec tracemalloc (plus lent)
+        target_size (int): Taille maximale visée en octets ; le niveau sert alors de point de départ
+            à la recherche des paramètres d'images (méthodes 'auto' et 'fitz')
+        resample (str): Palier de rééchantillonnage des images : 'quality' (Lanczos) ou 'fast'
+            (réduction par blocs puis bilinéaire)
+        target_dpi (float): Résolution visée d'après la taille d'affichage de chaque image
+            (méthodes 'auto', 'fitz' et 'advanced'), à la place des dimensions max du niveau
+        classify (bool): Choisir l'encodeur de chaque image d'après son aperçu (JPEG, palette,
+            Flate, 1 bit ; nécessite NumPy, voir analyze_image), sinon tout en JPEG
+        trial (bool): Encoder les deux meilleurs candidats de chaque image et garder le plus petit
+
+    Returns:
+        CompressionResult: PDF compressé (data), durées par étape et statistiques
+    """
+    data = bytes(data)
+    result = CompressionResult(success=False, method=method, compression_level=compression_level,
+                               input_size=len(data), target_size=target_size,
+                               image_options=ImageOptions(resample=resample, target_dpi=target_dpi,
+                                                          classify=classify, trial=trial))
+
+    result.error = _options_error(method, resample, target_size, target_dpi)
+    if result.error:
+        return result
+    if not data:
+        result.error = "PDF d'entrée vide"
+        return result
+
+    with _measured(result, hook, trace_memory) as tracer:
+        _compress_into(result, data, workers, cache, race, backend_timeout, tracer)
+
+    if cache is not None:
+        result.cache_stats = cache.stats()
+    return result
+
+def compress_pdf_file_chunked(input_path, output_path, method='auto', compression_level='medium',
+                              memory_budget=DEFAULT_MEMORY_BUDGET, workers=None, cache=None, hook=None,
+                              trace_memory=False, resample='quality', target_dpi=None, classify=True,
+                              trial=False):
+    """
+    Compresse un PDF de fichier à fichier sous un budget mémoire (voir compress_with_fitz_chunked)
+
+    L'entrée n'est jamais chargée entière en mémoire et la sortie est écrite
+    directement sur le disque (result.data reste vide, result.written_size
+    donne sa taille). Seules les méthodes 'auto' et 'fitz' sont disponibles :
+    les autres chargent le document complet.
+
+    Args:
+        input_path (str): Chemin du PDF d'entrée
+        output_path (str): Chemin du PDF de sortie
+        method (str): Méthode de compression ('auto' ou 'fitz')
+        compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        memory_budget (int): Mémoire de travail maximale des images d'un lot, en octets
+        (autres paramètres : voir compress_pdf_bytes)
+
+    Returns:
+        CompressionResult: Statistiques ; error explique un dépassement du budget par une image
+    """
+    result = CompressionResult(success=False, method=method, compression_level=compression_level,
+                               input_size=os.path.getsize(input_path),
+                               image_options=ImageOptions(resample=resample, target_dpi=target_dpi,
+                                                          classify=classify, trial=trial))
+    result.error = _options_error(method, resample, None, target_dpi)
+    if result.error:
+        return result
+    if method not in ('auto', 'fitz'):
+        result.error = f"Le budget mémoire n'est disponible qu'avec les méthodes auto et fitz (pas {method})"
+        return result
+    if memory_budget <= 0:
+        result.error = f"Budget mémoire invalide: {memory_budget}"
+        return result
+
+    with _measured(result, hook, trace_memory) as tracer:
+        start = time.perf_counter()
+        try:
+            with tracer.span('attempt', method='chunked'):
+                success = compress_with_fitz_chunked(input_path, output_path, compression_level, memory_budget,
+                                                     workers, result.image_stats, cache, tracer,
+                                                     result.image_options)
+        except MemoryBudgetExceeded as e:
+            success = False
+            result.error = str(e)
+        result.attempts.append({
+            'method': 'chunked',
+            'status': 'ok' if success else 'failed',
+            'seconds': time.perf_counter() - start,
+            'size': os.path.getsize(output_path) if success else None
+        })
+
+    if success:
+        result.success = True
+        result.backend = 'fitz'
+        result.output_path = output_path
+        result.written_size = os.path.getsize(output_path)
+    elif result.error is None:
+        result.error = "Échec du traitement par lots"
+    if cache is not None:
+        result.cache_stats = cache.stats()
+    return result
+
+def compress_pdf_file_sharded(input_path, output_path, method='auto', compression_level='medium', shards=None,
+                              workers=None, cache=None, hook=None, trace_memory=False, resample='quality',
+                              target_dpi=None, classify=True, trial=False):
+    """
+    Compresse un PDF de fichier à fichier par plages de pages en parallèle (voir compress_sharded)
+
+    En mode 'auto', la méthode avancée est retenue pour un PDF composé
+    principalement d'images (voir probe_pdf), sinon la passe d'images fitz.
+
+    Args:
+        input_path (str): Chemin du PDF d'entrée
+        output_path (str): Chemin du PDF de sortie
+        method (str): Méthode appliquée à chaque tranche ('auto', 'fitz' ou 'advanced')
+        compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        shards (int): Nombre de tranches, une par processus (défaut: nombre de CPU)
+        workers (int): Threads de recompression par tranche (défaut: CPU répartis entre les tranches)
+        (autres paramètres : voir compress_pdf_bytes)
+
+    Returns:
+        CompressionResult: Statistiques cumulées des tranches ; la sortie est écrite sur le disque
+    """
+    from functools import partial
+
+    result = CompressionResult(success=False, method=method, compression_level=compression_level,
+                               input_size=os.path.getsize(input_path),
+                               image_options=ImageOptions(resample=resample, target_dpi=target_dpi,
+                                                          classify=classify, trial=trial))
+    result.error = _options_error(method, resample, None, target_dpi)
+    if result.error:
+        return result
+    if method not in ('auto',) + SHARD_METHODS:
+        result.error = f"La compression par tranches n'est disponible qu'avec les méthodes auto, fitz et advanced " \
+                       f"(pas {method})"
+        return result
+
+    shards = max(1, shards or os.cpu_count() or 1)
+    workers = workers or max(1, (os.cpu_count() or 1) // shards)
+    with _measured(result, hook, trace_memory) as tracer:
+        backend = method
+        if method == 'auto':
+            with tracer.span('detect'):
+                result.profile = probe_pdf(input_path)
+            backend = 'advanced' if result.profile.image_heavy else 'fitz'
+        compressor = partial(compress_shard_images, backend, compression_level, workers, cache,
+                             result.image_options)
+        start = time.perf_counter()
+        with tracer.span('attempt', method=backend):
+            success = compress_sharded(input_path, output_path, compressor, shards, shards, result.image_stats,
+                                       cache, tracer)
+        result.attempts.append({
+            'method': backend,
+            'status': 'ok' if success else 'failed',
+            'seconds': time.perf_counter() - start,
+            'size': os.path.getsize(output_path) if success else None
+        })
+
+    if success:
+        result.success = True
+        result.backend = backend
+        result.output_path = output_path
+        result.written_size = os.path.getsize(output_path)
+    else:
+        result.error = "Échec de la compression par tranches"
+    if cache is not None:
+        result.cache_stats = cache.stats()
+    return result
+
+def compress_pdf_stream(input_file, output_file=None, **options):
+    """
+    Variante de compress_pdf_bytes pour des objets fichier
+
+    Args:
+        input_file (file): Flux binaire lisible contenant le PDF
+        output_file (file): Flux binaire en écriture recevant le PDF compressé (optionnel)
+        **options: Paramètres de compress_pdf_bytes
+
+    Returns:
+        CompressionResult: PDF compressé (data) et statistiques
+    """
+    result = compress_pdf_bytes(input_file.read(), **options)
+    if result.success and output_file is not None:
+        output_file.write(result.data)
+    return result
+
+def _print_result(result, show_timings=False, show_images=False):
+    """Affiche un CompressionResult dans la console"""
+    if result.profile is not None and result.profile.image_heavy:
+        print(f"🖼️  PDF avec images volumineuses détecté ({result.profile.large_images} grandes images "
+              f"sur {len(result.profile.sampled_pages)} pages échantillonnées)")
+
+    for attempt in result.attempts:
+        name = attempt['method']
+        if attempt['status'] == 'ok':
+            print(f"   {name}: {attempt['seconds']:.2f} s, {attempt['size'] / (1024 * 1024):.2f} Mo")
+        elif attempt['status'] == 'inefficient':
+            reduction = (result.input_size - attempt['size']) / result.input_size * 100
+            print(f"⚠️  {name} - compression inefficace ({reduction:.1f}%)")
+        elif attempt['status'] == 'timeout':
+            print(f"   {name}: ⏱️  arrêté après {attempt['seconds']:.1f} s")
+        else:
+            print(f"   {name}: ❌ échec")
+    for message in result.messages:
+        print(f"⚠️  {message}")
+
+    if not result.success:
+        print(f"❌ {result.error}.")
+        return
+
+    compressed_size = result.output_size / (1024 * 1024)
+    print(f"🏆 Méthode retenue: {result.backend}")
+    print(f"✅ Compression terminée!")
+    print(f"📄 Fichier compressé: {result.output_path}")
+    print(f"📏 Taille compressée: {compressed_size:.2f} Mo")
+    print(f"💾 Réduction: {result.reduction:.1f}%")
+    search = result.target_search
+    if search is not None:
+        max_size = f"{search['max_size']} px" if search['max_size'] else "inchangée"
+        print(f"🎯 Taille cible {search['target_size'] / (1024 * 1024):.2f} Mo: qualité {search['quality']}, "
+              f"dimension max {max_size} ({search['evaluations']} estimation(s), "
+              f"estimée à {search['estimated_size'] / (1024 * 1024):.2f} Mo)")
+        if search['saves'] > 1:
+            print(f"🔁 Taille écrite au-delà de l'estimation : recherche corrigée, {search['saves']} sauvegarde(s)")
+        if result.output_size > search['target_size']:
+            if search['fits']:
+                print(f"⚠️  Taille cible dépassée : l'estimation ({search['estimated_size'] / (1024 * 1024):.2f} Mo) "
+                      f"sous-évaluait la taille écrite")
+            else:
+                print("⚠️  Taille cible non atteinte même avec les réglages les plus agressifs")
+    image_stats = result.image_stats
+    if image_stats.get('recompressions_saved'):
+        print(f"♻️  Images partagées: {image_stats['images_unique']} image(s) distincte(s) "
+              f"pour {image_stats['image_placements']} occurrence(s), "
+              f"{image_stats['recompressions_saved']} recompression(s) évitée(s)")
+    if image_stats.get('shards'):
+        print(f"🧱 Compression par tranches: {image_stats['shards']} plage(s) de pages réassemblées")
+    if image_stats.get('batches'):
+        print(f"📦 Traitement par lots: {image_stats['batches']} lot(s) sous le budget mémoire")
+    if image_stats.get('images_kept'):
+        print(f"📎 {image_stats['images_kept']} image(s) déjà compacte(s) conservée(s) sans réencodage")
+    if image_stats.get('codecs'):
+        codecs = ", ".join(f"{codec} {count}" for codec, count in sorted(image_stats['codecs'].items()))
+        print(f"🧩 Encodeurs: {codecs}")
+    if show_images:
+        for entry in image_stats.get('images', []):
+            sizes = ", ".join(f"{codec} {size / 1024:.1f} Ko" for codec, size in (entry['sizes'] or {}).items())
+            outcome = "conservée" if entry['kept'] else f"{entry['size'] / 1024:.1f} Ko"
+            print(f"   xref {entry['xref']:<6} {entry['codec']:<8} {entry['width']}x{entry['height']:<6} "
+                  f"{entry['original_size'] / 1024:.1f} Ko → {outcome} "
+                  f"(candidats: {', '.join(entry['candidates'] or [])}; essais: {sizes})")
+    if result.cache_stats is not None:
+        print(f"🗄️  Cache d'images: {result.cache_stats['hits']} image(s) réutilisée(s), "
+              f"{result.cache_stats['misses']} absente(s) ({result.cache_stats['size_mb']:.1f} Mo)")
+
+    total = result.timings.get('total', {}).get('seconds', 0.0)
+    print(f"⏱️  Durée: {total:.2f} s")
+    if show_timings:
+        for name, entry in sorted(result.timings.items(), key=lambda item: -item[1]['seconds']):
+            if name != 'total':
+                memory = f", pic {entry['memory_peak'] / (1024 * 1024):.1f} Mo" if 'memory_peak' in entry else ""
+                print(f"   {name:<18} {entry['seconds']:8.3f} s  ({entry['count']}x{memory})")
+    if result.memory_peak is not None:
+        print(f"🧠 Pic mémoire Python (tracemalloc): {result.memory_peak / (1024 * 1024):.1f} Mo")
+    if show_timings and result.rss_peak is not None:
+        print(f"🧠 Pic mémoire résidente du processus: {result.rss_peak / (1024 * 1024):.1f} Mo")
+
+def get_file_size(file_path):
+    """Retourne la taille du fichier en Mo"""
+    return os.path.getsize(file_path) / (1024 * 1024)
+
+def compress_pdf(input_path, output_path=None, method='auto', compression_level='medium', workers=None, cache=None,
+                 race=False, backend_timeout=120, hook=None, trace_memory=False, show_timings=False,
+                 target_size=None, resample='quality', target_dpi=None, classify=True, trial=False,
+                 show_images=False, memory_budget=None, shards=None):
+    """
+    Fonction principale de compression PDF
     
     Args:
         input_path (str): Chemin du fichier PDF d'entrée
         output_path (str): Chemin du fichier PDF de sortie (optionnel)
-        method (str): Méthode de compression ('pikepdf', 'pypdf', 'fitz', 'auto')
+        method (str): Méthode de compression ('pikepdf', 'pypdf', 'fitz', 'advanced', 'auto')
         compression_level (str): Niveau de compression ('low', 'medium', 'high')
+        workers (int): Nombre de threads pour la recompression des images (défaut: nombre de CPU)
+        cache (ImageCache): Cache disque des images recompressées, partagé entre documents (optionnel)
+        race (bool): En mode auto, lancer les méthodes en parallèle et garder la plus petite sortie
+        backend_timeout (float): Budget de temps par méthode en mode course (secondes)
+        hook (callable): Reçoit un événement par étape terminée (voir Tracer), optionnel
+        trace_memory (bool): Mesurer le pic de mémoire Python avec tracemalloc (plus lent)
+        show_timings (bool): Afficher la durée de chaque étape
+        target_size (int): Taille maximale visée en octets (méthodes 'auto' et 'fitz')
+        resample (str): Palier de rééchantillonnage des images ('quality' ou 'fast')
+        target_dpi (float): Résolution visée d'après la taille d'affichage des images (optionnel)
+        classify (bool): Choisir l'encodeur de chaque image d'après son aperçu (sinon tout en JPEG)
+        trial (bool): Encoder les deux meilleurs candidats de chaque image et garder le plus petit
+        show_images (bool): Afficher l'encodeur retenu et la taille obtenue pour chaque image
+        memory_budget (int): Budget mémoire en octets : traitement par lots de pages, de fichier à
+            fichier (méthodes 'auto' et 'fitz', voir compress_pdf_file_chunked)
+        shards (int): Nombre de plages de pages compressées en parallèle dans des processus distincts
+            (méthodes 'auto', 'fitz' et 'advanced', voir compress_pdf_file_sharded)
+    
+    Returns:
+        CompressionResult: Résultat structuré (vrai si la compression a réussi)
     """
     
     # Vérifier que le fichier d'entrée existe
     if not os.path.exists(input_path):
         print(f"❌ Le fichier {input_path} n'existe pas.")
-        return False
+        return CompressionResult(success=False, method=method, compression_level=compression_level,
+                                 input_size=0, error=f"Le fichier {input_path} n'existe pas")
+    
+    if method not in METHODS:
+        print(f"❌ Méthode inconnue: {method}")
+        return CompressionResult(success=False, method=method, compression_level=compression_level,
+                                 input_size=0, error=f"Méthode inconnue: {method}")
     
     # Générer le nom de sortie si non spécifié
     if output_path is None:
         input_file = Path(input_path)
         output_path = str(input_file.parent / f"{input_file.stem}_compressed{input_file.suffix}")
     
+    if shards:
+        if race or target_size or memory_budget:
+            print("❌ Les tranches ne se combinent ni avec --race, ni avec --target-size, ni avec --memory-budget")
+            return CompressionResult(success=False, method=method, compression_level=compression_level,
+                                     input_size=0, error="Tranches incompatibles avec la course, la taille "
+                                                         "cible et le budget mémoire")
+        print(f"📄 Fichier original: {input_path}")
+        print(f"📏 Taille originale: {get_file_size(input_path):.2f} Mo")
+        print(f"🔧 Méthode: {method}, Niveau: {compression_level}, {shards} tranche(s)")
+        print("🔄 Compression par tranches en cours...")
+        result = compress_pdf_file_sharded(input_path, output_path, method, compression_level, shards, workers,
+                                           cache, hook, trace_memory, resample, target_dpi, classify, trial)
+        _print_result(result, show_timings, show_images)
+        return result
+    
+    if memory_budget:
+        if race or target_size:
+            print("❌ Le budget mémoire ne se combine ni avec --race ni avec --target-size")
+            return CompressionResult(success=False, method=method, compression_level=compression_level,
+                                     input_size=0, error="Budget mémoire incompatible avec la course "
+                                                         "et la taille cible")
+        print(f"📄 Fichier original: {input_path}")
+        print(f"📏 Taille originale: {get_file_size(input_path):.2f} Mo")
+        print(f"🔧 Méthode: {method}, Niveau: {compression_level}, "
+              f"budget mémoire: {memory_budget / (1024 * 1024):.0f} Mo")
+        print("🔄 Compression par lots en cours...")
+        result = compress_pdf_file_chunked(input_path, output_path, method, compression_level, memory_budget,
+                                           workers, cache, hook, trace_memory, resample, target_dpi, classify,
+                                           trial)
+        _print_result(result, show_timings, show_images)
+        return result
+    
+    # Lecture unique de l'entrée : toutes les étapes travaillent en mémoire
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    
     # Taille du fichier original
-    original_size = get_file_size(input_path)
     print(f"📄 Fichier original: {input_path}")
-    print(f"📏 Taille originale: {original_size:.2f} Mo")
+    print(f"📏 Taille originale: {len(data) / (1024 * 1024):.2f} Mo")
     print(f"🔧 Méthode: {method}, Niveau: {compression_level}")
     print("🔄 Compression en cours...")
     
-    success = False
+    result = compress_pdf_bytes(data, method, compression_level, workers, cache, race, backend_timeout,
+                                hook, trace_memory, target_size, resample, target_dpi, classify, trial)
     
-    # Essayer différentes méthodes selon le paramètre
-    if method == 'auto':
-        # Détecter si c'est un PDF principalement composé d'images
-        advanced_tried = False
-        try:
-            import fitz
-            doc = fitz.open(input_path)
-            total_images = 0
-            large_images = 0
-            page_count = doc.page_count
-            
-            for page_num in range(min(3, doc.page_count)):  # Vérifier les 3 premières pages
-                images = doc[page_num].get_images()
-                total_images += len(images)
-                for img in images:
-                    try:
-                        base_image = doc.extract_image(img[0])
-                        if len(base_image["image"]) > 1024 * 1024:  # Images > 1MB
-                            large_images += 1
-                    except:
-                        continue
-            
-            doc.close()
-            
-            # Si beaucoup d'images volumineuses, utiliser la compression avancée
-            if large_images >= 1 and total_images >= page_count * 0.5:
-                print(f"🖼️  PDF avec images volumineuses détecté ({large_images} grandes images)")
-                print("🔄 Utilisation de la compression avancée d'images...")
-                advanced_tried = True
-                success = compress_image_pdf_advanced(input_path, output_path, 75, 1200)
-                if success:
-                    print("✅ Compression avancée d'images réussie")
-                else:
-                    print("⚠️  Compression avancée échouée, tentative méthodes classiques...")
-        except Exception as e:
-            print(f"🐛 Erreur détection: {e}")
-        
-        # Si pas de compression avancée ou si elle a échoué, essayer les méthodes classiques
-        if not advanced_tried or not success:
-            methods_to_try = [
-                ('pikepdf', lambda: compress_with_pikepdf(input_path, output_path, compression_level)),
-                ('fitz', lambda: compress_with_fitz(input_path, output_path, compression_level)),
-                ('pypdf', lambda: compress_with_pypdf(input_path, output_path))
-            ]
-            
-            for method_name, compress_func in methods_to_try:
-                print(f"🔄 Tentative avec {method_name}...")
-                if compress_func():
-                    # Vérifier si la compression est efficace
-                    if os.path.exists(output_path):
-                        compressed_size = get_file_size(output_path)
-                        reduction = ((original_size - compressed_size) / original_size) * 100
-                        if reduction > 5:  # Au moins 5% de réduction
-                            success = True
-                            print(f"✅ Compression réussie avec {method_name}")
-                            break
-                        else:
-                            print(f"⚠️  {method_name} - compression inefficace ({reduction:.1f}%)")
-                    else:
-                        success = True
-                        print(f"✅ Compression réussie avec {method_name}")
-                        break
-    else:
-        # Utiliser la méthode spécifiée
-        if method == 'pikepdf':
-            success = compress_with_pikepdf(input_path, output_path, compression_level)
-        elif method == 'fitz':
-            success = compress_with_fitz(input_path, output_path, compression_level)
-        elif method == 'pypdf':
-            success = compress_with_pypdf(input_path, output_path)
-        else:
-            print(f"❌ Méthode inconnue: {method}")
-            return False
+    # Seul le résultat final est écrit sur le disque
+    if result.success:
+        with open(output_path, 'wb') as f:
+            f.write(result.data)
+        result.output_path = output_path
     
-    if success and os.path.exists(output_path):
-        compressed_size = get_file_size(output_path)
-        reduction = ((original_size - compressed_size) / original_size) * 100
-        
-        print(f"✅ Compression terminée!")
-        print(f"📄 Fichier compressé: {output_path}")
-        print(f"📏 Taille compressée: {compressed_size:.2f} Mo")
-        print(f"💾 Réduction: {reduction:.1f}%")
-        
-        return True
-    else:
-        print("❌ Échec de la compression avec toutes les méthodes.")
+    # L'affichage n'est qu'un rendu du résultat structuré
+    _print_result(result, show_timings, show_images)
+    return result
+
+def _written_since(path, started):
+    """Vrai si le fichier existe et a été écrit depuis started (à la granularité du système de fichiers près)"""
+    try:
+        return os.stat(path).st_mtime >= int(started) - 1
+    except OSError:
         return False
 
 def main():
     parser = argparse.ArgumentParser(description="Compresser des fichiers PDF")
-    parser.add_argument("input", help="Fichier PDF d'entrée")
+    parser.add_argument("input", nargs='?', help="Fichier PDF d'entrée")
     parser.add_argument("-o", "--output", help="Fichier PDF de sortie (optionnel)")
-    parser.add_argument("-m", "--method", choices=['auto', 'pikepdf', 'fitz', 'pypdf'], 
+    parser.add_argument("-m", "--method", choices=list(METHODS), 
                        default='auto', help="Méthode de compression (défaut: auto)")
     parser.add_argument("-l", "--level", choices=['low', 'medium', 'high'], 
                        default='medium', help="Niveau de compression (défaut: medium)")
+    parser.add_argument("--workers", type=int, default=None,
+                       help="Threads pour la recompression des images (défaut: nombre de CPU)")
+    parser.add_argument("--race", action="store_true",
+                       help="Mode auto: lancer les méthodes en parallèle et garder la plus petite sortie")
+    parser.add_argument("--backend-timeout", type=float, default=120,
+                       help="Budget de temps par méthode en mode course, en secondes (défaut: 120)")
+    parser.add_argument("--resample", choices=list(RESAMPLING), default='quality',
+                       help="Rééchantillonnage des images: quality (Lanczos) ou fast (par blocs, plus rapide)")
+    parser.add_argument("--target-dpi", type=float,
+                       help="Résolution visée (ex: 150) d'après la taille d'affichage de chaque image sur la page")
+    parser.add_argument("--keep-color", action="store_true",
+                       help="Ne pas choisir l'encodeur de chaque image : tout réencoder en JPEG couleur")
+    parser.add_argument("--trial-encode", action="store_true",
+                       help="Encoder les deux meilleurs candidats de chaque image et garder le plus petit")
+    parser.add_argument("--image-report", action="store_true",
+                       help="Afficher l'encodeur retenu et la taille obtenue pour chaque image")
+    parser.add_argument("--target-size", type=float,
+                       help="Taille maximale visée en Mo ; le niveau sert de point de départ (méthodes auto et fitz)")
+    parser.add_argument("--memory-budget", type=float,
+                       help="Budget mémoire en Mo : pages traitées par lots, sortie écrite au fil de l'eau "
+                            "(méthodes auto et fitz)")
+    parser.add_argument("--shards", type=int,
+                       help="Découper le PDF en N plages de pages compressées en parallèle puis réassemblées "
+                            "(méthodes auto, fitz et advanced)")
+    parser.add_argument("--timings", action="store_true",
+                       help="Afficher la durée de chaque étape (ouverture, détection, images, sauvegarde)")
+    parser.add_argument("--trace-memory", action="store_true",
+                       help="Mesurer le pic de mémoire Python avec tracemalloc (plus lent)")
+    parser.add_argument("--cache-dir", help="Répertoire du cache des images recompressées (optionnel)")
+    parser.add_argument("--cache-size", type=float, default=512,
+                       help="Taille maximale du cache en Mo (défaut: 512)")
+    parser.add_argument("--serve", action="store_true",
+                       help="Lancer le démon : workers préchargés à l'écoute sur un socket Unix local")
+    parser.add_argument("--daemon-workers", type=int, default=None,
+                       help="Nombre de workers préchargés du démon (défaut: nombre de CPU)")
+    parser.add_argument("--socket", help="Socket du démon (défaut: $PDF_COMPRESSOR_SOCKET ou propre à l'utilisateur)")
+    parser.add_argument("--daemon-timeout", type=float, default=None,
+                       help="Durée maximale d'une compression confiée au démon, en secondes, avant de "
+                            "compresser sur place (défaut: tant que son worker est en vie)")
+    parser.add_argument("--no-daemon", action="store_true",
+                       help="Compresser dans ce processus même si un démon tourne")
     
     args = parser.parse_args()
     
-    # Compression du PDF
-    success = compress_pdf(args.input, args.output, args.method, args.level)
+    if args.serve:
+        from compress_daemon import serve
+        sys.exit(0 if serve(args.socket, args.daemon_workers) else 1)
+    if args.input is None:
+        parser.error("le fichier PDF d'entrée est requis (sauf avec --serve)")
+    
+    target_size = int(args.target_size * 1024 * 1024) if args.target_size else None
+    memory_budget = int(args.memory_budget * 1024 * 1024) if args.memory_budget else None
+    
+    # Un démon en cours d'exécution évite le chargement des bibliothèques ; sinon, sur place
+    response = None
+    if not args.no_daemon:
+        from compress_daemon import request_compression
+        input_path = os.path.abspath(args.input)
+        if args.output:
+            output_path = os.path.abspath(args.output)
+        else:
+            stem, suffix = os.path.splitext(input_path)
+            output_path = f"{stem}_compressed{suffix}"
+        options = dict(input_path=input_path, output_path=output_path,
+                       method=args.method, compression_level=args.level, workers=args.workers,
+                       race=args.race, backend_timeout=args.backend_timeout, trace_memory=args.trace_memory,
+                       show_timings=args.timings, target_size=target_size, resample=args.resample,
+                       target_dpi=args.target_dpi, classify=not args.keep_color, trial=args.trial_encode,
+                       show_images=args.image_report, memory_budget=memory_budget, shards=args.shards)
+        started = time.time()
+        response = request_compression(options, os.path.abspath(args.cache_dir) if args.cache_dir else None,
+                                       args.cache_size, args.socket, args.daemon_timeout)
+        # Succès annoncé sans sortie écrite pendant la requête : réponse ignorée, compression sur place
+        if response is not None and response['success'] and not _written_since(output_path, started):
+            response = None
+        if response is not None:
+            print(response['log'], end='')
+            success = response['success']
+    
+    if response is None:
+        cache = None
+        if args.cache_dir:
+            from image_cache import ImageCache
+            cache = ImageCache(args.cache_dir, args.cache_size)
+        
+        # Compression du PDF
+        success = compress_pdf(args.input, args.output, args.method, args.level, args.workers, cache,
+                               args.race, args.backend_timeout, trace_memory=args.trace_memory,
+                               show_timings=args.timings, target_size=target_size, resample=args.resample,
+                               target_dpi=args.target_dpi, classify=not args.keep_color, trial=args.trial_encode,
+                               show_images=args.image_report, memory_budget=memory_budget, shards=args.shards)
     
     if not success:
         print("\n💡 Conseils d'installation:")
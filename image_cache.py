@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Cache disque des images recompressées
+Partage les images déjà encodées entre les exécutions et les documents
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+
+# Version du format des clés : à incrémenter si l'encodage des images change
+CACHE_VERSION = 3
+
+class ImageCache:
+    """
+    Cache adressé par contenu des images recompressées
+
+    La clé est l'empreinte SHA-256 des octets source et des paramètres
+    d'encodage (qualité, dimensions max, mode). Les entrées sont écrites de
+    façon atomique (fichier temporaire puis os.replace) et la date de
+    modification sert d'horodatage LRU : plusieurs processus peuvent utiliser
+    le même répertoire simultanément.
+    """
+
+    def __init__(self, directory, max_size_mb=512):
+        """
+        Args:
+            directory (str): Répertoire du cache (créé si nécessaire)
+            max_size_mb (float): Taille maximale du cache en Mo
+        """
+        self.directory = directory
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = self._scan_size()
+
+    def key(self, image_bytes, **params):
+        """Calcule la clé d'une image source pour des paramètres d'encodage donnés"""
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_VERSION}|".encode())
+        for name in sorted(params):
+            digest.update(f"{name}={params[name]!r}|".encode())
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".bin")
+
+    def get(self, key):
+        """
+        Retourne les octets encodés associés à la clé, ou None
+
+        Un succès rafraîchit la date de l'entrée (politique LRU).
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Enregistre les octets encodés sous la clé puis applique la limite de taille"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        with self._lock:
+            self.stores += 1
+            self._size += len(data)
+            over_limit = self._size > self.max_size
+
+        if over_limit:
+            self.evict()
+
+    def _entries(self):
+        """Liste (date, taille, chemin) des entrées présentes sur le disque"""
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _mtime, size, _path in self._entries())
+
+    def evict(self):
+        """
+        Supprime les entrées les moins récemment utilisées jusqu'à repasser sous
+        la limite (90 % de la taille max pour éviter des évictions en rafale)
+        """
+        with _EvictionLock(os.path.join(self.directory, ".lock")):
+            entries = sorted(self._entries())
+            total = sum(size for _mtime, size, _path in entries)
+            target = self.max_size * 0.9
+            evicted = 0
+            for _mtime, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    evicted += 1
+                except OSError:
+                    pass  # Déjà supprimée par un autre processus
+                total -= size
+
+        with self._lock:
+            self._size = total
+            self.evictions += evicted
+
+    def merge(self, stats):
+        """Ajoute les compteurs d'un autre processus (voir stats())"""
+        with self._lock:
+            self.hits += stats.get('hits', 0)
+            self.misses += stats.get('misses', 0)
+            self.stores += stats.get('stores', 0)
+            self.evictions += stats.get('evictions', 0)
+        if stats.get('stores') or stats.get('evictions'):
+            size = self._scan_size()
+            with self._lock:
+                self._size = size
+
+    def __getstate__(self):
+        # Le verrou n'est pas transmissible aux processus fils ; ils repartent de zéro
+        state = self.__dict__.copy()
+        del state['_lock']
+        state.update(hits=0, misses=0, stores=0, evictions=0)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Statistiques d'utilisation du cache pour ce processus"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'size_mb': self._size / (1024 * 1024)
+            }
+
+class _EvictionLock:
+    """Verrou inter-processus sur un fichier (fcntl si disponible)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        except (ImportError, OSError):
+            # Sans verrou (Windows) : les suppressions concurrentes restent tolérées
+            self._file = None
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()  # Libère le verrou
+        return False
@@ -0,0 +1,66 @@
+"""
+Configuration commune des tests : chemins du projet et documents synthétiques
+
+Les PDF de test viennent du corpus reproductible des benchmarks (voir
+benchmarks/corpus.py), à petite échelle pour que la suite reste rapide.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+pytest.importorskip("fitz")
+pytest.importorskip("PIL")
+
+from benchmarks.corpus import generate_corpus  # noqa: E402
+
+@pytest.fixture(scope='session')
+def corpus(tmp_path_factory):
+    """Chemins du corpus synthétique réduit, par nom de document"""
+    directory = tmp_path_factory.mktemp("corpus")
+    paths = generate_corpus(str(directory), scale=0.3)
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+@pytest.fixture(scope='session')
+def masked_pdf(tmp_path_factory):
+    """
+    Page portant un masque de découpe non compressé (/ImageMask true) peint en rouge
+    et une photo dont la transparence est un /SMask également listé dans les ressources
+    """
+    pikepdf = pytest.importorskip("pikepdf")
+    import numpy as np
+
+    pdf = pikepdf.new()
+    width, height = 300, 200
+    bits = np.zeros((height, width), dtype=bool)
+    bits[:60, :] = True
+    bits[100:, ::2] = True
+    # Échantillon à 0 = zone peinte (Decode par défaut [0 1])
+    stencil = pikepdf.Stream(pdf, np.packbits(~bits, axis=1).tobytes())
+    stencil.Type, stencil.Subtype = pikepdf.Name.XObject, pikepdf.Name.Image
+    stencil.Width, stencil.Height, stencil.ImageMask, stencil.BitsPerComponent = width, height, True, 1
+
+    pixels = (np.random.RandomState(0).rand(height, width, 3) * 255).astype('uint8')
+    alpha = np.zeros((height, width), 'uint8')
+    alpha[:, width // 2:] = 255
+    smask = pikepdf.Stream(pdf, alpha.tobytes())
+    smask.Type, smask.Subtype = pikepdf.Name.XObject, pikepdf.Name.Image
+    smask.Width, smask.Height, smask.BitsPerComponent = width, height, 8
+    smask.ColorSpace = pikepdf.Name.DeviceGray
+    photo = pikepdf.Stream(pdf, pixels.tobytes())
+    photo.Type, photo.Subtype = pikepdf.Name.XObject, pikepdf.Name.Image
+    photo.Width, photo.Height, photo.BitsPerComponent = width, height, 8
+    photo.ColorSpace = pikepdf.Name.DeviceRGB
+    photo.SMask = smask
+
+    page = pdf.add_blank_page(page_size=(width, 2 * height))
+    page.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(S=stencil, P=photo, M=smask))
+    page.Contents = pikepdf.Stream(pdf, b"q 1 0 0 rg 300 0 0 200 0 200 cm /S Do Q q 300 0 0 200 0 0 cm /P Do Q")
+    path = tmp_path_factory.mktemp("masks") / "masked.pdf"
+    pdf.save(str(path), compress_streams=False)
+    return str(path)
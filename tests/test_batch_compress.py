@@ -0,0 +1,237 @@
+"""
+Tests du traitement par lot : pool de processus, journal incrémental,
+file de baux partagée et surveillance d'un répertoire
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import batch_compress
+from batch_compress import MANIFEST_NAME, LeaseQueue, Manifest, file_digest, threads_per_worker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def batch_dir(corpus, tmp_path):
+    """Répertoire d'entrée : deux documents, dont un en double dans un sous-répertoire"""
+    directory = tmp_path / "entree"
+    (directory / "sous").mkdir(parents=True)
+    shutil.copy(corpus['text_only'], directory / "texte.pdf")
+    shutil.copy(corpus['mixed'], directory / "mixte.pdf")
+    shutil.copy(corpus['mixed'], directory / "sous" / "copie.pdf")
+    return str(directory)
+
+NAMES = ("mixte.pdf", os.path.join("sous", "copie.pdf"), "texte.pdf")
+PARAMS = {'method': 'fitz', 'level': 'medium'}
+
+def _pdf(directory, name, content=b"%PDF-1.4 contenu"):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+def test_threads_per_worker(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    assert [threads_per_worker(jobs) for jobs in (1, 2, 3, 8, 16)] == [8, 4, 2, 1, 1]
+
+def test_batch_compress_en_parallele(batch_dir, tmp_path):
+    output_dir = str(tmp_path / "sortie")
+    assert batch_compress.batch_compress(batch_dir, output_dir, method='fitz', jobs=2, timeout=120,
+                                         manifest=False)
+    for name in NAMES:
+        output = os.path.join(output_dir, name)
+        assert os.path.getsize(output) < os.path.getsize(os.path.join(batch_dir, name))
+
+def test_ligne_de_commande_accepte_chaque_methode(batch_dir, tmp_path):
+    output_dir = str(tmp_path / "sortie")
+    process = subprocess.run([sys.executable, os.path.join(ROOT, "tools", "batch_compress.py"), batch_dir,
+                              "-o", output_dir, "-m", "advanced", "-j", "2", "--no-manifest"],
+                             capture_output=True, text=True, timeout=300)
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert all(os.path.exists(os.path.join(output_dir, name)) for name in NAMES)
+
+def test_manifest_enregistre_et_relit(tmp_path):
+    source = _pdf(str(tmp_path), "a.pdf")
+    output = _pdf(str(tmp_path), "a_compressed.pdf", b"%PDF sortie")
+    stat = os.stat(source)
+    journal = Manifest(str(tmp_path / MANIFEST_NAME))
+    journal.record(source, stat, file_digest(source), PARAMS, output, {'success': True, 'output_size': 11})
+
+    reloaded = Manifest(str(tmp_path / MANIFEST_NAME))
+    assert reloaded.entries['a.pdf']['output'] == "a_compressed.pdf"
+    assert reloaded.outputs() == {output}
+    assert reloaded.unchanged(source, stat, PARAMS, output)
+    assert not reloaded.unchanged(source, stat, dict(PARAMS, level='high'), output)
+    assert reloaded.find_digest(file_digest(source), PARAMS)['input'] == "a.pdf"
+    # Sortie supprimée : le fichier doit être recompressé
+    os.remove(output)
+    assert not reloaded.unchanged(source, stat, PARAMS, output)
+    assert reloaded.find_digest(file_digest(source), PARAMS) is None
+
+def test_manifest_ignore_une_ligne_tronquee_et_se_compacte(tmp_path):
+    source = _pdf(str(tmp_path), "a.pdf")
+    path = str(tmp_path / MANIFEST_NAME)
+    journal = Manifest(path)
+    for size in (1, 2, 3):
+        journal.record(source, os.stat(source), "empreinte", PARAMS, source, {'success': True, 'output_size': size})
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"version": 1, "input": "tronq')
+
+    reloaded = Manifest(path)
+    assert list(reloaded.entries) == ["a.pdf"]
+    assert reloaded.entries["a.pdf"]['output_size'] == 3
+    reloaded.compact()
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    assert len(lines) == 1 and json.loads(lines[0])['output_size'] == 3
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_batch_compress_incremental(batch_dir, tmp_path, monkeypatch, jobs):
+    output_dir = str(tmp_path / "sortie")
+    assert batch_compress.batch_compress(batch_dir, output_dir, method='fitz', jobs=jobs)
+
+    journal = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    keys = {name: journal.key(os.path.join(batch_dir, name)) for name in NAMES}
+    assert sorted(journal.entries) == sorted(keys.values())
+    assert all(entry['success'] for entry in journal.entries.values())
+    # Le doublon est copié, pas recompressé
+    assert journal.entries[keys[NAMES[1]]]['copied_from'] == keys["mixte.pdf"]
+    for name in NAMES:
+        assert os.path.exists(os.path.join(output_dir, name))
+
+    # Second lot : rien n'a changé, aucun fichier n'est recompressé
+    def fail(*args, **kwargs):
+        raise AssertionError("fichier recompressé")
+    monkeypatch.setattr(batch_compress, 'compress_pdf', fail)
+    assert batch_compress.batch_compress(batch_dir, output_dir, method='fitz')
+    assert Manifest(os.path.join(output_dir, MANIFEST_NAME)).entries == journal.entries
+
+def test_batch_interrompu_garde_sa_progression(batch_dir, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "sortie")
+    compress = batch_compress.compress_pdf
+    done = []
+
+    def interrupted(input_path, *args, **kwargs):
+        if done:
+            raise KeyboardInterrupt
+        done.append(input_path)
+        return compress(input_path, *args, **kwargs)
+    monkeypatch.setattr(batch_compress, 'compress_pdf', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        batch_compress.batch_compress(batch_dir, output_dir, method='fitz')
+    # Le fichier terminé avant l'interruption est déjà au journal
+    journal = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    assert list(journal.entries) == [journal.key(done[0])]
+
+def test_lease_queue_reclamation_exclusive(tmp_path):
+    first = LeaseQueue(str(tmp_path), node="a")
+    second = LeaseQueue(str(tmp_path), node="b")
+    key = LeaseQueue.key("dossier/a.pdf")
+    now = first.now()
+    assert first.claim(key, "dossier/a.pdf", now)
+    assert not second.claim(key, "dossier/a.pdf", now)
+
+    first.complete(key, {'input': "dossier/a.pdf", 'success': True})
+    assert second.is_done(key)
+    assert not second.claim(key, "dossier/a.pdf", second.now())
+    assert [record['node'] for record in second.results()] == ["a"]
+
+def test_lease_queue_reprend_un_bail_perime(tmp_path):
+    dead = LeaseQueue(str(tmp_path), node="morte", lease_timeout=60)
+    alive = LeaseQueue(str(tmp_path), node="vivante", lease_timeout=60)
+    key = LeaseQueue.key("a.pdf")
+    now = dead.now()
+    assert dead.claim(key, "a.pdf", now)
+    assert not alive.claim(key, "a.pdf", now + 30)
+    assert alive.claim(key, "a.pdf", now + 120)
+    with open(alive.held[key], encoding='utf-8') as f:
+        assert json.load(f)['node'] == "vivante"
+
+def test_lease_queue_release_all(tmp_path):
+    stopping = LeaseQueue(str(tmp_path), node="a")
+    other = LeaseQueue(str(tmp_path), node="b")
+    keys = [LeaseQueue.key(name) for name in ("a.pdf", "b.pdf")]
+    now = stopping.now()
+    assert all(stopping.claim(key, key, now) for key in keys)
+    stopping.release_all()
+    # Baux libérés : repris sans attendre leur péremption
+    assert all(other.claim(key, key, now) for key in keys)
+
+def test_deux_machines_se_partagent_le_lot(batch_dir, tmp_path):
+    output_dir, queue_dir = str(tmp_path / "sortie"), str(tmp_path / "file")
+    command = [sys.executable, os.path.join(ROOT, "tools", "batch_compress.py"), batch_dir, "-o", output_dir,
+               "-m", "fitz", "--queue", queue_dir, "--heartbeat", "1"]
+    nodes = [subprocess.Popen(command + ["--node", name], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+             for name in ("a", "b")]
+    for node in nodes:
+        assert node.wait(timeout=300) == 0, node.stderr.read()
+        node.stderr.close()
+
+    results = LeaseQueue(queue_dir, node="rapport").results()
+    # Chaque fichier est compressé une seule fois, par l'une ou l'autre machine
+    assert sorted(record['input'] for record in results) == sorted(NAMES)
+    assert all(record['success'] and record['node'] in ("a", "b") for record in results)
+    assert os.listdir(os.path.join(queue_dir, 'leases')) == []
+
+def test_watcher_attend_un_fichier_stable(tmp_path):
+    watcher = batch_compress.FolderWatcher(str(tmp_path), settle=1)
+    path = _pdf(str(tmp_path), "a.pdf", b"%PDF-1.4 debut")
+    watcher.scan(0)
+    assert watcher.ready(0.5) == []
+    # Écriture toujours en cours : le délai de stabilité repart
+    with open(path, 'ab') as f:
+        f.write(b" suite\n%%EOF\n")
+    watcher.scan(0.8)
+    assert watcher.ready(1.5) == []
+    assert watcher.ready(2) == [(path, 0)]
+    # Déjà signalé et inchangé : pas signalé de nouveau
+    watcher.scan(3)
+    assert watcher.ready(5) == []
+
+def test_watcher_fichier_sans_fin_attend_plus_longtemps(tmp_path):
+    watcher = batch_compress.FolderWatcher(str(tmp_path), settle=1)
+    path = _pdf(str(tmp_path), "lent.pdf", b"%PDF-1.4 sans fin")
+    watcher.scan(0)
+    assert watcher.ready(2) == []
+    assert watcher.ready(11) == [(path, 0)]
+
+def test_watcher_fichier_disparu(tmp_path):
+    watcher = batch_compress.FolderWatcher(str(tmp_path), settle=1)
+    path = _pdf(str(tmp_path), "a.pdf", b"%PDF-1.4\n%%EOF\n")
+    (tmp_path / "sous").mkdir()
+    watcher.scan(0)
+    os.remove(path)
+    (tmp_path / "sous").rmdir()
+    assert watcher.ready(2) == []
+    assert watcher.candidates == {}
+
+def test_watch_folder_compresse_les_arrivees(corpus, tmp_path):
+    directory, output_dir = tmp_path / "entree", str(tmp_path / "sortie")
+    directory.mkdir()
+    status_file = str(tmp_path / "etat.json")
+    stop = threading.Event()
+    thread = threading.Thread(target=batch_compress.watch_folder, args=(str(directory), output_dir),
+                              kwargs={'method': 'fitz', 'settle': 0.2, 'poll_interval': 0.1,
+                                      'status_file': status_file, 'stop': stop})
+    thread.start()
+    try:
+        shutil.copy(corpus['mixed'], directory / "arrive.pdf")
+        deadline = time.monotonic() + 120
+        while not os.path.exists(os.path.join(output_dir, "arrive.pdf")) and time.monotonic() < deadline:
+            time.sleep(0.1)
+    finally:
+        stop.set()
+        thread.join(timeout=60)
+    assert not thread.is_alive()
+    with open(status_file, encoding='utf-8') as f:
+        status = json.load(f)
+    assert (status['detected'], status['completed'], status['failed']) == (1, 1, 0)
+    assert status['latency_last'] is not None
+    assert Manifest(os.path.join(output_dir, MANIFEST_NAME)).entries
@@ -0,0 +1,220 @@
+"""
+Tests de bout en bout des chemins de compression sur le corpus synthétique,
+et contrôle du rendu des masques après un aller-retour
+"""
+
+import math
+import sys
+
+import fitz
+import pytest
+
+from benchmarks.corpus import CORPUS
+from compress_pdf import (METHODS, compress_pdf, compress_pdf_bytes, compress_pdf_file_chunked,
+                          compress_pdf_file_sharded, split_page_ranges)
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _pages_text(source):
+    """Nombre de pages et texte du document (chemin ou octets)"""
+    doc = fitz.open(stream=source, filetype='pdf') if isinstance(source, bytes) else fitz.open(source)
+    with doc:
+        return doc.page_count, [page.get_text() for page in doc]
+
+def _assert_same_document(original, compressed):
+    assert _pages_text(compressed) == _pages_text(original)
+
+@pytest.mark.parametrize("method", ['fitz', 'advanced'])
+@pytest.mark.parametrize("name", list(CORPUS))
+def test_sortie_identique_quel_que_soit_le_nombre_de_threads(corpus, name, method):
+    data = _read(corpus[name])
+    sequential = compress_pdf_bytes(data, method=method, workers=1)
+    parallel = compress_pdf_bytes(data, method=method, workers=4)
+    assert sequential.success and parallel.success
+    assert parallel.data == sequential.data
+    _assert_same_document(data, parallel.data)
+
+def _render(source):
+    doc = fitz.open(stream=source, filetype='pdf') if isinstance(source, bytes) else fitz.open(source)
+    with doc:
+        pixmap = doc[0].get_pixmap(colorspace=fitz.csRGB)
+    return pixmap.height, pixmap.samples, pixmap.n
+
+def _mask_pixels(source):
+    """
+    Pixels rouges du masque de découpe (moitié haute) et pixels blancs laissés
+    par la transparence de la photo (moitié basse, côté gauche)
+    """
+    height, samples, n = _render(source)
+    width = len(samples) // (height * n)
+    red = white = 0
+    for y in range(height):
+        for x in range(width):
+            r, g, b = samples[(y * width + x) * n:(y * width + x) * n + 3]
+            if y < height // 2:
+                red += r > 200 and g < 60 and b < 60
+            elif x < width // 2 - 2:
+                white += r > 245 and g > 245 and b > 245
+    return red, white
+
+@pytest.mark.parametrize("options", [
+    {'method': 'fitz'},
+    {'method': 'advanced'},
+    {'method': 'auto'},
+    {'method': 'fitz', 'compression_level': 'high', 'classify': False},
+    {'method': 'auto', 'memory_budget': 4 * 1024 * 1024},
+    {'method': 'fitz', 'target_size': 20000},
+])
+def test_masques_preserves(masked_pdf, tmp_path, options):
+    output = str(tmp_path / "masked.pdf")
+    assert compress_pdf(masked_pdf, output, **options)
+    assert _mask_pixels(output) == _mask_pixels(masked_pdf)
+
+def test_course_garde_la_plus_petite_sortie(corpus):
+    data = _read(corpus['mixed'])
+    events = []
+    result = compress_pdf_bytes(data, race=True, backend_timeout=60, hook=events.append)
+    assert result.success, result.error
+    _assert_same_document(data, result.data)
+    sizes = [attempt['size'] for attempt in result.attempts if attempt['status'] == 'ok']
+    assert result.output_size == min(sizes)
+    # Les étapes des processus en course parviennent au hook, image par image
+    backends = {event['attributes'].get('backend') for event in events if event['name'].startswith('image.')}
+    assert 'fitz' in backends
+    assert result.timings['image.decode']['count'] == sum(
+        1 for event in events if event['name'] == 'image.decode')
+
+def test_course_repartit_les_threads(monkeypatch):
+    import multiprocessing
+
+    import compress_pdf
+
+    received = []
+
+    class Process:
+        """Processus factice : relève le nombre de threads et ferme aussitôt son tube"""
+
+        def __init__(self, target, args, daemon):
+            received.append(args[3])
+            args[-1].close()
+
+        def start(self):
+            pass
+
+        is_alive = start
+        join = start
+
+    monkeypatch.setattr(multiprocessing.get_context(), 'Process', Process, raising=False)
+    compress_pdf.race_backends(b"%PDF-", workers=8, timeout=0.1)
+    assert received == [2, 2, 2]
+
+@pytest.mark.parametrize("method", METHODS)
+def test_api_sans_sortie_console(capsys, method):
+    result = compress_pdf_bytes(b"%PDF-1.4 tronque", method=method)
+    assert not result.success
+    assert result.messages
+    # Les erreurs des méthodes passent par le résultat, jamais par la console
+    assert capsys.readouterr().out == ""
+
+def test_compress_pdf_bytes_chaque_methode_sans_message(corpus):
+    data = _read(corpus['mixed'])
+    for method in METHODS:
+        result = compress_pdf_bytes(data, method=method)
+        assert result.success, result.error
+        assert result.output_size <= len(data)
+        assert result.messages == []
+        _assert_same_document(data, result.data)
+
+def test_taille_cible_respectee(corpus):
+    data = _read(corpus['many_small_images'])
+    target = len(data) // 3
+    result = compress_pdf_bytes(data, method='fitz', target_size=target)
+    assert result.success, result.error
+    search = result.target_search
+    assert search['written_size'] == result.output_size
+    # Une sortie annoncée conforme tient réellement dans la cible
+    assert search['fits'] and result.output_size <= target
+    _assert_same_document(data, result.data)
+
+def test_taille_cible_inatteignable(corpus):
+    data = _read(corpus['text_only'])
+    result = compress_pdf_bytes(data, method='fitz', target_size=1024)
+    assert result.success, result.error
+    assert not result.target_search['fits']
+
+def _png(color, size=(20, 10)):
+    import io
+
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_tailles_d_affichage_sans_decodage(monkeypatch):
+    from compress_pdf import collect_image_inventory, collect_placement_sizes
+
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(fitz.Rect(0, 0, 100, 50), stream=_png("red"), rotate=90)
+    page.insert_text((10, 500), "texte (avec parenthèses) 1 0 0 1 0 0 cm /Im0 Do")
+    source = fitz.open()
+    source.new_page().insert_image(fitz.Rect(0, 0, 200, 100), stream=_png("blue"))
+    # Image placée à travers un formulaire
+    page.show_pdf_page(fitz.Rect(0, 200, 100, 300), source, 0)
+    inventory = collect_image_inventory(doc)
+    # Référence : matrices de get_image_rects, qui décode les images pour les retrouver
+    expected = {}
+    for item in page.get_images():
+        (_rect, matrix), = page.get_image_rects(item[0], transform=True)
+        expected[item[0]] = pytest.approx((math.hypot(matrix.a, matrix.b), math.hypot(matrix.c, matrix.d)))
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("image décodée")
+    # fitz réexporte pymupdf : les méthodes de Page utilisent le Pixmap de ce dernier
+    monkeypatch.setattr(sys.modules[fitz.Page.__module__], 'Pixmap', no_decode)
+    assert collect_placement_sizes(doc, inventory) == expected
+
+def test_resolution_cible(corpus):
+    data = _read(corpus['scanned'])
+    result = compress_pdf_bytes(data, method='fitz', target_dpi=72)
+    assert result.success, result.error
+    assert result.output_size < compress_pdf_bytes(data, method='fitz').output_size
+    _assert_same_document(data, result.data)
+
+def test_compress_pdf_file_chunked(corpus, tmp_path):
+    output = str(tmp_path / "chunked.pdf")
+    # Une page scannée demande environ 20 Mo décodée : une page par lot
+    result = compress_pdf_file_chunked(corpus['scanned'], output, memory_budget=32 * 1024 * 1024)
+    assert result.success, result.error
+    assert result.image_stats['batches'] > 1
+    assert result.written_size == len(_read(output)) < result.input_size
+    _assert_same_document(corpus['scanned'], output)
+
+def test_compress_pdf_file_chunked_budget_insuffisant(corpus, tmp_path):
+    result = compress_pdf_file_chunked(corpus['scanned'], str(tmp_path / "chunked.pdf"),
+                                       memory_budget=4 * 1024 * 1024)
+    assert not result.success
+    assert "budget mémoire" in result.error
+
+@pytest.mark.parametrize("page_count, shards, expected", [
+    (10, 3, [(0, 4), (4, 7), (7, 10)]),
+    (4, 4, [(0, 1), (1, 2), (2, 3), (3, 4)]),
+    (2, 8, [(0, 1), (1, 2)]),
+    (5, 0, [(0, 5)]),
+])
+def test_split_page_ranges(page_count, shards, expected):
+    assert split_page_ranges(page_count, shards) == expected
+
+@pytest.mark.parametrize("method", ['fitz', 'advanced'])
+def test_compress_pdf_file_sharded(corpus, tmp_path, method):
+    output = str(tmp_path / "sharded.pdf")
+    result = compress_pdf_file_sharded(corpus['shared_logo'], output, method, shards=3, workers=1)
+    assert result.success, result.error
+    assert result.image_stats['shards'] == 3
+    _assert_same_document(corpus['shared_logo'], output)
+    # Le logo répété dans chaque tranche n'est conservé qu'une fois après la fusion
+    with fitz.open(output) as doc:
+        assert len({item[0] for page in doc for item in page.get_images()}) == 1
@@ -0,0 +1,122 @@
+"""
+Tests du démon de compression : repli sans démon, confiance dans le socket,
+aller-retour, délai et worker interrompu
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import compress_daemon
+import compress_pdf
+from compress_daemon import _Workers, request_compression
+
+pytestmark = pytest.mark.skipif(not hasattr(compress_daemon.socket, 'AF_UNIX'),
+                                reason="sockets Unix indisponibles")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_sans_demon_la_compression_se_fait_sur_place(tmp_path):
+    assert request_compression({}, socket_path=str(tmp_path / "absent.sock")) is None
+
+def test_fichier_ordinaire_refuse(tmp_path):
+    path = tmp_path / "faux.sock"
+    path.write_text("")
+    assert request_compression({}, socket_path=str(path)) is None
+
+@pytest.fixture
+def daemon(tmp_path):
+    """Démon lancé dans un processus distinct avec un worker, arrêté par SIGTERM"""
+    path = str(tmp_path / "demon.sock")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "compress_daemon.py"), path],
+                               cwd=ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while not os.path.exists(path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.fail("le démon n'a pas démarré")
+        time.sleep(0.05)
+    yield path
+    process.send_signal(signal.SIGTERM)
+    try:
+        assert process.wait(timeout=30) == 0
+    finally:
+        process.kill()
+    assert not os.path.exists(path)
+
+def test_aller_retour_par_le_demon(daemon, corpus, tmp_path):
+    output = str(tmp_path / "sortie.pdf")
+    options = dict(input_path=corpus['mixed'], output_path=output, method='fitz', compression_level='medium')
+    response = request_compression(options, socket_path=daemon, timeout=60)
+    assert response is not None and response['success'], response
+    assert os.path.getsize(output) < os.path.getsize(corpus['mixed'])
+    # Les modes multi-processus sont refusés : le client compresse sur place
+    assert request_compression(dict(options, shards=2), socket_path=daemon, timeout=60) is None
+
+def test_socket_d_un_autre_utilisateur_refuse(daemon, monkeypatch):
+    monkeypatch.setattr(compress_daemon.os, 'getuid', lambda: os.geteuid() + 1)
+    assert request_compression({}, socket_path=daemon, timeout=60) is None
+
+def test_ecouteur_d_un_autre_utilisateur_refuse(tmp_path, monkeypatch):
+    if not hasattr(socket, 'SO_PEERCRED'):
+        pytest.skip("SO_PEERCRED indisponible")
+    path = str(tmp_path / "usurpateur.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    # Socket à nous, mais processus à l'écoute vu comme celui d'un autre compte
+    monkeypatch.setattr(compress_daemon, '_peer_uid', lambda sock: os.getuid() + 1)
+    try:
+        assert request_compression({}, socket_path=path, timeout=5) is None
+    finally:
+        server.close()
+
+def test_delai_depasse_puis_worker_remplace(daemon, corpus, tmp_path):
+    options = dict(input_path=corpus['giant_image'], output_path=str(tmp_path / "lent.pdf"), method='fitz',
+                   compression_level='medium')
+    assert request_compression(options, socket_path=daemon, timeout=0.01) is None
+    # Le worker arrêté a été remplacé : la requête suivante aboutit
+    response = request_compression(options, socket_path=daemon)
+    assert response is not None and response['success'], response
+
+def _blocked(request):
+    time.sleep(60)
+
+@pytest.fixture
+def blocked_pool(monkeypatch):
+    """Pool d'un worker (fork) dont chaque requête reste bloquée"""
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip("fork indisponible")
+    monkeypatch.setattr(compress_daemon, '_compress', _blocked)
+    pool = _Workers(1, multiprocessing.get_context('fork'))
+    yield pool
+    pool.close()
+
+def test_worker_mort_detecte_sans_delai(blocked_pool):
+    process = next(iter(blocked_pool.processes))
+    threading.Timer(0.5, process.kill).start()
+    started = time.monotonic()
+    response = blocked_pool.run({'options': {}})
+    assert "worker interrompu" in response['error']
+    assert time.monotonic() - started < 10
+
+def test_delai_du_client_respecte(blocked_pool):
+    response = blocked_pool.run({'options': {}}, timeout=0.5)
+    assert "délai dépassé" in response['error']
+    assert blocked_pool.idle.qsize() == 1
+
+def test_succes_sans_sortie_ignore(corpus, tmp_path, monkeypatch, capsys):
+    output = str(tmp_path / "sortie.pdf")
+    monkeypatch.setattr(compress_daemon, 'request_compression',
+                        lambda *args, **kwargs: {'version': 1, 'success': True, 'log': "réponse usurpée\n"})
+    monkeypatch.setattr(sys, 'argv', ["compress_pdf.py", corpus['mixed'], "-o", output, "-m", "fitz"])
+    compress_pdf.main()
+    assert os.path.exists(output)
+    assert "réponse usurpée" not in capsys.readouterr().out
@@ -0,0 +1,42 @@
+"""
+Tests du cache disque des images : lecture, écriture et éviction LRU
+"""
+
+import os
+
+from image_cache import ImageCache
+
+def _age(cache, key, mtime):
+    path = cache._path(key)
+    os.utime(path, (mtime, mtime))
+
+def test_get_put(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    key = cache.key(b"source", quality=75, max_size=None)
+    assert key != cache.key(b"source", quality=60, max_size=None)
+    assert cache.get(key) is None
+    cache.put(key, b"encodee")
+    assert cache.get(key) == b"encodee"
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores']) == (1, 1, 1)
+
+def test_eviction_des_entrees_les_plus_anciennes(tmp_path):
+    # 10 Ko max : 4 entrées de 3 Ko dépassent la limite
+    cache = ImageCache(str(tmp_path), max_size_mb=10 / 1024)
+    keys = [cache.key(bytes([index])) for index in range(4)]
+    for index, key in enumerate(keys[:3]):
+        cache.put(key, bytes(3 * 1024))
+        _age(cache, key, 1000 + index)
+    # Une lecture rafraîchit l'entrée la plus ancienne, qui survit à l'éviction
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[3], bytes(3 * 1024))
+
+    assert cache.stats()['evictions'] == 1
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(key) is not None for key in (keys[0], keys[2], keys[3]))
+    assert cache._scan_size() <= cache.max_size * 0.9
+
+def test_taille_relue_au_demarrage(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    cache.put(cache.key(b"a"), bytes(2048))
+    assert ImageCache(str(tmp_path)).stats()['size_mb'] == 2048 / (1024 * 1024)
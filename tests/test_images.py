@@ -0,0 +1,120 @@
+"""
+Tests du traitement des images : estimation de la qualité JPEG, images
+conservées sans réencodage, classification et choix des encodeurs
+"""
+
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from compress_pdf import (EncodedImage, ImageAnalysis, analyze_image, compress_pdf_bytes, estimate_jpeg_quality,
+                          select_codecs)
+
+def _photo(size=(600, 400), mode="RGB"):
+    """Image pseudo-photographique reproductible (dégradé bruité)"""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    gray = Image.blend(gradient, noise, 0.3)
+    if mode == "L":
+        return gray
+    return Image.merge("RGB", (gray, gray.rotate(180), Image.linear_gradient("L").resize(size).transpose(0)))
+
+def _encoded(image, fmt="JPEG", **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+def _pdf_with_image(stream):
+    doc = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(50, 50, 350, 250), stream=stream)
+    return doc.tobytes()
+
+def _only_image(data):
+    """Dictionnaire et flux brut de l'unique image du document"""
+    with fitz.open(stream=data, filetype='pdf') as doc:
+        xref = doc[0].get_images()[0][0]
+        return doc.xref_object(xref), doc.xref_stream_raw(xref)
+
+@pytest.mark.parametrize("quality", [20, 50, 75, 90])
+def test_estimate_jpeg_quality_retrouve_la_qualite_de_pillow(quality):
+    assert abs(estimate_jpeg_quality(_encoded(_photo((64, 48)), quality=quality)) - quality) <= 1
+
+def test_estimate_jpeg_quality_ignore_les_autres_formats():
+    assert estimate_jpeg_quality(_encoded(Image.new("RGB", (8, 8)), "PNG")) is None
+    assert estimate_jpeg_quality(b"pas une image") is None
+
+def test_jpeg_deja_a_la_qualite_cible_conserve():
+    jpeg = _encoded(_photo(), quality=40)
+    result = compress_pdf_bytes(_pdf_with_image(jpeg), method='fitz')
+    assert result.success, result.error
+    assert result.image_stats['images_kept'] == 1
+    assert _only_image(result.data)[1] == jpeg
+
+def test_jpeg_de_meilleure_qualite_reencode():
+    jpeg = _encoded(_photo(), quality=95)
+    result = compress_pdf_bytes(_pdf_with_image(jpeg), method='fitz')
+    assert result.success, result.error
+    assert not result.image_stats.get('images_kept')
+    assert len(_only_image(result.data)[1]) < len(jpeg)
+
+def _scanned_text(size=(600, 400)):
+    """Page de texte numérisée : traits noirs sur fond blanc, en RGB"""
+    from PIL import ImageDraw
+
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(12):
+        draw.text((20, 20 + line * 30), "Texte numérisé en noir et blanc " * 2, fill="black")
+    return image
+
+def test_analyse_image_grise_et_noir_et_blanc():
+    pytest.importorskip("numpy")
+    assert analyze_image(_photo()).kind == 'color'
+    assert analyze_image(_photo(mode="L").convert("RGB")).kind == 'gray'
+    assert analyze_image(_scanned_text()).kind == 'bilevel'
+
+def test_images_grises_et_noir_et_blanc_reencodees_en_compact():
+    pytest.importorskip("numpy")
+    gray = _pdf_with_image(_encoded(_photo(mode="L").convert("RGB"), quality=95))
+    result = compress_pdf_bytes(gray, method='fitz')
+    assert result.success, result.error
+    assert "/DeviceGray" in _only_image(result.data)[0]
+
+    scan = _pdf_with_image(_encoded(_scanned_text(), "PNG"))
+    result = compress_pdf_bytes(scan, method='fitz')
+    assert result.success, result.error
+    assert "/BitsPerComponent 1" in _only_image(result.data)[0]
+
+@pytest.mark.parametrize("analysis, expected", [
+    (ImageAnalysis(kind='bilevel'), ('bilevel', 'palette')),
+    (ImageAnalysis(kind='color'), ('jpeg', 'flate')),
+    (ImageAnalysis(kind='gray'), ('gray', 'flate')),
+    (ImageAnalysis(kind='color', flat=0.8, colors=12), ('palette', 'flate')),
+    (ImageAnalysis(kind='color', flat=0.8, colors=None, edges=0.1), ('flate', 'jpeg')),
+    # Une source JPEG reste en JPEG d'abord : ses artefacts rendraient le sans perte coûteux
+    (ImageAnalysis(kind='color', flat=0.8, colors=12, lossy=True), ('jpeg', 'palette')),
+    (ImageAnalysis(kind='gray', flat=0.8, colors=None, lossy=True), ('gray', 'flate')),
+])
+def test_select_codecs(analysis, expected):
+    assert select_codecs(analysis) == expected
+
+def test_encoded_image_pack_unpack():
+    encoded = EncodedImage(data=b"\x00\n\xffdonnees\n", width=12, height=7, colorspace='/DeviceGray',
+                           filter='/FlateDecode', bits=1, decode_parms='<</Predictor 15/Columns 12>>',
+                           codec='bilevel', candidates=['bilevel', 'palette'], sizes={'bilevel': 9})
+    assert EncodedImage.unpack(encoded.pack()) == encoded
+
+def test_dessin_en_palette():
+    pytest.importorskip("numpy")
+    from PIL import ImageDraw
+
+    drawing = Image.new("RGB", (600, 400), "white")
+    draw = ImageDraw.Draw(drawing)
+    for index, color in enumerate(("red", "navy", "orange", "green")):
+        draw.rectangle((30 + index * 140, 60, 140 + index * 140, 340), fill=color)
+    result = compress_pdf_bytes(_pdf_with_image(_encoded(drawing, "PNG")), method='fitz')
+    assert result.success, result.error
+    assert result.image_stats['codecs'] == {'palette': 1}
+    assert "/Indexed" in _only_image(result.data)[0]
@@ -6,10 +6,14 @@ Script d'analyse de PDF pour comprendre pourquoi un PDF ne se compresse pas
 import sys
 import os
 
+# Le module principal se trouve à la racine du projet
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def analyze_with_fitz(pdf_path):
     """Analyse un PDF avec PyMuPDF"""
     try:
         import fitz
+        from compress_pdf import probe_pdf
         
         doc = fitz.open(pdf_path)
         
@@ -19,47 +23,29 @@ def analyze_with_fitz(pdf_path):
         print(f"🔒 Chiffré: {'Oui' if doc.needs_pass else 'Non'}")
         print(f"📝 Métadonnées: {doc.metadata}")
         
-        total_images = 0
-        total_image_size = 0
-        image_formats = {}
+        # Sonde des dictionnaires d'images : aucun flux n'est décodé
+        profile = probe_pdf(doc)
         
         print("\n🖼️  ANALYSE DES IMAGES")
         print("=" * 30)
+        print(f"Pages échantillonnées: {', '.join(str(p + 1) for p in profile.sampled_pages)}")
         
-        for page_num in range(min(5, doc.page_count)):  # Analyser seulement les 5 premières pages
-            page = doc[page_num]
-            images = page.get_images()
+        for page_num in profile.sampled_pages:
+            images = [image for image in profile.images if page_num in image.pages]
             
             if images:
                 print(f"\nPage {page_num + 1}: {len(images)} image(s)")
                 
-                for img_index, img in enumerate(images):
-                    try:
-                        xref = img[0]
-                        base_image = doc.extract_image(xref)
-                        
-                        width = base_image["width"]
-                        height = base_image["height"]
-                        image_ext = base_image["ext"]
-                        image_size = len(base_image["image"])
-                        
-                        total_images += 1
-                        total_image_size += image_size
-                        
-                        if image_ext in image_formats:
-                            image_formats[image_ext] += 1
-                        else:
-                            image_formats[image_ext] = 1
-                        
-                        print(f"  Image {img_index + 1}: {width}x{height} {image_ext.upper()} ({image_size/1024:.1f} KB)")
-                        
-                    except Exception as e:
-                        print(f"  Erreur analyse image {img_index + 1}: {e}")
+                for img_index, image in enumerate(images):
+                    filters = ' '.join(image.filters) or 'aucun filtre'
+                    print(f"  Image {img_index + 1}: {image.width}x{image.height} {filters} ({image.length/1024:.1f} KB)")
         
         print(f"\n📊 RÉSUMÉ DES IMAGES")
-        print(f"Total images analysées: {total_images}")
-        print(f"Taille totale images: {total_image_size / (1024*1024):.2f} Mo")
-        print(f"Formats: {image_formats}")
+        print(f"Total images analysées: {len(profile.images)} ({profile.image_placements} occurrence(s))")
+        print(f"Taille totale images: {profile.image_bytes / (1024*1024):.2f} Mo")
+        print(f"Pixels décodés: {profile.image_pixels / 1e6:.1f} Mpx")
+        print(f"Formats: {profile.filters}")
+        print(f"Détection automatique (images volumineuses): {'Oui' if profile.image_heavy else 'Non'}")
         
         # Analyse des objets
         print(f"\n🔧 ANALYSE DES OBJETS")
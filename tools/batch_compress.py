@@ -6,24 +6,709 @@ Compresse tous les fichiers PDF d'un répertoire
 
 import os
 import sys
+import time
+import json
+import hashlib
+import shutil
+import socket
+import threading
+import uuid
 import argparse
-import glob
+import fnmatch
+import queue
+from collections import deque
 from pathlib import Path
-from compress_pdf import compress_pdf
 
-def batch_compress(directory_path, output_dir=None, method='auto', compression_level='medium', pattern='*.pdf'):
+# Le module principal se trouve à la racine du projet
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compress_pdf import DECODE_MEMORY_FACTOR, METHODS, compress_pdf, probe_pdf
+
+# Attente maximale du pool entre deux lectures d'une source de fichiers sans fin, en secondes
+IDLE_POLL = 0.5
+
+# Mémoire d'un fichier hors images décodées, en multiple de sa taille : contenu lu, document ouvert, sortie
+FILE_MEMORY_FACTOR = 3
+
+def _output_path(pdf_file, output_dir=None, root=None):
+    """
+    Fichier de sortie d'un PDF : ne dépend que de son chemin, jamais de l'ordre de traitement
+    
+    Avec output_dir, l'arborescence sous root est reproduite dans output_dir.
+    """
+    if output_dir:
+        relative = os.path.relpath(pdf_file, root) if root else os.path.basename(pdf_file)
+        return os.path.join(output_dir, relative)
+    input_path = Path(pdf_file)
+    return str(input_path.parent / f"{input_path.stem}_compressed{input_path.suffix}")
+
+def _is_previous_output(pdf_file):
+    """Sortie par défaut d'un lot précédent : nom en _compressed et original présent à côté"""
+    input_path = Path(pdf_file)
+    if not input_path.stem.endswith("_compressed"):
+        return False
+    original = input_path.with_name(input_path.stem[:-len("_compressed")] + input_path.suffix)
+    return original.exists()
+
+def _matches(relative, patterns):
+    """Vrai si le chemin relatif ou son seul nom correspond à l'un des motifs"""
+    name = os.path.basename(relative)
+    return any(fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def discover_pdfs(directory, include=('*.pdf',), exclude=(), recursive=True, skip=()):
+    """
+    Parcourt un répertoire avec os.scandir et produit les fichiers au fur et à mesure
+    
+    Aucune liste complète n'est construite : le premier fichier est disponible
+    dès la première entrée lue, même dans un répertoire de plusieurs centaines
+    de milliers d'entrées ou sur un partage réseau lent. Les motifs portent
+    sur le chemin relatif à directory ou sur le seul nom ; un répertoire
+    exclu n'est pas parcouru.
+    
+    Args:
+        directory (str): Répertoire racine
+        include (tuple): Motifs des fichiers retenus
+        exclude (tuple): Motifs des fichiers et répertoires écartés
+        recursive (bool): Parcourir les sous-répertoires
+        skip (tuple): Répertoires jamais parcourus (ex: répertoire de sortie placé sous directory)
+    
+    Yields:
+        str: Chemin de chaque fichier retenu
+    """
+    skipped = {os.path.realpath(path) for path in skip}
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            iterator = os.scandir(current)
+        except OSError as e:
+            print(f"⚠️  Répertoire illisible {current}: {e}")
+            continue
+        subdirectories = []
+        with iterator:
+            for entry in iterator:
+                relative = os.path.relpath(entry.path, directory)
+                if exclude and _matches(relative, exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and os.path.realpath(entry.path) not in skipped:
+                            subdirectories.append(entry.path)
+                    elif entry.is_file() and _matches(relative, include):
+                        yield entry.path
+                except OSError:
+                    continue
+        # Ordre de parcours stable pour les sous-répertoires (ceux du dessus d'abord)
+        stack.extend(sorted(subdirectories, reverse=True))
+
+def _partial_path(output_file):
+    """Fichier temporaire écrit par un worker, renommé en output_file une fois complet"""
+    return f"{output_file}.part"
+
+# Journal des compressions, dans le répertoire de sortie (ou d'entrée)
+MANIFEST_NAME = ".batch_manifest.jsonl"
+MANIFEST_VERSION = 1
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Empreinte SHA-256 du contenu d'un fichier, lu par blocs"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Manifest:
+    """
+    Journal JSON-lines des compressions d'un lot, pour les exécutions incrémentales
+    
+    Chaque ligne enregistre un fichier traité : chemin d'entrée et de sortie
+    (relatifs au répertoire du journal), taille, date de modification,
+    empreinte SHA-256, paramètres et résultat. Les lignes sont ajoutées au fil
+    de l'eau : un lot interrompu garde tout ce qui a été terminé, et seule la
+    dernière ligne de chaque entrée compte. Une ligne tronquée est ignorée.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.base = os.path.dirname(os.path.abspath(path))
+        self.entries = {}
+        self._lines = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('version') != MANIFEST_VERSION:
+                        continue
+                    self.entries[entry['input']] = entry
+                    self._lines += 1
+    
+    def key(self, path):
+        """Chemin tel qu'enregistré dans le journal"""
+        return os.path.relpath(os.path.abspath(path), self.base)
+    
+    def resolve(self, key):
+        """Chemin absolu d'un chemin enregistré"""
+        return os.path.normpath(os.path.join(self.base, key))
+    
+    def outputs(self):
+        """Chemins absolus des sorties produites par les lots précédents"""
+        return {self.resolve(entry['output']) for entry in self.entries.values() if entry.get('output')}
+    
+    def reusable(self, entry, params):
+        """Entrée réussie avec les mêmes paramètres et dont la sortie existe encore"""
+        return (entry is not None and entry['success'] and entry['params'] == params
+                and os.path.exists(self.resolve(entry['output'])))
+    
+    def settled(self, entry, params, output_file):
+        """Entrée déjà traitée avec les mêmes paramètres vers la même sortie : réussite encore présente ou échec"""
+        return (entry is not None and entry['params'] == params and entry['output'] == self.key(output_file)
+                and (not entry['success'] or os.path.exists(self.resolve(entry['output']))))
+    
+    def unchanged(self, pdf_file, stat, params, output_file):
+        """Fichier déjà traité à l'identique d'après sa seule taille et sa date (aucune lecture)"""
+        entry = self.entries.get(self.key(pdf_file))
+        return (self.settled(entry, params, output_file) and entry['size'] == stat.st_size
+                and entry['mtime_ns'] == stat.st_mtime_ns)
+    
+    def find_digest(self, digest, params):
+        """Entrée réussie d'un contenu identique, avec les mêmes paramètres, dont la sortie existe"""
+        for entry in self.entries.values():
+            if entry['sha256'] == digest and self.reusable(entry, params):
+                return entry
+        return None
+    
+    def record(self, pdf_file, stat, digest, params, output_file, report, copied_from=None):
+        """Ajoute le résultat d'un fichier au journal"""
+        entry = {
+            'version': MANIFEST_VERSION,
+            'input': self.key(pdf_file),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'params': params,
+            'output': self.key(output_file),
+            'success': report['success'],
+            'output_size': report.get('output_size', 0),
+            'error': report.get('error'),
+            'copied_from': copied_from,
+            'recorded': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.entries[entry['input']] = entry
+        self._lines += 1
+    
+    def compact(self):
+        """Réécrit le journal avec la seule dernière ligne de chaque entrée, s'il a trop grossi"""
+        if self._lines <= 2 * len(self.entries):
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temporary, self.path)
+        self._lines = len(self.entries)
+
+class LeaseQueue:
+    """
+    File de travail partagée entre machines par des baux sur un volume commun
+    
+    Chaque machine parcourt la même arborescence et réclame un fichier en
+    créant son bail (leases/<clé>.lease) en mode exclusif (O_EXCL) : une seule
+    y parvient. Le processus principal rafraîchit la date de ses baux à
+    intervalle régulier (heartbeat) ; un bail que plus personne ne rafraîchit
+    depuis lease_timeout appartient à une machine morte et peut être repris.
+    Un fichier terminé laisse son résultat dans done/<clé>.json, écrit de
+    façon atomique, qui sert au rapport final. Les dates sont comparées à
+    l'horloge du volume partagé, pas à celle de chaque machine.
+    
+    Des fichiers verrous plutôt qu'une base SQLite : le verrouillage de SQLite
+    n'est pas fiable sur NFS, alors que la création exclusive et le
+    renommage y sont atomiques.
+    """
+    
+    def __init__(self, directory, node=None, lease_timeout=300):
+        self.directory = directory
+        self.node = node or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_timeout = lease_timeout
+        self.held = {}
+        self._lock = threading.Lock()
+        for name in ('leases', 'done'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+    
+    @staticmethod
+    def key(relative):
+        """Clé d'un fichier, d'après son chemin relatif à la racine du lot"""
+        return hashlib.sha1(relative.encode('utf-8')).hexdigest()
+    
+    def _lease_path(self, key):
+        return os.path.join(self.directory, 'leases', f"{key}.lease")
+    
+    def _done_path(self, key):
+        return os.path.join(self.directory, 'done', f"{key}.json")
+    
+    def now(self):
+        """Heure du volume partagé : date d'un fichier que cette machine vient de toucher"""
+        clock = os.path.join(self.directory, f".clock-{self.key(self.node)}")
+        with open(clock, 'a'):
+            os.utime(clock)
+        return os.stat(clock).st_mtime
+    
+    def is_done(self, key):
+        return os.path.exists(self._done_path(key))
+    
+    def is_stale(self, path, now):
+        """Bail non rafraîchi depuis lease_timeout (machine morte)"""
+        try:
+            return now - os.stat(path).st_mtime > self.lease_timeout
+        except FileNotFoundError:
+            return False
+    
+    def claim(self, key, relative, now):
+        """
+        Réclame un fichier ; vrai si cette machine en détient désormais le bail
+        
+        Un bail périmé est d'abord renommé sous un nom propre à cette machine :
+        une seule machine réussit ce renommage. Si le bail renommé s'avère
+        frais (rafraîchi entre-temps), il est remis en place.
+        """
+        path = self._lease_path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self.is_stale(path, now):
+                    return False
+                tombstone = f"{path}.{uuid.uuid4().hex}.stale"
+                try:
+                    os.rename(path, tombstone)
+                except FileNotFoundError:
+                    return False
+                if not self.is_stale(tombstone, now):
+                    try:
+                        os.link(tombstone, path)
+                    except FileExistsError:
+                        pass
+                    os.remove(tombstone)
+                    return False
+                os.remove(tombstone)
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'node': self.node, 'input': relative, 'claimed': time.time()}, f)
+            # Terminé par une autre machine entre la vérification et la réclamation
+            if self.is_done(key):
+                os.remove(path)
+                return False
+            with self._lock:
+                self.held[key] = path
+            return True
+        return False
+    
+    def heartbeat(self):
+        """Rafraîchit la date de tous les baux détenus"""
+        with self._lock:
+            paths = list(self.held.values())
+        for path in paths:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+    
+    def complete(self, key, record):
+        """Enregistre le résultat d'un fichier puis libère son bail"""
+        record = dict(record, node=self.node, finished=time.time())
+        path = self._done_path(key)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(temporary, path)
+        with self._lock:
+            lease = self.held.pop(key, None)
+        if lease is not None:
+            try:
+                os.remove(lease)
+            except FileNotFoundError:
+                pass
+    
+    def release_all(self):
+        """Libère les baux encore détenus (arrêt de la machine) : ils sont repris sans attendre"""
+        with self._lock:
+            leases, self.held = list(self.held.values()), {}
+        for path in leases:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def results(self):
+        """Résultats de toutes les machines"""
+        results = []
+        directory = os.path.join(self.directory, 'done')
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entry.path, encoding='utf-8') as f:
+                        results.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(results, key=lambda record: record['input'])
+
+def estimate_job(pdf_file, threads=None):
+    """
+    Durée et mémoire relatives d'un fichier, d'après une sonde rapide des dictionnaires d'images
+    
+    Le coût additionne la taille du fichier et le volume de pixels décodés,
+    extrapolé des pages échantillonnées (voir probe_pdf) à tout le document.
+    La mémoire compte le fichier (FILE_MEMORY_FACTOR) et les plus grandes
+    images décodées en même temps par les threads de recompression.
+    
+    Args:
+        pdf_file (str): PDF à estimer
+        threads (int): Threads de recompression du worker (défaut: nombre de CPU)
+    
+    Returns:
+        tuple: (coût, mémoire estimée en octets)
+    """
+    try:
+        size = os.path.getsize(pdf_file)
+    except OSError:
+        # Fichier disparu : le worker signalera l'échec, sans coût à prévoir
+        return 0, 0
+    try:
+        profile = probe_pdf(pdf_file)
+    except Exception:
+        return size, size * FILE_MEMORY_FACTOR
+    scale = profile.page_count / max(1, len(profile.sampled_pages))
+    decoded = profile.image_pixels * 3 * scale
+    largest = max((image.pixels for image in profile.images), default=0) * 3 * DECODE_MEMORY_FACTOR
+    in_flight = min(threads or os.cpu_count() or 1, round(len(profile.images) * scale))
+    return size + decoded, size * FILE_MEMORY_FACTOR + largest * in_flight
+
+def _next_task(pending, estimates, running_memory, memory_budget):
+    """
+    Prochain fichier admis : le plus coûteux dont la mémoire tient dans le budget restant
+    
+    Un fichier qui dépasse à lui seul le budget est lancé seul, dès que plus
+    rien ne tourne ; les suivants attendent pour qu'il ne finisse pas en queue
+    de lot. Retourne None si aucun fichier ne peut être admis.
+    """
+    if memory_budget is None:
+        return pending[0]
+    if estimates[pending[0]][1] > memory_budget:
+        return pending[0] if running_memory == 0 else None
+    for index in pending:
+        if running_memory + estimates[index][1] <= memory_budget:
+            return index
+    return None
+
+def threads_per_worker(jobs):
+    """
+    Threads de recompression des images pour chacun des jobs processus : les cœurs sont
+    partagés au lieu que chaque processus en lance autant qu'il y a de CPU (la pile et
+    l'arène de chaque thread comptent aussi dans la limite mémoire d'un worker)
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, jobs))
+
+def _worker_loop(conn, method, compression_level, cache, memory_limit, threads):
+    """
+    Boucle d'un worker : modules importés une fois, puis un fichier par message jusqu'à None
+    
+    Chaque réponse est (index, rapport) ; la sortie n'apparaît sous son nom
+    définitif qu'une fois entièrement écrite.
+    """
+    # Worker « chaud » : les bibliothèques sont chargées avant le premier fichier
+    for module in ('fitz', 'pikepdf', 'PIL.Image'):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    if memory_limit:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    # Les messages par fichier brouilleraient le suivi du parent
+    sys.stdout = open(os.devnull, 'w')
+    
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        index, pdf_file, output_file = task
+        # Après un fork, le cache hérite des compteurs du parent : seul l'écart est renvoyé
+        cache_before = cache.stats() if cache is not None else None
+        start = time.perf_counter()
+        partial = _partial_path(output_file)
+        try:
+            result = compress_pdf(pdf_file, partial, method, compression_level, threads, cache)
+            if result:
+                os.replace(partial, output_file)
+            report = {'success': bool(result), 'error': result.error, 'output_size': result.output_size}
+        except MemoryError:
+            # Mémoire du worker potentiellement fragmentée : il s'arrête et sera remplacé
+            report = {'success': False, 'error': "limite mémoire atteinte", 'output_size': 0, 'recycle': True}
+        except Exception as e:
+            report = {'success': False, 'error': str(e), 'output_size': 0}
+        if not report['success'] and os.path.exists(partial):
+            os.remove(partial)
+        report['seconds'] = time.perf_counter() - start
+        if cache is not None:
+            report['cache'] = {name: value - cache_before[name] for name, value in cache.stats().items()
+                               if name in ('hits', 'misses', 'stores', 'evictions')}
+        conn.send((index, report))
+        if report.get('recycle'):
+            break
+    conn.close()
+
+def _start_worker(context, method, compression_level, cache, memory_limit, threads):
+    """Démarre un worker et renvoie (processus, tube)"""
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=_worker_loop,
+                              args=(child_conn, method, compression_level, cache, memory_limit, threads),
+                              daemon=True)
+    process.start()
+    child_conn.close()
+    return process, parent_conn
+
+def _stop_worker(process, conn, kill=False):
+    """Arrête un worker : fin de la boucle, ou arrêt immédiat s'il est bloqué"""
+    if kill:
+        process.terminate()
+    else:
+        try:
+            conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    conn.close()
+    process.join()
+
+def compress_files_parallel(tasks, jobs, method='auto', compression_level='medium', cache=None, timeout=None,
+                            memory_limit=None, memory_budget=None, progress=print, lookahead=None,
+                            on_result=None):
+    """
+    Compresse des fichiers avec un pool de processus « chauds »
+    
+    Chaque worker importe PyMuPDF, pikepdf et Pillow une seule fois puis
+    traite les fichiers un par un. Un worker qui dépasse le délai par fichier
+    est arrêté et remplacé ; la limite mémoire (espace d'adressage du worker)
+    fait échouer le fichier fautif sans bloquer les autres. Les noms de sortie
+    sont fixés avant le lancement : ils ne dépendent pas de l'ordre dans
+    lequel les fichiers se terminent.
+    
+    Les fichiers sont lancés du plus coûteux au moins coûteux (voir
+    estimate_job) : le plus gros ne se retrouve pas seul en fin de lot. Avec
+    memory_budget, un fichier n'est admis que si sa mémoire estimée tient
+    dans ce qui reste du budget ; sinon un fichier plus petit passe devant.
+    
+    tasks peut être un générateur (voir discover_pdfs) : avec lookahead, seuls
+    ce nombre de fichiers à venir sont lus et ordonnés à l'avance, et la
+    compression commence avant la fin de la découverte. Un générateur sans
+    fin (voir watch_folder) produit None quand aucun fichier n'est disponible
+    pour l'instant ; le pool continue alors de suivre les fichiers en cours.
+    
+    Args:
+        tasks (iterable): (PDF d'entrée, PDF de sortie) pour chaque fichier
+        jobs (int): Nombre de processus
+        method (str): Méthode de compression
+        compression_level (str): Niveau de compression
+        cache (ImageCache): Cache disque partagé ; ses compteurs reçoivent l'activité des workers
+        timeout (float): Durée maximale par fichier en secondes (optionnel)
+        memory_limit (int): Mémoire maximale d'un worker en octets (optionnel, Unix)
+        memory_budget (int): Mémoire estimée maximale de l'ensemble des fichiers en cours, en octets
+        progress (callable): Reçoit une ligne de suivi par fichier terminé (None pour ne rien afficher)
+        lookahead (int): Nombre de fichiers en attente lus à l'avance (défaut: tous)
+        on_result (callable): Appelé avec (tâche, rapport) dès qu'un fichier est terminé (optionnel) ;
+            les rapports ne sont alors pas conservés, pour un pool qui tourne sans fin
+    
+    Returns:
+        list: Un rapport par fichier, dans l'ordre de tasks ({'success', 'error', 'output_size', 'seconds'}),
+              vide avec on_result
     """
-    Compresse tous les PDFs d'un répertoire
+    import multiprocessing
+    from multiprocessing.connection import wait
+    
+    context = multiprocessing.get_context()
+    threads = threads_per_worker(jobs)
+    source = iter(tasks)
+    exhausted = False
+    seen = {}         # index -> tâche lue, dans l'ordre de tasks
+    estimates = {}
+    pending = []      # index en attente, du plus coûteux au moins coûteux
+    running_memory = 0
+    reports = {}
+    read = 0
+    idle = []
+    started_workers = 0
+    busy = {}  # tube -> (processus, index, début)
+    done = 0
+    
+    def refill():
+        nonlocal exhausted, read
+        added = False
+        while not exhausted and (lookahead is None or len(pending) < lookahead):
+            try:
+                task = next(source)
+            except StopIteration:
+                exhausted = True
+                break
+            if task is None:
+                # Rien de disponible pour l'instant (surveillance d'un répertoire)
+                break
+            index = read
+            read += 1
+            seen[index] = task
+            estimates[index] = estimate_job(task[0], threads)
+            pending.append(index)
+            added = True
+        if added:
+            pending.sort(key=lambda index: (-estimates[index][0], index))
+    
+    def finish(index, report):
+        nonlocal done, running_memory
+        done += 1
+        running_memory -= estimates.pop(index)[1]
+        task = seen.pop(index)
+        if cache is not None and report.get('cache'):
+            cache.merge(report['cache'])
+        if on_result is not None:
+            on_result(task, report)
+        else:
+            reports[index] = report
+        if progress:
+            name = os.path.basename(task[0])
+            total = f"{read}{'' if exhausted else '+'}"
+            if report['success']:
+                progress(f"[{done}/{total}] ✅ {name}: {report['output_size'] / (1024 * 1024):.2f} Mo "
+                         f"en {report['seconds']:.1f} s")
+            else:
+                progress(f"[{done}/{total}] ❌ {name}: {report['error']}")
+    
+    try:
+        refill()
+        while pending or busy or not exhausted:
+            while pending and (idle or started_workers < jobs):
+                index = _next_task(pending, estimates, running_memory, memory_budget)
+                if index is None:
+                    # Budget mémoire occupé : attendre la fin d'un fichier
+                    break
+                pending.remove(index)
+                running_memory += estimates[index][1]
+                if idle:
+                    process, conn = idle.pop()
+                else:
+                    # Workers démarrés à la demande : pas de processus inutile pour un petit lot
+                    process, conn = _start_worker(context, method, compression_level, cache, memory_limit, threads)
+                    started_workers += 1
+                pdf_file, output_file = seen[index]
+                conn.send((index, pdf_file, output_file))
+                busy[conn] = (process, index, time.monotonic())
+                refill()
+            
+            wait_for = None
+            if timeout and busy:
+                oldest = min(started for _, _, started in busy.values())
+                wait_for = max(0.0, oldest + timeout - time.monotonic())
+            if not exhausted:
+                # D'autres fichiers peuvent arriver : ne pas rester bloqué sur les fichiers en cours
+                wait_for = min(wait_for, IDLE_POLL) if wait_for is not None else IDLE_POLL
+            for conn in (wait(list(busy), timeout=wait_for) if busy else ()):
+                process, index, started = busy.pop(conn)
+                try:
+                    _, report = conn.recv()
+                except (EOFError, OSError):
+                    # Worker mort en cours de fichier (mémoire épuisée, plantage) : remplacé
+                    _stop_worker(process, conn, kill=True)
+                    report = {'success': False, 'error': f"worker interrompu (code {process.exitcode})",
+                              'output_size': 0, 'seconds': time.monotonic() - started}
+                    idle.append(_start_worker(context, method, compression_level, cache, memory_limit, threads))
+                else:
+                    if report.get('recycle'):
+                        conn.close()
+                        process.join()
+                        idle.append(_start_worker(context, method, compression_level, cache, memory_limit, threads))
+                    else:
+                        idle.append((process, conn))
+                finish(index, report)
+            
+            if timeout:
+                now = time.monotonic()
+                for conn, (process, index, started) in list(busy.items()):
+                    if now - started < timeout:
+                        continue
+                    # Fichier bloqué : le worker est arrêté, sa sortie partielle supprimée
+                    del busy[conn]
+                    _stop_worker(process, conn, kill=True)
+                    partial = _partial_path(seen[index][1])
+                    if os.path.exists(partial):
+                        os.remove(partial)
+                    finish(index, {'success': False, 'error': f"délai dépassé ({timeout:g} s)", 'output_size': 0,
+                                   'seconds': now - started})
+                    idle.append(_start_worker(context, method, compression_level, cache, memory_limit, threads))
+            refill()
+    finally:
+        for process, conn in idle:
+            _stop_worker(process, conn)
+        for conn, (process, _, _) in busy.items():
+            _stop_worker(process, conn, kill=True)
+    
+    return [reports[index] for index in sorted(reports)]
+
+def _compress_sequential(tasks, method, compression_level, cache, on_result=None):
+    """
+    Compresse les fichiers un par un dans le processus courant, avec le suivi détaillé de compress_pdf
+    
+    Comme compress_files_parallel, on_result reçoit (tâche, rapport) dès qu'un fichier est
+    terminé ; les rapports ne sont alors pas renvoyés.
+    """
+    reports = []
+    for i, (pdf_file, output_file) in enumerate(tasks, 1):
+        print(f"\n[{i}] {pdf_file}")
+        print("-" * 30)
+        result = compress_pdf(pdf_file, output_file, method, compression_level, threads_per_worker(1), cache)
+        success = bool(result) and os.path.exists(output_file)
+        report = {'success': success, 'error': result.error,
+                  'output_size': os.path.getsize(output_file) if success else 0}
+        if on_result is not None:
+            on_result((pdf_file, output_file), report)
+        else:
+            reports.append(report)
+    return reports
+
+def batch_compress(directory_path, output_dir=None, method='auto', compression_level='medium', pattern='*.pdf',
+                   cache=None, jobs=None, timeout=None, memory_limit=None, memory_budget=None, manifest=True,
+                   force=False, include=None, exclude=None, recursive=True):
+    """
+    Compresse tous les PDFs d'un répertoire et de ses sous-répertoires
+    
+    Les fichiers sont découverts au fil de l'eau (voir discover_pdfs) : la
+    compression commence dès les premiers trouvés. Avec output_dir,
+    l'arborescence d'entrée est reproduite dans le répertoire de sortie.
     
     Args:
         directory_path (str): Répertoire contenant les PDFs
         output_dir (str): Répertoire de sortie (optionnel)
         method (str): Méthode de compression
         compression_level (str): Niveau de compression
-        pattern (str): Pattern de fichiers à traiter
+        pattern (str): Pattern de fichiers à traiter, si include n'est pas donné
+        cache (ImageCache): Cache disque des images recompressées, partagé par tous les fichiers
+        jobs (int): Nombre de processus en parallèle (voir compress_files_parallel) ; le pool est aussi
+            utilisé dès qu'un délai ou une limite mémoire est demandé
+        timeout (float): Durée maximale par fichier en secondes (optionnel)
+        memory_limit (int): Mémoire maximale d'un worker en octets (optionnel)
+        memory_budget (int): Mémoire estimée maximale des fichiers traités en même temps, en octets
+        manifest (bool): Tenir le journal MANIFEST_NAME (répertoire de sortie, sinon d'entrée) : les
+            fichiers inchangés depuis le lot précédent sont ignorés sur leur seule taille et date, les
+            contenus identiques compressés une fois puis copiés
+        force (bool): Recompresser même les fichiers inchangés (le journal reste mis à jour)
+        include (list): Motifs des fichiers retenus (chemin relatif ou nom ; défaut: [pattern])
+        exclude (list): Motifs des fichiers et répertoires écartés
+        recursive (bool): Parcourir les sous-répertoires
     """
     
-    if not os.path.exists(directory_path):
+    if not os.path.isdir(directory_path):
         print(f"❌ Le répertoire {directory_path} n'existe pas.")
         return False
     
@@ -31,54 +716,124 @@ def batch_compress(directory_path, output_dir=None, method='auto', compression_l
     if output_dir:
         os.makedirs(output_dir, exist_ok=True)
     
-    # Trouver tous les fichiers PDF
-    search_pattern = os.path.join(directory_path, pattern)
-    pdf_files = glob.glob(search_pattern)
-    
-    if not pdf_files:
-        print(f"❌ Aucun fichier PDF trouvé dans {directory_path}")
-        return False
-    
-    print(f"📁 Répertoire: {directory_path}")
-    print(f"📄 {len(pdf_files)} fichier(s) PDF trouvé(s)")
+    print(f"📁 Répertoire: {directory_path}{' (récursif)' if recursive else ''}")
     print(f"🔧 Méthode: {method}, Niveau: {compression_level}")
     print("=" * 50)
     
+    journal = Manifest(os.path.join(output_dir or directory_path, MANIFEST_NAME)) if manifest else None
+    # Les sorties des lots précédents correspondent souvent au pattern : elles ne sont jamais des entrées
+    produced = journal.outputs() if journal is not None else set()
+    skip = (output_dir,) if output_dir else ()
+    params = {'method': method, 'level': compression_level}
+    pending = {}      # entrée -> (stat, empreinte) à enregistrer
+    copies = []       # (entrée, sortie, source de la copie, entrée d'origine)
+    first_of = {}     # empreinte -> entrée compressée dans ce lot
+    counts = {'found': 0, 'skipped': 0}
+    tasks = []        # (entrée, sortie) à compresser, dans l'ordre de découverte
+    results = {}      # entrée -> rapport
+    
+    def plan():
+        """Fichiers à compresser, produits au fil de la découverte"""
+        for pdf_file in discover_pdfs(directory_path, tuple(include or [pattern]), tuple(exclude or ()),
+                                      recursive, skip):
+            if os.path.abspath(pdf_file) in produced or (not output_dir and _is_previous_output(pdf_file)):
+                continue
+            counts['found'] += 1
+            output_file = _output_path(pdf_file, output_dir, directory_path)
+            if output_dir:
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            if journal is not None:
+                stat = os.stat(pdf_file)
+                if not force and journal.unchanged(pdf_file, stat, params, output_file):
+                    counts['skipped'] += 1
+                    continue
+                digest = file_digest(pdf_file)
+                entry = journal.entries.get(journal.key(pdf_file))
+                if not force and journal.settled(entry, params, output_file) and entry['sha256'] == digest:
+                    # Seule la date a changé : le journal est mis à jour, sans recompression
+                    journal.record(pdf_file, stat, digest, params, output_file, entry, entry.get('copied_from'))
+                    counts['skipped'] += 1
+                    continue
+                pending[pdf_file] = (stat, digest)
+                if digest in first_of:
+                    original = first_of[digest]
+                    copies.append((pdf_file, output_file, _output_path(original, output_dir, directory_path),
+                                   original))
+                    continue
+                previous = None if force else journal.find_digest(digest, params)
+                if previous is not None:
+                    copies.append((pdf_file, output_file, journal.resolve(previous['output']),
+                                   journal.resolve(previous['input'])))
+                    continue
+                first_of[digest] = pdf_file
+            tasks.append((pdf_file, output_file))
+            yield pdf_file, output_file
+    
+    def record(task, report):
+        """Résultat d'un fichier, inscrit au journal dès sa fin : un lot interrompu garde sa progression"""
+        pdf_file, output_file = task
+        results[pdf_file] = report
+        if journal is not None:
+            stat, digest = pending[pdf_file]
+            journal.record(pdf_file, stat, digest, params, output_file, report)
+    
     total_original = 0
     total_compressed = 0
     success_count = 0
     
-    for i, pdf_file in enumerate(pdf_files, 1):
-        print(f"\n[{i}/{len(pdf_files)}] {os.path.basename(pdf_file)}")
-        print("-" * 30)
-        
-        # Déterminer le fichier de sortie
-        if output_dir:
-            output_file = os.path.join(output_dir, os.path.basename(pdf_file))
+    if (jobs and jobs > 1) or timeout or memory_limit or memory_budget:
+        print(f"⚙️  {jobs or 1} processus en parallèle")
+        # Quelques fichiers d'avance par worker : ordre du plus coûteux au moins coûteux sans attendre
+        # la fin de la découverte
+        compress_files_parallel(plan(), jobs or 1, method, compression_level, cache, timeout, memory_limit,
+                                memory_budget, lookahead=max(16, (jobs or 1) * 4), on_result=record)
+    else:
+        _compress_sequential(plan(), method, compression_level, cache, on_result=record)
+    
+    if not counts['found']:
+        print(f"❌ Aucun fichier PDF trouvé dans {directory_path}")
+        return False
+    print(f"📄 {counts['found']} fichier(s) PDF trouvé(s)")
+    if journal is not None:
+        print(f"📋 Journal: {journal.path} ({counts['skipped']} fichier(s) inchangé(s) ignoré(s), "
+              f"{len(copies)} doublon(s) copié(s), {len(tasks)} compressé(s))")
+    skipped = counts['skipped']
+    
+    # Doublons : copie de la sortie du contenu identique déjà compressé
+    for pdf_file, output_file, source, original in copies:
+        report = results.get(original, {'success': True})
+        if report['success'] and os.path.exists(source):
+            if os.path.abspath(source) != os.path.abspath(output_file):
+                shutil.copyfile(source, output_file)
+            report = {'success': True, 'error': None, 'output_size': os.path.getsize(output_file)}
         else:
-            input_path = Path(pdf_file)
-            output_file = str(input_path.parent / f"{input_path.stem}_compressed{input_path.suffix}")
-        
-        # Obtenir la taille originale
+            report = {'success': False, 'error': f"échec du fichier identique {os.path.basename(original)}",
+                      'output_size': 0}
+        results[pdf_file] = report
+        tasks.append((pdf_file, output_file))
+        stat, digest = pending[pdf_file]
+        journal.record(pdf_file, stat, digest, params, output_file, report, journal.key(original))
+    
+    # Totaux calculés dans le parent, dans l'ordre des fichiers
+    for pdf_file, output_file in tasks:
+        report = results[pdf_file]
         original_size = os.path.getsize(pdf_file) / (1024 * 1024)
         total_original += original_size
-        
-        # Comprimer le fichier
-        if compress_pdf(pdf_file, output_file, method, compression_level):
-            if os.path.exists(output_file):
-                compressed_size = os.path.getsize(output_file) / (1024 * 1024)
-                total_compressed += compressed_size
-                success_count += 1
-            else:
-                total_compressed += original_size
+        if report['success']:
+            total_compressed += report['output_size'] / (1024 * 1024)
+            success_count += 1
         else:
             total_compressed += original_size
+    if journal is not None:
+        journal.compact()
     
     # Statistiques finales
     print("\n" + "=" * 50)
     print("📊 STATISTIQUES FINALES")
     print("=" * 50)
-    print(f"✅ Fichiers traités avec succès: {success_count}/{len(pdf_files)}")
+    print(f"✅ Fichiers traités avec succès: {success_count}/{len(tasks)}")
+    if skipped:
+        print(f"⏭️  Fichiers inchangés depuis le lot précédent: {skipped}")
     print(f"📏 Taille totale originale: {total_original:.2f} Mo")
     print(f"📏 Taille totale compressée: {total_compressed:.2f} Mo")
     
@@ -87,30 +842,478 @@ def batch_compress(directory_path, output_dir=None, method='auto', compression_l
         print(f"💾 Réduction totale: {total_reduction:.1f}%")
         print(f"💾 Espace économisé: {total_original - total_compressed:.2f} Mo")
     
-    return success_count > 0
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"🗄️  Cache d'images: {cache_stats['hits']} réutilisée(s), {cache_stats['misses']} absente(s), "
+              f"taux {cache_stats['hit_rate'] * 100:.1f}%, {cache_stats['evictions']} éviction(s)")
+    
+    return success_count > 0 or not tasks
+
+# Surveillance d'un répertoire : durée sans changement avant de considérer un fichier complet,
+# intervalle entre deux parcours complets et taille de la file des fichiers prêts
+SETTLE_SECONDS = 2.0
+POLL_INTERVAL = 5.0
+MAX_QUEUED = 64
+# Nombre de latences conservées pour les percentiles
+LATENCY_WINDOW = 1000
+
+def _looks_complete(path):
+    """Fin de fichier PDF présente (%%EOF) : l'écriture est terminée"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(path) - 1024))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+class FolderWatcher:
+    """
+    Détecte les nouveaux PDFs d'un répertoire et signale ceux entièrement écrits
+    
+    Avec inotify_simple (Linux), les événements de fin d'écriture et de
+    déplacement déclenchent l'examen immédiat du fichier concerné, et un
+    parcours complet n'a lieu que toutes les poll_interval secondes par
+    sécurité (événements perdus, volumes réseau). Sans lui, le répertoire est
+    parcouru (os.scandir) toutes les poll_interval secondes. Un fichier est
+    prêt quand sa taille et sa date n'ont pas changé depuis settle secondes
+    et qu'il se termine par %%EOF ; un fichier déjà signalé ne l'est de
+    nouveau que s'il est modifié.
+    """
+    
+    def __init__(self, directory, include=('*.pdf',), exclude=(), recursive=True, skip=(),
+                 settle=SETTLE_SECONDS, poll_interval=POLL_INTERVAL):
+        self.directory = directory
+        self.include = include
+        self.exclude = exclude
+        self.recursive = recursive
+        self.skip = skip
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.candidates = {}  # chemin -> (taille, date, vu pour la première fois, inchangé depuis)
+        self.signaled = {}    # chemin -> (taille, date) au moment du signalement
+        self.inotify = None
+        self.watches = {}
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            return
+        self.inotify = INotify()
+        self._flags = flags
+        self._mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+        self._watch(directory)
+    
+    def _watch(self, directory):
+        try:
+            self.watches[self.inotify.add_watch(directory, self._mask)] = directory
+        except OSError:
+            return
+        if self.recursive:
+            skipped = {os.path.realpath(path) for path in self.skip}
+            try:
+                with os.scandir(directory) as entries:
+                    subdirectories = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)
+                                      and os.path.realpath(entry.path) not in skipped]
+            except OSError:
+                # Répertoire supprimé ou renommé entre l'événement et son parcours
+                return
+            for subdirectory in subdirectories:
+                self._watch(subdirectory)
+    
+    def _observe(self, path, now):
+        """Met à jour l'état d'un fichier d'après son stat"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.candidates.pop(path, None)
+            self.signaled.pop(path, None)
+            return
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self.signaled.get(path) == signature:
+            return
+        previous = self.candidates.get(path)
+        if previous is None:
+            self.candidates[path] = signature + (now, now)
+        elif previous[:2] != signature:
+            self.candidates[path] = signature + (previous[2], now)
+    
+    def scan(self, now):
+        """Parcours complet du répertoire"""
+        for pdf_file in discover_pdfs(self.directory, self.include, self.exclude, self.recursive, self.skip):
+            if not _is_previous_output(pdf_file):
+                self._observe(pdf_file, now)
+    
+    def wait(self, timeout):
+        """Attend des événements (inotify) ou simplement timeout secondes, et examine les fichiers touchés"""
+        if self.inotify is None:
+            time.sleep(timeout)
+            return
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            directory = self.watches.get(event.wd)
+            if directory is None or not event.name:
+                continue
+            path = os.path.join(directory, event.name)
+            if event.mask & self._flags.ISDIR:
+                if self.recursive:
+                    self._watch(path)
+                continue
+            relative = os.path.relpath(path, self.directory)
+            if (_matches(relative, self.include) and not (self.exclude and _matches(relative, self.exclude))
+                    and not _is_previous_output(path)):
+                self._observe(path, time.monotonic())
+    
+    def ready(self, now):
+        """Fichiers entièrement écrits depuis le dernier appel : [(chemin, vu pour la première fois)]"""
+        files = []
+        for path, (size, mtime, first_seen, changed) in list(self.candidates.items()):
+            if now - changed < self.settle:
+                continue
+            self._observe(path, now)
+            current = self.candidates.get(path)
+            if current is None or current[3] != changed:
+                continue
+            if not _looks_complete(path) and now - changed < self.settle * 10:
+                # Taille stable mais fin de fichier absente : écriture lente, on attend encore un peu
+                continue
+            del self.candidates[path]
+            self.signaled[path] = (size, mtime)
+            files.append((path, first_seen))
+        return files
+
+def watch_folder(directory_path, output_dir=None, method='auto', compression_level='medium', pattern='*.pdf',
+                 cache=None, jobs=None, timeout=None, memory_limit=None, memory_budget=None, include=None,
+                 exclude=None, recursive=True, manifest=True, settle=SETTLE_SECONDS, poll_interval=POLL_INTERVAL,
+                 max_queued=MAX_QUEUED, status_file=None, stop=None):
+    """
+    Surveille un répertoire et compresse en continu les PDFs qui y arrivent
+    
+    Un thread de surveillance (voir FolderWatcher) place les fichiers
+    entièrement écrits dans une file bornée (max_queued) : quand elle est
+    pleine, la détection attend que le pool se libère. Le pool de processus
+    chauds (voir compress_files_parallel) reste démarré entre deux arrivées.
+    Les fichiers déjà traités à l'identique (journal MANIFEST_NAME) sont
+    ignorés, y compris au redémarrage. Les compteurs (profondeur de file,
+    fichiers en cours, traités, en échec, latences de l'arrivée à la fin de
+    la compression) sont écrits dans status_file à chaque fichier terminé et
+    affichés à intervalle régulier.
+    
+    Args:
+        directory_path (str): Répertoire surveillé
+        settle (float): Secondes sans changement avant de considérer un fichier complet
+        poll_interval (float): Intervalle entre deux parcours complets, en secondes
+        max_queued (int): Nombre maximal de fichiers prêts en attente d'un worker
+        status_file (str): Fichier JSON des compteurs, réécrit de façon atomique (optionnel)
+        stop (threading.Event): Arrête la surveillance une fois positionné (défaut: Ctrl+C)
+        (autres paramètres : voir batch_compress)
+    
+    Returns:
+        dict: Compteurs au moment de l'arrêt
+    """
+    stop = stop or threading.Event()
+    ready = queue.Queue(maxsize=max_queued)
+    journal = Manifest(os.path.join(output_dir or directory_path, MANIFEST_NAME)) if manifest else None
+    params = {'method': method, 'level': compression_level}
+    skip = (output_dir,) if output_dir else ()
+    watcher = FolderWatcher(directory_path, tuple(include or [pattern]), tuple(exclude or ()), recursive, skip,
+                            settle, poll_interval)
+    latencies = deque(maxlen=LATENCY_WINDOW)
+    arrivals = {}  # entrée -> instant où le fichier a été vu pour la première fois
+    counters = {'detected': 0, 'skipped': 0, 'dispatched': 0, 'completed': 0, 'failed': 0}
+    
+    def status():
+        ordered = sorted(latencies)
+        return dict(counters,
+                    queue_depth=ready.qsize(),
+                    in_flight=counters['dispatched'] - counters['completed'] - counters['failed'],
+                    latency_last=latencies[-1] if latencies else None,
+                    latency_mean=sum(ordered) / len(ordered) if ordered else None,
+                    latency_p95=ordered[int(len(ordered) * 0.95)] if ordered else None,
+                    latency_max=ordered[-1] if ordered else None,
+                    watcher='inotify' if watcher.inotify is not None else 'polling',
+                    updated=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    
+    def publish():
+        if status_file is None:
+            return
+        temporary = f"{status_file}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(status(), f, indent=2)
+        os.replace(temporary, status_file)
+    
+    def watch():
+        last_scan = None
+        while not stop.is_set():
+            now = time.monotonic()
+            if last_scan is None or now - last_scan >= poll_interval:
+                watcher.scan(now)
+                last_scan = now
+            for path, first_seen in watcher.ready(time.monotonic()):
+                counters['detected'] += 1
+                # File pleine : la détection attend (contre-pression) sans bloquer l'arrêt
+                while not stop.is_set():
+                    try:
+                        ready.put((path, first_seen), timeout=IDLE_POLL)
+                        break
+                    except queue.Full:
+                        continue
+            watcher.wait(min(settle, poll_interval) / 2)
+    
+    def tasks():
+        last_report = time.monotonic()
+        while not stop.is_set():
+            if time.monotonic() - last_report >= poll_interval * 6:
+                current = status()
+                print(f"📡 File: {current['queue_depth']}, en cours: {current['in_flight']}, "
+                      f"traités: {current['completed']}, échecs: {current['failed']}")
+                last_report = time.monotonic()
+            try:
+                pdf_file, first_seen = ready.get(timeout=IDLE_POLL)
+            except queue.Empty:
+                yield None
+                continue
+            output_file = _output_path(pdf_file, output_dir, directory_path)
+            try:
+                stat = os.stat(pdf_file)
+            except OSError:
+                # Supprimé ou renommé depuis qu'il a été jugé complet : abandonné
+                continue
+            if journal is not None and journal.unchanged(pdf_file, stat, params, output_file):
+                counters['skipped'] += 1
+                continue
+            if output_dir:
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            arrivals[pdf_file] = first_seen
+            counters['dispatched'] += 1
+            yield pdf_file, output_file
+    
+    def record(task, report):
+        pdf_file, output_file = task
+        latencies.append(time.monotonic() - arrivals.pop(pdf_file))
+        counters['completed' if report['success'] else 'failed'] += 1
+        if journal is not None:
+            try:
+                journal.record(pdf_file, os.stat(pdf_file), file_digest(pdf_file), params, output_file, report)
+            except OSError:
+                pass  # Entrée disparue pendant la compression : rien à enregistrer
+            journal.compact()
+        publish()
+    
+    print(f"👀 Surveillance de {directory_path} ({'inotify' if watcher.inotify is not None else 'scrutation'}, "
+          f"fichier stable depuis {settle:g} s, file de {max_queued}) - Ctrl+C pour arrêter")
+    publish()
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    try:
+        compress_files_parallel(tasks(), jobs or 1, method, compression_level, cache, timeout, memory_limit,
+                                memory_budget, lookahead=jobs or 1, on_result=record)
+    except KeyboardInterrupt:
+        print("\n🛑 Arrêt de la surveillance")
+    finally:
+        stop.set()
+        thread.join()
+        publish()
+    return status()
+
+def run_queue_node(directory_path, queue_dir, output_dir=None, method='auto', compression_level='medium',
+                   pattern='*.pdf', cache=None, jobs=None, timeout=None, memory_limit=None, memory_budget=None,
+                   include=None, exclude=None, recursive=True, node=None, lease_timeout=300, heartbeat=30):
+    """
+    Participe à un lot réparti entre plusieurs machines (voir LeaseQueue)
+    
+    La machine parcourt l'arborescence, réclame les fichiers libres et les
+    compresse avec son pool de processus. Une fois son parcours terminé, elle
+    repasse tant que des fichiers restent aux mains d'autres machines, et
+    reprend ceux dont le bail est périmé. Elle affiche enfin le rapport
+    agrégé de toutes les machines. Plusieurs processus sur une même machine
+    simulent autant de machines.
+    
+    Args:
+        directory_path (str): Racine des PDFs, même chemin sur toutes les machines
+        queue_dir (str): Répertoire de la file sur le volume partagé
+        node (str): Nom de la machine dans les baux et le rapport (défaut: hôte:pid)
+        lease_timeout (float): Durée sans rafraîchissement au-delà de laquelle un bail est repris, en secondes
+        heartbeat (float): Intervalle de rafraîchissement des baux, en secondes
+        (autres paramètres : voir batch_compress)
+    
+    Returns:
+        dict: Rapport agrégé ({'files', 'succeeded', 'input_size', 'output_size', 'nodes'})
+    """
+    queue = LeaseQueue(queue_dir, node, lease_timeout)
+    skip = tuple(path for path in (output_dir, queue_dir) if path)
+    print(f"🛰️  Machine {queue.node} : file {queue_dir} (bail {lease_timeout:g} s, heartbeat {heartbeat:g} s)")
+    
+    stop = threading.Event()
+    
+    def beat():
+        while not stop.wait(heartbeat):
+            queue.heartbeat()
+    
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    
+    def claimed(waiting):
+        """Fichiers réclamés par cette machine au cours d'un passage ; waiting compte ceux des autres"""
+        now = queue.now()
+        for pdf_file in discover_pdfs(directory_path, tuple(include or [pattern]), tuple(exclude or ()),
+                                      recursive, skip):
+            if not output_dir and _is_previous_output(pdf_file):
+                continue
+            relative = os.path.relpath(pdf_file, directory_path)
+            key = queue.key(relative)
+            if queue.is_done(key):
+                continue
+            if not queue.claim(key, relative, now):
+                waiting.append(relative)
+                continue
+            output_file = _output_path(pdf_file, output_dir, directory_path)
+            if output_dir:
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            yield pdf_file, output_file
+    
+    def record(task, report):
+        pdf_file, output_file = task
+        relative = os.path.relpath(pdf_file, directory_path)
+        queue.complete(queue.key(relative), {
+            'input': relative,
+            'output': output_file,
+            'input_size': os.path.getsize(pdf_file),
+            'success': report['success'],
+            'output_size': report['output_size'],
+            'error': report['error'],
+            'seconds': report['seconds'],
+        })
+    
+    try:
+        while True:
+            waiting = []
+            # Un bail par worker au plus en attente : les autres machines prennent le reste
+            compress_files_parallel(claimed(waiting), jobs or 1, method, compression_level, cache, timeout,
+                                    memory_limit, memory_budget, lookahead=jobs or 1, on_result=record)
+            if not waiting:
+                break
+            print(f"⏳ {len(waiting)} fichier(s) en cours sur d'autres machines")
+            time.sleep(min(heartbeat, lease_timeout))
+    finally:
+        stop.set()
+        queue.release_all()
+    
+    results = queue.results()
+    report = {
+        'files': len(results),
+        'succeeded': sum(1 for record in results if record['success']),
+        'input_size': sum(record['input_size'] for record in results),
+        'output_size': sum(record['output_size'] if record['success'] else record['input_size']
+                           for record in results),
+        'nodes': {},
+    }
+    for record in results:
+        report['nodes'][record['node']] = report['nodes'].get(record['node'], 0) + 1
+    
+    print("\n" + "=" * 50)
+    print("📊 RAPPORT AGRÉGÉ (toutes machines)")
+    print("=" * 50)
+    print(f"✅ Fichiers traités avec succès: {report['succeeded']}/{report['files']}")
+    for name, count in sorted(report['nodes'].items()):
+        print(f"   🖥️  {name}: {count} fichier(s)")
+    print(f"📏 Taille totale originale: {report['input_size'] / (1024 * 1024):.2f} Mo")
+    print(f"📏 Taille totale compressée: {report['output_size'] / (1024 * 1024):.2f} Mo")
+    if report['input_size']:
+        reduction = (report['input_size'] - report['output_size']) / report['input_size'] * 100
+        print(f"💾 Réduction totale: {reduction:.1f}%")
+    return report
 
 def main():
     parser = argparse.ArgumentParser(description="Compression par lot de fichiers PDF")
     parser.add_argument("directory", help="Répertoire contenant les fichiers PDF")
     parser.add_argument("-o", "--output", help="Répertoire de sortie (optionnel)")
-    parser.add_argument("-m", "--method", choices=['auto', 'pikepdf', 'fitz', 'pypdf'], 
+    parser.add_argument("-m", "--method", choices=list(METHODS), 
                        default='auto', help="Méthode de compression (défaut: auto)")
     parser.add_argument("-l", "--level", choices=['low', 'medium', 'high'], 
                        default='medium', help="Niveau de compression (défaut: medium)")
     parser.add_argument("-p", "--pattern", default='*.pdf', 
                        help="Pattern de fichiers à traiter (défaut: *.pdf)")
+    parser.add_argument("--include", action="append",
+                       help="Motif des fichiers retenus, sur le chemin relatif ou le nom (répétable, remplace -p)")
+    parser.add_argument("--exclude", action="append",
+                       help="Motif des fichiers ou répertoires écartés (répétable, ex: --exclude 'brouillons/*')")
+    parser.add_argument("--no-recursive", action="store_true",
+                       help="Ne traiter que les fichiers du répertoire, sans ses sous-répertoires")
+    parser.add_argument("-j", "--jobs", type=int,
+                       help="Nombre de fichiers compressés en parallèle, un processus par fichier (défaut: 1)")
+    parser.add_argument("--timeout", type=float,
+                       help="Durée maximale par fichier en secondes ; un worker bloqué est arrêté et remplacé")
+    parser.add_argument("--memory-limit", type=float,
+                       help="Mémoire maximale d'un worker en Mo ; le fichier qui la dépasse échoue seul")
+    parser.add_argument("--memory-budget", type=float,
+                       help="Mémoire en Mo pour l'ensemble des fichiers en cours : un fichier n'est lancé que si "
+                            "sa mémoire estimée tient dans le budget restant")
+    parser.add_argument("--no-manifest", action="store_true",
+                       help=f"Ne pas tenir le journal {MANIFEST_NAME} (tout est recompressé à chaque lot)")
+    parser.add_argument("--force", action="store_true",
+                       help="Recompresser aussi les fichiers inchangés depuis le lot précédent")
+    parser.add_argument("--watch", action="store_true",
+                       help="Surveiller le répertoire et compresser en continu les PDFs qui y arrivent")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                       help=f"Mode --watch: secondes sans changement avant de traiter un fichier "
+                            f"(défaut: {SETTLE_SECONDS:g})")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                       help=f"Mode --watch: intervalle entre deux parcours du répertoire (défaut: {POLL_INTERVAL:g})")
+    parser.add_argument("--max-queued", type=int, default=MAX_QUEUED,
+                       help=f"Mode --watch: fichiers prêts en attente au plus (défaut: {MAX_QUEUED})")
+    parser.add_argument("--status-file", help="Mode --watch: fichier JSON des compteurs (file, latences)")
+    parser.add_argument("--queue",
+                       help="Répertoire de file partagé : plusieurs machines se répartissent le lot par des baux")
+    parser.add_argument("--node", help="Nom de cette machine dans la file (défaut: hôte:pid)")
+    parser.add_argument("--lease-timeout", type=float, default=300,
+                       help="Secondes sans heartbeat avant reprise du fichier d'une machine morte (défaut: 300)")
+    parser.add_argument("--heartbeat", type=float, default=30,
+                       help="Intervalle de rafraîchissement des baux en secondes (défaut: 30)")
+    parser.add_argument("--cache-dir", help="Répertoire du cache des images recompressées (optionnel)")
+    parser.add_argument("--cache-size", type=float, default=512,
+                       help="Taille maximale du cache en Mo (défaut: 512)")
     
     args = parser.parse_args()
     
+    cache = None
+    if args.cache_dir:
+        from image_cache import ImageCache
+        cache = ImageCache(args.cache_dir, args.cache_size)
+    
     print("🔄 COMPRESSION PAR LOT - PDF COMPRESSOR")
     print("=" * 50)
     
+    memory_limit = int(args.memory_limit * 1024 * 1024) if args.memory_limit else None
+    memory_budget = int(args.memory_budget * 1024 * 1024) if args.memory_budget else None
+    if args.watch:
+        counters = watch_folder(args.directory, args.output, args.method, args.level, args.pattern, cache,
+                                args.jobs, args.timeout, memory_limit, memory_budget, args.include, args.exclude,
+                                not args.no_recursive, not args.no_manifest, args.settle, args.poll_interval,
+                                args.max_queued, args.status_file)
+        print(f"📊 {counters['completed']} fichier(s) compressé(s), {counters['failed']} échec(s), "
+              f"{counters['skipped']} inchangé(s)")
+        sys.exit(0)
+    if args.queue:
+        report = run_queue_node(args.directory, args.queue, args.output, args.method, args.level, args.pattern,
+                                cache, args.jobs, args.timeout, memory_limit, memory_budget, args.include,
+                                args.exclude, not args.no_recursive, args.node, args.lease_timeout,
+                                args.heartbeat)
+        sys.exit(0 if report['succeeded'] or not report['files'] else 1)
+    
     success = batch_compress(
         args.directory, 
         args.output, 
         args.method, 
         args.level, 
-        args.pattern
+        args.pattern,
+        cache,
+        args.jobs,
+        args.timeout,
+        memory_limit,
+        memory_budget,
+        not args.no_manifest,
+        args.force,
+        args.include,
+        args.exclude,
+        not args.no_recursive
     )
     
     if not success:
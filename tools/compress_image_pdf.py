@@ -6,11 +6,17 @@ Compresseur spécialisé pour les PDF contenant principalement des images
 import os
 import sys
 import argparse
+from functools import partial
 from pathlib import Path
 
+# Le module principal se trouve à la racine du projet
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def compress_image_pdf_advanced(input_path, output_path, quality=75, max_width=1200):
     """
-    Compresse un PDF avec des images en recréant le PDF avec des images optimisées
+    Compresse un PDF avec des images en remplaçant chaque image sur place par une version optimisée
+    
+    Le texte, les polices et les graphismes vectoriels ne sont pas touchés.
     
     Args:
         input_path (str): Chemin du fichier PDF d'entrée
@@ -19,126 +25,35 @@ def compress_image_pdf_advanced(input_path, output_path, quality=75, max_width=1
         max_width (int): Largeur maximale des images
     """
     try:
-        import fitz
-        from PIL import Image
-        import io
-        
-        print(f"🔄 Compression avancée des images (qualité: {quality}, largeur max: {max_width})")
-        
-        # Ouvrir le PDF source
-        doc = fitz.open(input_path)
-        
-        # Créer un nouveau PDF
-        new_doc = fitz.open()
-        
-        for page_num in range(doc.page_count):
-            print(f"📄 Traitement page {page_num + 1}/{doc.page_count}")
-            
-            page = doc[page_num]
-            
-            # Obtenir les dimensions de la page
-            page_rect = page.rect
-            
-            # Créer une nouvelle page
-            new_page = new_doc.new_page(width=page_rect.width, height=page_rect.height)
-            
-            # Obtenir toutes les images de la page
-            image_list = page.get_images()
-            
-            for img_index, img in enumerate(image_list):
-                try:
-                    # Extraire l'image
-                    xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    
-                    print(f"  🖼️  Image {img_index + 1}: {image_ext.upper()}, taille originale: {len(image_bytes)/1024:.1f} KB")
-                    
-                    # Ouvrir l'image avec Pillow
-                    pil_image = Image.open(io.BytesIO(image_bytes))
-                    
-                    # Convertir en RGB si nécessaire
-                    if pil_image.mode in ('RGBA', 'LA', 'P'):
-                        # Créer un fond blanc pour les images transparentes
-                        background = Image.new('RGB', pil_image.size, (255, 255, 255))
-                        if pil_image.mode == 'P':
-                            pil_image = pil_image.convert('RGBA')
-                        background.paste(pil_image, mask=pil_image.split()[-1] if pil_image.mode in ('RGBA', 'LA') else None)
-                        pil_image = background
-                    elif pil_image.mode != 'RGB':
-                        pil_image = pil_image.convert('RGB')
-                    
-                    # Redimensionner si nécessaire
-                    original_size = pil_image.size
-                    if pil_image.width > max_width:
-                        ratio = max_width / pil_image.width
-                        new_height = int(pil_image.height * ratio)
-                        pil_image = pil_image.resize((max_width, new_height), Image.Resampling.LANCZOS)
-                        print(f"    📏 Redimensionné: {original_size} → {pil_image.size}")
-                    
-                    # Compresser en JPEG
-                    compressed_buffer = io.BytesIO()
-                    pil_image.save(compressed_buffer, format='JPEG', quality=quality, optimize=True)
-                    compressed_bytes = compressed_buffer.getvalue()
-                    
-                    print(f"    💾 Compressé: {len(image_bytes)/1024:.1f} KB → {len(compressed_bytes)/1024:.1f} KB")
-                    
-                    # Obtenir la position de l'image sur la page
-                    image_rects = page.get_image_rects(xref)
-                    if image_rects:
-                        for rect in image_rects:
-                            # Insérer l'image compressée
-                            new_page.insert_image(rect, stream=compressed_bytes)
-                    else:
-                        # Si on ne trouve pas la position, insérer sur toute la page
-                        new_page.insert_image(page_rect, stream=compressed_bytes)
-                    
-                except Exception as e:
-                    print(f"    ❌ Erreur image {img_index + 1}: {e}")
-                    continue
-            
-            # Copier le texte et autres éléments si présents
-            try:
-                # Récupérer le texte et les annotations
-                text_dict = page.get_text("dict")
-                if text_dict.get("blocks"):
-                    # Il y a du contenu textuel, on le recrée
-                    for block in text_dict["blocks"]:
-                        if "lines" in block:
-                            for line in block["lines"]:
-                                for span in line["spans"]:
-                                    text = span["text"]
-                                    if text.strip():
-                                        bbox = span["bbox"]
-                                        font_size = span["size"]
-                                        # Insérer le texte (simplifié)
-                                        new_page.insert_text(
-                                            (bbox[0], bbox[1]), 
-                                            text, 
-                                            fontsize=font_size,
-                                            color=(0, 0, 0)
-                                        )
-            except:
-                # Ignore les erreurs de texte
-                pass
-        
-        # Sauvegarder le nouveau PDF
-        new_doc.save(output_path, garbage=4, clean=True, deflate=True)
-        new_doc.close()
-        doc.close()
-        
-        return True
-        
+        import fitz  # noqa: F401
+        from PIL import Image  # noqa: F401
     except ImportError as e:
         if "PIL" in str(e):
             print("❌ Pillow requis pour cette méthode: pip install Pillow")
         else:
             print("❌ PyMuPDF requis: pip install PyMuPDF")
         return False
-    except Exception as e:
-        print(f"❌ Erreur: {e}")
+    
+    from compress_pdf import compress_image_pdf_advanced as compress_images
+    
+    print(f"🔄 Compression avancée des images (qualité: {quality}, largeur max: {max_width})")
+    
+    stats = {}
+    if not compress_images(input_path, output_path, quality, max_width, stats=stats):
+        print("❌ Erreur lors de la compression des images")
         return False
+    
+    print(f"🖼️  {stats['images_unique']} image(s) distincte(s) pour {stats['image_placements']} occurrence(s)")
+    for entry in stats['images']:
+        if entry['kept']:
+            print(f"  📎 Image xref {entry['xref']}: {entry['original_size']/1024:.1f} KB, conservée")
+        else:
+            print(f"  🖼️  Image xref {entry['xref']} ({entry['codec']}, {entry['width']}x{entry['height']}): "
+                  f"{entry['original_size']/1024:.1f} KB → {entry['size']/1024:.1f} KB")
+    if stats['images_kept']:
+        print(f"  📎 {stats['images_kept']} image(s) déjà compacte(s) conservée(s)")
+    
+    return True
 
 def compress_with_ghostscript(input_path, output_path, quality='screen'):
     """
@@ -182,6 +97,39 @@ def compress_with_ghostscript(input_path, output_path, quality='screen'):
         print(f"❌ Erreur Ghostscript: {e}")
         return False
 
+def _advanced_shard(quality, max_width, input_path, output_path):
+    """Compresseur de tranche (voir compress_pdf.compress_sharded) pour la méthode avancée"""
+    from compress_pdf import compress_image_pdf_advanced as compress_images
+    
+    stats = {}
+    if not compress_images(input_path, output_path, quality, max_width, stats=stats):
+        return None
+    return {'images': stats}
+
+def _ghostscript_shard(quality, input_path, output_path):
+    """Compresseur de tranche (voir compress_pdf.compress_sharded) pour Ghostscript"""
+    return {} if compress_with_ghostscript(input_path, output_path, quality) else None
+
+def compress_sharded(input_path, output_path, compressor, shards):
+    """
+    Compresse le PDF par plages de pages en parallèle puis réassemble les tranches
+    
+    Args:
+        input_path (str): Chemin du fichier PDF d'entrée
+        output_path (str): Chemin du fichier PDF de sortie
+        compressor (callable): Compresseur d'une tranche (entrée, sortie)
+        shards (int): Nombre de tranches, une par processus
+    """
+    from compress_pdf import compress_sharded as compress_shards
+    
+    print(f"🧱 Compression par tranches ({shards} processus)")
+    stats = {}
+    if not compress_shards(input_path, output_path, compressor, shards, shards, stats):
+        return False
+    if stats.get('images_unique'):
+        print(f"🖼️  {stats['images_unique']} image(s) traitée(s) dans {stats['shards']} tranche(s)")
+    return True
+
 def main():
     parser = argparse.ArgumentParser(description="Compresseur spécialisé pour PDF avec images")
     parser.add_argument("input", help="Fichier PDF d'entrée")
@@ -194,6 +142,8 @@ def main():
                        default='advanced', help="Méthode de compression")
     parser.add_argument("--gs-quality", choices=['screen', 'ebook', 'printer'], 
                        default='ebook', help="Qualité Ghostscript")
+    parser.add_argument("--shards", type=int,
+                       help="Découper le PDF en N plages de pages compressées en parallèle puis réassemblées")
     
     args = parser.parse_args()
     
@@ -217,7 +167,13 @@ def main():
     
     success = False
     
-    if args.method == 'advanced':
+    if args.shards:
+        if args.method == 'advanced':
+            compressor = partial(_advanced_shard, args.quality, args.width)
+        else:
+            compressor = partial(_ghostscript_shard, args.gs_quality)
+        success = compress_sharded(args.input, args.output, compressor, args.shards)
+    elif args.method == 'advanced':
         success = compress_image_pdf_advanced(args.input, args.output, args.quality, args.width)
     elif args.method == 'ghostscript':
         success = compress_with_ghostscript(args.input, args.output, args.gs_quality)
@@ -3,48 +3,44 @@
 Script de debug pour la détection d'images
 """
 
+import os
 import sys
 
+# Le module principal se trouve à la racine du projet
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def debug_pdf_images(pdf_path):
     try:
-        import fitz
+        from compress_pdf import probe_pdf, LARGE_IMAGE_BYTES, IMAGE_PAGE_RATIO
         
-        doc = fitz.open(pdf_path)
-        total_images = 0
-        large_images = 0
+        # Même sonde que la détection automatique de compress_pdf
+        profile = probe_pdf(pdf_path)
         
         print(f"📄 Analyse: {pdf_path}")
-        print(f"📑 Pages: {doc.page_count}")
+        print(f"📑 Pages: {profile.page_count}")
+        print(f"🔎 Pages échantillonnées: {', '.join(str(p + 1) for p in profile.sampled_pages)}")
         
-        for page_num in range(min(3, doc.page_count)):
+        for page_num in profile.sampled_pages:
             print(f"\n--- Page {page_num + 1} ---")
-            images = doc[page_num].get_images()
-            total_images += len(images)
+            images = [image for image in profile.images if page_num in image.pages]
             print(f"Images trouvées: {len(images)}")
             
-            for img_index, img in enumerate(images):
-                try:
-                    xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    image_size = len(base_image["image"])
-                    print(f"  Image {img_index + 1}: {image_size/1024:.1f} KB")
-                    
-                    if image_size > 1024 * 1024:  # > 1MB
-                        large_images += 1
-                        print(f"    ✅ Grande image détectée!")
-                except Exception as e:
-                    print(f"    ❌ Erreur: {e}")
-        
-        page_count = doc.page_count
-        doc.close()
+            for img_index, image in enumerate(images):
+                filters = ' '.join(image.filters) or 'aucun filtre'
+                print(f"  Image {img_index + 1} (xref {image.xref}): {image.width}x{image.height}, "
+                      f"{image.bits_per_component} bits, {filters}, {image.length/1024:.1f} KB")
+                
+                if image.length > LARGE_IMAGE_BYTES:  # > 1MB
+                    print(f"    ✅ Grande image détectée!")
         
         print(f"\n📊 RÉSUMÉ:")
-        print(f"Total images: {total_images}")
-        print(f"Grandes images (>1MB): {large_images}")
-        print(f"Seuil détection: {page_count * 0.5}")
-        print(f"Condition 1 (large_images >= 1): {large_images >= 1}")
-        print(f"Condition 2 (total_images >= seuil): {total_images >= page_count * 0.5}")
-        print(f"Détection activée: {large_images >= 1 and total_images >= page_count * 0.5}")
+        print(f"Occurrences d'images: {profile.image_placements}")
+        print(f"Images distinctes: {len(profile.images)}")
+        print(f"Grandes images (>1MB): {profile.large_images}")
+        print(f"Images par page: {profile.images_per_page:.2f} (seuil: {IMAGE_PAGE_RATIO})")
+        print(f"Condition 1 (large_images >= 1): {profile.large_images >= 1}")
+        print(f"Condition 2 (images par page >= seuil): {profile.images_per_page >= IMAGE_PAGE_RATIO}")
+        print(f"Détection activée: {profile.image_heavy}")
         
     except Exception as e:
         print(f"❌ Erreur: {e}")